@@ -9,6 +9,17 @@ class ApiService {
     this.baseURL = '/api/v1';
     this.isLoading = false;
     this.loadingCallbacks = [];
+    // Center served by the backend (X-Center-Id); null uses the server default
+    this.centerId = localStorage.getItem('centerId');
+  }
+
+  setCenter(centerId) {
+    this.centerId = centerId ? String(centerId) : null;
+    if (this.centerId) {
+      localStorage.setItem('centerId', this.centerId);
+    } else {
+      localStorage.removeItem('centerId');
+    }
   }
 
   // Loading state management
@@ -27,6 +38,7 @@ class ApiService {
     const config = {
       headers: {
         'Content-Type': 'application/json',
+        ...(this.centerId ? { 'X-Center-Id': this.centerId } : {}),
         ...options.headers
       },
       ...options
@@ -284,6 +296,33 @@ class ApiService {
     window.open(url, '_blank');
   }
 
+  async getEnrollmentMatrix(filters = {}) {
+    // filters: grade, course_id, teacher_id, page, per_page
+    return this.get('/reports/enrollment-matrix', filters);
+  }
+
+  // Period close API
+  async getClosedPeriods() {
+    return this.get('/reports/periods');
+  }
+
+  async closePeriod(period, note = '') {
+    // period: YYYY-MM
+    return this.post(`/reports/periods/${period}/close`, { note });
+  }
+
+  async reopenPeriod(period) {
+    return this.post(`/reports/periods/${period}/reopen`, {});
+  }
+
+  // Sync API (pass the previous page's `next` as page while `has_more` is true)
+  async sync(since = '', page = '') {
+    const params = {};
+    if (page) params.page = page;
+    else if (since) params.since = since;
+    return this.get('/sync/', params);
+  }
+
   // Health check
   async healthCheck() {
     return fetch('/health').then(r => r.json());
@@ -1,14 +1,40 @@
 import sys
 import os
+import threading
 
 # Add the backend directory to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from app import create_app
+class LazyApp:
+    """WSGI app that builds the Flask application on its first request.
 
-# Create the Flask application
-app = create_app('production')
+    Importing this module stays cheap: Flask, SQLAlchemy, the models and the
+    blueprints are only imported when the first request arrives.
+    """
+
+    def __init__(self, config_name):
+        self.config_name = config_name
+        self._app = None
+        self._lock = threading.Lock()
+
+    def get_app(self):
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    from app import create_app
+                    self._app = create_app(self.config_name)
+        return self._app
+
+    def __call__(self, environ, start_response):
+        return self.get_app()(environ, start_response)
+
+# Create the Flask application (on first request in lazy startup mode)
+if os.getenv('STARTUP_MODE', 'eager') == 'lazy':
+    app = LazyApp('production')
+else:
+    from app import create_app
+    app = create_app('production')
 
 # Vercel expects this function signature
 def handler(request):
-    return app(request.environ, request.start_response) 
\ No newline at end of file
+    return app(request.environ, request.start_response)
\ No newline at end of file
@@ -1,13 +1,14 @@
 from flask import Blueprint, request, jsonify
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, selectinload
 from sqlalchemy import or_
 from datetime import datetime
-from config.database import engine
+from config.database import engine, RoutingSession
 from models.course import Course
 from models.teacher import Teacher
+from services import reference_cache
 
 # Create database session
-Session = sessionmaker(bind=engine)
+Session = sessionmaker(class_=RoutingSession, bind=engine)
 
 bp = Blueprint('courses', __name__)
 
@@ -30,12 +31,14 @@ def get_courses():
     try:
         search = request.args.get('search', '').strip()
         
+        # Teachers in one extra query, not one per course
+        query = session.query(Course).options(selectinload(Course.teacher))
         if search:
-            courses = session.query(Course).filter(
+            courses = query.filter(
                 Course.name.ilike(f'%{search}%')
             ).all()
         else:
-            courses = session.query(Course).all()
+            courses = query.all()
         
         return jsonify([course_to_dict(course) for course in courses])
     
@@ -110,6 +113,7 @@ def create_course():
         )
         
         session.add(course)
+        reference_cache.invalidate(session)
         session.commit()
         session.refresh(course)
         
@@ -172,6 +176,7 @@ def update_course(course_id):
         
         course.updated_at = datetime.now().isoformat()
         
+        reference_cache.invalidate(session)
         session.commit()
         session.refresh(course)
         
@@ -194,12 +199,13 @@ def delete_course(course_id):
             return jsonify({'error': 'Course not found'}), 404
         
         # Check if course has associated payments or sessions
-        if course.payments or course.sessions:
+        if course.has_payments_or_sessions():
             return jsonify({
                 'error': 'Cannot delete course with associated payments or sessions. Please remove them first.'
             }), 400
         
         session.delete(course)
+        reference_cache.invalidate(session)
         session.commit()
         
         return jsonify({'message': 'Course deleted successfully'}), 200
@@ -240,22 +246,10 @@ def get_course_stats(course_id):
             except ValueError:
                 return jsonify({'error': 'Invalid end_date format. Use YYYY-MM-DD'}), 400
         
-        # Calculate stats
+        # Calculate stats with date-bounded aggregate queries
         enrollment_count = course.get_enrollment_count()
         total_revenue = course.calculate_total_revenue(start_date_obj, end_date_obj)
-        total_hours_taught = course.calculate_total_hours_taught(start_date_obj, end_date_obj)
-        
-        # Filter sessions by date range if specified
-        sessions = course.sessions
-        if start_date_obj:
-            sessions = [s for s in sessions if s.date >= start_date_obj]
-        if end_date_obj:
-            sessions = [s for s in sessions if s.date <= end_date_obj]
-        
-        sessions_count = len(sessions)
-        
-        # Calculate salary cost
-        total_salary_cost = sum(s.salary_cost for s in sessions if s.salary_cost)
+        sessions_count, total_hours_taught, total_salary_cost = course.calculate_session_totals(start_date_obj, end_date_obj)
         
         return jsonify({
             'course_id': course_id,
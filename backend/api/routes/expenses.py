@@ -1,11 +1,12 @@
 from flask import Blueprint, request, jsonify
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime, date
-from config.database import engine
+from config.database import engine, RoutingSession
 from models.expense import Expense
+from models.period_close import ClosedPeriodError
 
 # Create database session
-Session = sessionmaker(bind=engine)
+Session = sessionmaker(class_=RoutingSession, bind=engine)
 
 bp = Blueprint('expenses', __name__)
 
@@ -129,6 +130,9 @@ def create_expense():
         
         return jsonify(expense_to_dict(expense)), 201
     
+    except ClosedPeriodError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -183,6 +187,9 @@ def update_expense(expense_id):
         
         return jsonify(expense_to_dict(expense))
     
+    except ClosedPeriodError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -204,6 +211,9 @@ def delete_expense(expense_id):
         
         return jsonify({'message': 'Expense deleted successfully'}), 200
     
+    except ClosedPeriodError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 500
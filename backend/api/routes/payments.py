@@ -1,14 +1,15 @@
 from flask import Blueprint, request, jsonify
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, selectinload
 from datetime import datetime, date
-from config.database import engine
+from config.database import engine, RoutingSession
 from models.payment import Payment
 from models.student import Student
-from models.course import Course
-from models.teacher import Teacher
+from models.period_close import ClosedPeriodError
+from models.archive import ArchivedPayment
+from services import archive, ledger, reference_cache
 
 # Create database session
-Session = sessionmaker(bind=engine)
+Session = sessionmaker(class_=RoutingSession, bind=engine)
 
 bp = Blueprint('payments', __name__)
 
@@ -32,7 +33,8 @@ def payment_to_dict(payment):
         'is_overpaid': payment.is_overpaid,
         'is_underpaid': payment.is_underpaid,
         'created_at': payment.created_at,
-        'updated_at': payment.updated_at
+        'updated_at': payment.updated_at,
+        'archived': isinstance(payment, ArchivedPayment)
     }
 
 @bp.route('/', methods=['GET'])
@@ -46,13 +48,20 @@ def get_payments():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        query = session.query(Payment)
+        # Student, course and teacher names in one extra query each, not one per payment
+        query = session.query(Payment).options(
+            selectinload(Payment.student), selectinload(Payment.course), selectinload(Payment.teacher)
+        )
+        filters = {}
+        start_date_obj = end_date_obj = None
         
         if student_id:
-            query = query.filter(Payment.student_id == int(student_id))
+            filters['student_id'] = int(student_id)
+            query = query.filter(Payment.student_id == filters['student_id'])
         
         if course_id:
-            query = query.filter(Payment.course_id == int(course_id))
+            filters['course_id'] = int(course_id)
+            query = query.filter(Payment.course_id == filters['course_id'])
         
         if start_date:
             start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
@@ -64,6 +73,11 @@ def get_payments():
         
         payments = query.order_by(Payment.date.desc()).all()
         
+        # Archived payments only when the range reaches the archive
+        archived = archive.list_rows(session, Payment, start_date_obj, end_date_obj, **filters)
+        if archived:
+            payments = sorted(payments + archived, key=lambda payment: payment.date, reverse=True)
+        
         return jsonify([payment_to_dict(payment) for payment in payments])
     
     except ValueError as e:
@@ -78,7 +92,7 @@ def get_payment(payment_id):
     """Get specific payment by ID"""
     session = Session()
     try:
-        payment = session.query(Payment).filter(Payment.id == payment_id).first()
+        payment = session.query(Payment).filter(Payment.id == payment_id).first() or archive.get_row(session, Payment, payment_id)
         
         if not payment:
             return jsonify({'error': 'Payment not found'}), 404
@@ -107,12 +121,12 @@ def create_payment():
         if missing_fields:
             return jsonify({'error': f'Missing required fields: {", ".join(missing_fields)}'}), 400
         
-        # Validate and get related entities
-        student = session.query(Student).filter(Student.id == data['student_id']).first()
+        # Validate and get related entities (course and teacher come from the reference cache)
+        student, reference = reference_cache.resolve(session, data['student_id'])
         if not student:
             return jsonify({'error': 'Student not found'}), 404
         
-        course = session.query(Course).filter(Course.id == data['course_id']).first()
+        course = reference.course(session, data['course_id'])
         if not course:
             return jsonify({'error': 'Course not found'}), 404
         
@@ -121,7 +135,7 @@ def create_payment():
         if not teacher_id:
             return jsonify({'error': 'No teacher assigned to this course'}), 400
         
-        teacher = session.query(Teacher).filter(Teacher.id == teacher_id).first()
+        teacher = reference.teacher(session, teacher_id)
         if not teacher:
             return jsonify({'error': 'Teacher not found'}), 404
         
@@ -139,13 +153,7 @@ def create_payment():
             amount_paid = float(data['amount_paid'])
             discounted_tuition = float(data.get('discounted_tuition', 0))
             # Get appropriate rate based on student grade
-            if course.teacher and student.grade:
-                default_hourly_rate = course.teacher.get_rate_for_grade(student.grade)
-            elif course.teacher:
-                default_hourly_rate = course.teacher.default_rate
-            else:
-                default_hourly_rate = course.base_rate
-            
+            default_hourly_rate = reference.rates.rate_for_course(course.id, student.grade)
             hourly_rate = float(data.get('hourly_rate', default_hourly_rate))
         except (ValueError, TypeError):
             return jsonify({'error': 'Numeric fields must be valid numbers'}), 400
@@ -168,16 +176,21 @@ def create_payment():
         if validation_errors:
             return jsonify({'error': validation_errors}), 400
         
-        # Update student balance
-        student.update_balance(course.name, purchased_hours)
-        student.updated_at = datetime.now().isoformat()
-        
         session.add(payment)
+        session.flush()
+        
+        # Credit student balance
+        ledger.credit(session, student.id, course.id, purchased_hours, 'purchase', payment_id=payment.id)
+        ledger.refresh_balance_mirror(session, student)
+        
         session.commit()
         session.refresh(payment)
         
         return jsonify(payment_to_dict(payment)), 201
     
+    except ClosedPeriodError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -220,6 +233,7 @@ def update_payment(payment_id):
                 return jsonify({'error': 'Discount must be a valid number'}), 400
         
         # Handle hours change (update balance accordingly)
+        hours_difference = 0
         if 'purchased_hours' in data:
             try:
                 new_hours = float(data['purchased_hours'])
@@ -227,11 +241,7 @@ def update_payment(payment_id):
                 
                 # Update payment
                 payment.purchased_hours = new_hours
-                
-                # Update student balance
-                student.update_balance(course.name, hours_difference)
-                student.updated_at = datetime.now().isoformat()
-                
+            
             except (ValueError, TypeError):
                 return jsonify({'error': 'Purchased hours must be a valid number'}), 400
         
@@ -240,6 +250,17 @@ def update_payment(payment_id):
         if validation_errors:
             return jsonify({'error': validation_errors}), 400
         
+        # Update student balance (a reduction fails if those hours were already used)
+        if hours_difference:
+            try:
+                ledger.apply_change(session, student.id, course.id, hours_difference, 'adjust', payment_id=payment.id)
+            except ledger.InsufficientBalanceError as e:
+                session.rollback()
+                return jsonify({
+                    'error': f'Cannot reduce purchased hours below hours already used. Available: {e.available:.1f}h, Reduction: {e.required:.1f}h'
+                }), 400
+            ledger.refresh_balance_mirror(session, student)
+        
         payment.updated_at = datetime.now().isoformat()
         
         session.commit()
@@ -247,6 +268,9 @@ def update_payment(payment_id):
         
         return jsonify(payment_to_dict(payment))
     
+    except ClosedPeriodError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -267,15 +291,24 @@ def delete_payment(payment_id):
         student = payment.student
         course = payment.course
         
-        # Subtract the purchased hours from balance
-        student.update_balance(course.name, -payment.purchased_hours)
-        student.updated_at = datetime.now().isoformat()
+        # Subtract the purchased hours from balance (fails if those hours were already used)
+        try:
+            ledger.debit(session, student.id, course.id, payment.purchased_hours, 'reverse', payment_id=payment.id)
+        except ledger.InsufficientBalanceError as e:
+            session.rollback()
+            return jsonify({
+                'error': f'Cannot delete payment whose hours were already used. Available: {e.available:.1f}h, Required: {e.required:.1f}h'
+            }), 400
+        ledger.refresh_balance_mirror(session, student)
         
         session.delete(payment)
         session.commit()
         
         return jsonify({'message': 'Payment deleted successfully'}), 200
     
+    except ClosedPeriodError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 500
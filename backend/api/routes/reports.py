@@ -1,203 +1,94 @@
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, request, jsonify, make_response, current_app
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime, date, timedelta
-import csv
 import io
-from config.database import engine
-from models.payment import Payment
-from models.session import Session as SessionModel
-from models.expense import Expense
-from models.student import Student
-from models.teacher import Teacher
-from models.course import Course
+from config.database import engine, RoutingSession
+from services import financials, enrollment, period_close, pivot_cube
+from services.report_executor import ReportExecutor
+from services.sharding import ShardedReportRunner
 
 # Create database session
-Session = sessionmaker(bind=engine)
+Session = sessionmaker(class_=RoutingSession, bind=engine)
 
 bp = Blueprint('reports', __name__)
 
 @bp.route('/financial', methods=['GET'])
 def get_financial_report():
     """Get comprehensive financial report"""
-    session = Session()
     try:
         # Get date range from query params
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        # Default to last 30 days if no dates provided
-        if not end_date:
-            end_date = date.today()
-        else:
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-        
-        if not start_date:
-            start_date = end_date - timedelta(days=30)
-        else:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-        
-        # Revenue (from payments)
-        payments_query = session.query(Payment).filter(
-            Payment.date >= start_date,
-            Payment.date <= end_date
-        )
-        payments = payments_query.all()
-        total_revenue = sum(p.amount_paid for p in payments)
-        
-        # Expenses
-        expenses_query = session.query(Expense).filter(
-            Expense.date >= start_date,
-            Expense.date <= end_date
-        )
-        expenses = expenses_query.all()
-        total_expenses = sum(e.amount for e in expenses)
-        
-        # Salary costs (from sessions)
-        sessions_query = session.query(SessionModel).filter(
-            SessionModel.date >= start_date,
-            SessionModel.date <= end_date
-        )
-        sessions = sessions_query.all()
-        total_salary_cost = sum(s.salary_cost for s in sessions if s.salary_cost)
-        
-        # Net profit
-        total_costs = total_expenses + total_salary_cost
-        net_profit = total_revenue - total_costs
-        
-        # Course-level analysis
-        course_analysis = {}
-        for course in session.query(Course).all():
-            course_payments = [p for p in payments if p.course_id == course.id]
-            course_sessions = [s for s in sessions if s.course_id == course.id]
-            
-            course_revenue = sum(p.amount_paid for p in course_payments)
-            course_salary_cost = sum(s.salary_cost for s in course_sessions if s.salary_cost)
-            course_hours_taught = sum(s.hours or 0 for s in course_sessions)
-            enrollment_count = len(set(p.student_id for p in course_payments))
+        try:
+            # Default to last 30 days if no dates provided
+            if not end_date:
+                end_date = date.today()
+            else:
+                end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
             
-            # Outstanding balance calculation
-            outstanding_balance = 0
-            for student in session.query(Student).all():
-                outstanding_balance += student.get_balance(course.name)
-            
-            course_analysis[course.name] = {
-                'revenue': course_revenue,
-                'salary_cost': course_salary_cost,
-                'net_profit': course_revenue - course_salary_cost,
-                'hours_taught': course_hours_taught,
-                'enrollment_count': enrollment_count,
-                'outstanding_balance': outstanding_balance,
-                'teacher_name': course.teacher.name if course.teacher else None
-            }
-        
-        # Teacher-level analysis
-        teacher_analysis = {}
-        for teacher in session.query(Teacher).all():
-            teacher_sessions = [s for s in sessions if s.teacher_id == teacher.id]
-            teacher_payments = [p for p in payments if p.teacher_id == teacher.id]
-            
-            total_hours = sum(s.hours or 0 for s in teacher_sessions)
-            total_salary = sum(s.salary_cost for s in teacher_sessions if s.salary_cost)
-            signed_hours = sum(p.purchased_hours for p in teacher_payments)
-            remaining_hours = signed_hours - total_hours
-            
-            teacher_analysis[teacher.name] = {
-                'total_hours': total_hours,
-                'total_salary': total_salary,
-                'signed_hours': signed_hours,
-                'remaining_hours': remaining_hours,
-                'sessions_count': len(teacher_sessions),
-                'default_rate': teacher.default_rate,
-                'grade_rates': teacher.grade_rates or {}
-            }
-        
-        return jsonify({
-            'period': {
-                'start_date': start_date.isoformat(),
-                'end_date': end_date.isoformat()
-            },
-            'summary': {
-                'total_revenue': total_revenue,
-                'total_expenses': total_expenses,
-                'total_salary_cost': total_salary_cost,
-                'total_costs': total_costs,
-                'net_profit': net_profit,
-                'profit_margin': (net_profit / total_revenue * 100) if total_revenue > 0 else 0
-            },
-            'course_analysis': course_analysis,
-            'teacher_analysis': teacher_analysis,
-            'payment_count': len(payments),
-            'session_count': len(sessions),
-            'expense_count': len(expenses)
-        })
+            if not start_date:
+                start_date = end_date - timedelta(days=30)
+            else:
+                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        # Payments, sessions, expenses and reference data are queried concurrently;
+        # long ranges are computed per month shard
+        executor = ReportExecutor.from_config(current_app.config)
+        sharder = ShardedReportRunner.from_config(current_app.config)
+        report = financials.build_financial_report(executor, start_date, end_date, sharder)
+        
+        return jsonify(report)
     
-    except ValueError as e:
-        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        session.close()
 
 @bp.route('/dashboard', methods=['GET'])
 def get_dashboard_data():
     """Get dashboard summary data"""
-    session = Session()
     try:
         # Current month data
         today = date.today()
         start_of_month = today.replace(day=1)
         
-        # Revenue this month
-        monthly_payments = session.query(Payment).filter(
-            Payment.date >= start_of_month,
-            Payment.date <= today
-        ).all()
-        monthly_revenue = sum(p.amount_paid for p in monthly_payments)
-        
-        # Expenses this month
-        monthly_expenses = session.query(Expense).filter(
-            Expense.date >= start_of_month,
-            Expense.date <= today
-        ).all()
-        monthly_expense_total = sum(e.amount for e in monthly_expenses)
-        
-        # Salary costs this month
-        monthly_sessions = session.query(SessionModel).filter(
-            SessionModel.date >= start_of_month,
-            SessionModel.date <= today
-        ).all()
-        monthly_salary_cost = sum(s.salary_cost for s in monthly_sessions if s.salary_cost)
-        
-        # Monthly chart data (last 6 months)
-        chart_data = []
+        tasks = {
+            'monthly_revenue': (financials.payment_total, (start_of_month, today)),
+            'monthly_expenses': (financials.expense_total, (start_of_month, today)),
+            'monthly_sessions': (financials.session_groups, (start_of_month, today)),
+            'teachers': (financials.teacher_list, ()),
+            'low_balance_alerts': (financials.low_balance_alerts, ()),
+            'totals': (financials.entity_counts, ())
+        }
+        
+        # Monthly chart data (last 6 months), grouped by month in one sub-query
+        chart_months = []
         for i in range(5, -1, -1):
             month_date = today.replace(day=1) - timedelta(days=i * 30)
-            month_start = month_date.replace(day=1)
-            next_month = (month_start + timedelta(days=32)).replace(day=1)
-            month_end = next_month - timedelta(days=1)
-            
-            month_payments = session.query(Payment).filter(
-                Payment.date >= month_start,
-                Payment.date <= month_end
-            ).all()
-            
-            month_sessions = session.query(SessionModel).filter(
-                SessionModel.date >= month_start,
-                SessionModel.date <= month_end
-            ).all()
-            
-            month_expenses = session.query(Expense).filter(
-                Expense.date >= month_start,
-                Expense.date <= month_end
-            ).all()
-            
-            month_revenue = sum(p.amount_paid for p in month_payments)
-            month_salary = sum(s.salary_cost for s in month_sessions if s.salary_cost)
-            month_other_expenses = sum(e.amount for e in month_expenses)
+            chart_months.append(month_date.replace(day=1))
+        chart_end = (chart_months[-1] + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        tasks['chart'] = (financials.monthly_breakdown, (chart_months[0], chart_end))
+        
+        executor = ReportExecutor.from_config(current_app.config)
+        results = executor.run(tasks)
+        teachers = results['teachers']
+        
+        monthly_revenue = results['monthly_revenue']
+        monthly_expense_total = results['monthly_expenses'][0]
+        monthly_salary_cost = financials.total_salary(teachers, results['monthly_sessions'])
+        
+        chart_data = []
+        for month_start in chart_months:
+            key = month_start.strftime('%Y-%m')
+            month = results['chart'][key]
+            month_revenue = month['revenue']
+            month_salary = financials.total_salary(teachers, month['sessions'])
+            month_other_expenses = month['expenses'][0]
             month_total_costs = month_salary + month_other_expenses
             
             chart_data.append({
-                'month': month_start.strftime('%Y-%m'),
+                'month': key,
                 'revenue': month_revenue,
                 'costs': month_total_costs,
                 'salary': month_salary,
@@ -205,24 +96,6 @@ def get_dashboard_data():
                 'profit': month_revenue - month_total_costs
             })
         
-        # Low balance alerts
-        low_balance_students = []
-        for student in session.query(Student).all():
-            if student.balances:
-                for course_name, balance in student.balances.items():
-                    if balance < 2.0:  # threshold for low balance
-                        low_balance_students.append({
-                            'student_id': student.id,
-                            'student_name': student.name,
-                            'course_name': course_name,
-                            'balance': balance
-                        })
-        
-        # Totals
-        total_students = session.query(Student).count()
-        total_teachers = session.query(Teacher).count()
-        total_courses = session.query(Course).count()
-        
         return jsonify({
             'current_month': {
                 'revenue': monthly_revenue,
@@ -231,23 +104,16 @@ def get_dashboard_data():
                 'net_profit': monthly_revenue - monthly_expense_total - monthly_salary_cost
             },
             'chart_data': chart_data,
-            'low_balance_alerts': low_balance_students,
-            'totals': {
-                'students': total_students,
-                'teachers': total_teachers,
-                'courses': total_courses
-            }
+            'low_balance_alerts': results['low_balance_alerts'],
+            'totals': results['totals']
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        session.close()
 
 @bp.route('/export/csv', methods=['GET'])
 def export_financial_csv():
     """Export financial report as CSV"""
-    session = Session()
     try:
         # Get date range from query params
         start_date = request.args.get('start_date')
@@ -256,24 +122,17 @@ def export_financial_csv():
         if not start_date or not end_date:
             return jsonify({'error': 'start_date and end_date are required'}), 400
         
-        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+        try:
+            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
         
         # Get financial report data
-        payments = session.query(Payment).filter(
-            Payment.date >= start_date_obj,
-            Payment.date <= end_date_obj
-        ).all()
-        
-        sessions = session.query(SessionModel).filter(
-            SessionModel.date >= start_date_obj,
-            SessionModel.date <= end_date_obj
-        ).all()
-        
-        expenses = session.query(Expense).filter(
-            Expense.date >= start_date_obj,
-            Expense.date <= end_date_obj
-        ).all()
+        executor = ReportExecutor.from_config(current_app.config)
+        sharder = ShardedReportRunner.from_config(current_app.config)
+        report = financials.build_financial_report(executor, start_date_obj, end_date_obj, sharder)
+        summary = report['summary']
         
         # Create CSV content
         output = io.StringIO()
@@ -282,9 +141,9 @@ def export_financial_csv():
         output.write(f"Financial Report Summary\n")
         output.write(f"Period: {start_date} to {end_date}\n\n")
         
-        total_revenue = sum(p.amount_paid for p in payments)
-        total_salary = sum(s.salary_cost for s in sessions if s.salary_cost)
-        total_other_expenses = sum(e.amount for e in expenses)
+        total_revenue = summary['total_revenue']
+        total_salary = summary['total_salary_cost']
+        total_other_expenses = summary['total_expenses']
         net_profit = total_revenue - total_salary - total_other_expenses
         
         output.write(f"Total Revenue,${total_revenue:.2f}\n")
@@ -296,21 +155,8 @@ def export_financial_csv():
         output.write("Course Analysis\n")
         output.write("Course,Enrollment,Revenue,Salary Cost,Hours Taught,Outstanding Balance\n")
         
-        for course in session.query(Course).all():
-            course_payments = [p for p in payments if p.course_id == course.id]
-            course_sessions = [s for s in sessions if s.course_id == course.id]
-            
-            enrollment = len(set(p.student_id for p in course_payments))
-            revenue = sum(p.amount_paid for p in course_payments)
-            salary_cost = sum(s.salary_cost for s in course_sessions if s.salary_cost)
-            hours_taught = sum(s.hours or 0 for s in course_sessions)
-            
-            # Calculate outstanding balance
-            outstanding = 0
-            for student in session.query(Student).all():
-                outstanding += student.get_balance(course.name)
-            
-            output.write(f"{course.name},{enrollment},${revenue:.2f},${salary_cost:.2f},{hours_taught:.1f},{outstanding:.1f}\n")
+        for course_name, course in report['course_analysis'].items():
+            output.write(f"{course_name},{course['enrollment_count']},${course['revenue']:.2f},${course['salary_cost']:.2f},{course['hours_taught']:.1f},{course['outstanding_balance']:.1f}\n")
         
         output.write("\n")
         
@@ -318,13 +164,17 @@ def export_financial_csv():
         output.write("Teacher Analysis\n")
         output.write("Teacher,Hours Taught,Salary Earned,Sessions Count\n")
         
-        for teacher in session.query(Teacher).all():
-            teacher_sessions = [s for s in sessions if s.teacher_id == teacher.id]
-            hours = sum(s.hours or 0 for s in teacher_sessions)
-            salary = sum(s.salary_cost for s in teacher_sessions if s.salary_cost)
-            sessions_count = len(teacher_sessions)
-            
-            output.write(f"{teacher.name},{hours:.1f},${salary:.2f},{sessions_count}\n")
+        for teacher_name, teacher in report['teacher_analysis'].items():
+            output.write(f"{teacher_name},{teacher['total_hours']:.1f},${teacher['total_salary']:.2f},{teacher['sessions_count']}\n")
+        
+        output.write("\n")
+        
+        # Grade analysis
+        output.write("Grade Analysis\n")
+        output.write("Grade,Hours Taught,Salary Cost,Sessions Count\n")
+        
+        for grade, totals in report['grade_analysis'].items():
+            output.write(f"{grade},{totals['hours_taught']:.1f},${totals['salary_cost']:.2f},{totals['sessions_count']}\n")
         
         # Create response
         csv_content = output.getvalue()
@@ -336,78 +186,202 @@ def export_financial_csv():
         
         return response
     
-    except ValueError as e:
-        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    finally:
-        session.close()
 
 @bp.route('/attendance', methods=['GET'])
 def get_attendance_report():
     """Get teacher attendance and salary report"""
-    session = Session()
     try:
         # Get date range from query params
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        # Default to last 30 days if no dates provided
-        if not end_date:
-            end_date = date.today()
-        else:
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-        
-        if not start_date:
-            start_date = end_date - timedelta(days=30)
-        else:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-        
-        # Get sessions in date range
-        sessions = session.query(SessionModel).filter(
-            SessionModel.date >= start_date,
-            SessionModel.date <= end_date
-        ).all()
-        
-        # Group by teacher
-        teacher_data = {}
-        for session_obj in sessions:
-            teacher_id = session_obj.teacher_id
-            if teacher_id not in teacher_data:
-                teacher = session_obj.teacher
-                teacher_data[teacher_id] = {
-                    'teacher_name': teacher.name if teacher else 'Unknown',
-                    'default_rate': teacher.default_rate if teacher else 0,
-                    'grade_rates': teacher.grade_rates if teacher else {},
-                    'total_hours': 0,
-                    'total_salary': 0,
-                    'sessions_count': 0,
-                    'courses': set()
-                }
+        try:
+            # Default to last 30 days if no dates provided
+            if not end_date:
+                end_date = date.today()
+            else:
+                end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+            
+            if not start_date:
+                start_date = end_date - timedelta(days=30)
+            else:
+                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        executor = ReportExecutor.from_config(current_app.config)
+        sharder = ShardedReportRunner.from_config(current_app.config)
+        report = financials.build_attendance_report(executor, start_date, end_date, sharder)
+        
+        return jsonify(report)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/grade-profitability', methods=['GET'])
+def get_grade_profitability_report():
+    """Get revenue, hours sold and taught, salary cost and margin per grade and per teacher and grade"""
+    try:
+        # Get date range from query params
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        
+        try:
+            # Default to last 30 days if no dates provided
+            if not end_date:
+                end_date = date.today()
+            else:
+                end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+            
+            if not start_date:
+                start_date = end_date - timedelta(days=30)
+            else:
+                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        executor = ReportExecutor.from_config(current_app.config)
+        sharder = ShardedReportRunner.from_config(current_app.config)
+        report = financials.build_grade_profitability_report(executor, start_date, end_date, sharder)
+        
+        return jsonify(report)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/timeseries', methods=['GET'])
+def get_timeseries_report():
+    """Get monthly revenue, salary and expense series"""
+    try:
+        # Get date range from query params
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        
+        try:
+            # Default to the last 12 months if no dates provided
+            if not end_date:
+                end_date = date.today()
+            else:
+                end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
             
-            teacher_data[teacher_id]['total_hours'] += session_obj.hours or 0
-            teacher_data[teacher_id]['total_salary'] += session_obj.salary_cost or 0
-            teacher_data[teacher_id]['sessions_count'] += 1
-            if session_obj.course:
-                teacher_data[teacher_id]['courses'].add(session_obj.course.name)
+            if not start_date:
+                month_index = end_date.year * 12 + end_date.month - 1 - 11
+                start_date = date(month_index // 12, month_index % 12 + 1, 1)
+            else:
+                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        executor = ReportExecutor.from_config(current_app.config)
+        sharder = ShardedReportRunner.from_config(current_app.config)
+        report = financials.build_timeseries_report(executor, start_date, end_date, sharder)
+        
+        return jsonify(report)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/enrollment-matrix', methods=['GET'])
+def get_enrollment_matrix():
+    """Get purchased, consumed and remaining hours and amount paid per student and course (sparse, paged by student)"""
+    session = Session()
+    try:
+        grade = request.args.get('grade')
+        course_id = request.args.get('course_id', type=int)
+        teacher_id = request.args.get('teacher_id', type=int)
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 100, type=int)
         
-        # Convert sets to lists for JSON serialization
-        for teacher_id in teacher_data:
-            teacher_data[teacher_id]['courses'] = list(teacher_data[teacher_id]['courses'])
+        if page < 1 or not 1 <= per_page <= 1000:
+            return jsonify({'error': 'page must be at least 1 and per_page between 1 and 1000'}), 400
         
-        return jsonify({
-            'period': {
-                'start_date': start_date.isoformat(),
-                'end_date': end_date.isoformat()
-            },
-            'teachers': list(teacher_data.values()),
-            'total_hours': sum(data['total_hours'] for data in teacher_data.values()),
-            'total_salary': sum(data['total_salary'] for data in teacher_data.values())
-        })
+        matrix = enrollment.build_enrollment_matrix(
+            session, grade=grade, course_id=course_id, teacher_id=teacher_id, page=page, per_page=per_page
+        )
+        return jsonify(matrix)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
+@bp.route('/pivot', methods=['GET'])
+def get_pivot_report():
+    """Get revenue, hours, salary and counts grouped by any of course, teacher, grade, payment_method and month"""
+    session = Session()
+    try:
+        return jsonify(pivot_cube.build_pivot(session, request.args))
+    
+    except pivot_cube.PivotUnavailableError as e:
+        return jsonify({'error': str(e)}), 501
+    except pivot_cube.PivotError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
+@bp.route('/periods', methods=['GET'])
+def get_closed_periods():
+    """List closed months"""
+    session = Session()
+    try:
+        return jsonify(period_close.list_closed_periods(session))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
+@bp.route('/periods/<period>/close', methods=['POST'])
+def close_period(period):
+    """Close a past month: freeze its financial figures into snapshots and lock its rows"""
+    session = Session()
+    try:
+        try:
+            period_start, period_end = period_close.period_bounds(period)
+        except ValueError:
+            return jsonify({'error': 'Invalid period format. Use YYYY-MM'}), 400
+        
+        data = request.get_json(silent=True) or {}
+        
+        aggregate = financials.period_aggregate(session, period_start, period_end)
+        period_close.close_period(session, period, aggregate, note=data.get('note') or None)
+        session.commit()
+        
+        return jsonify({'message': f'Period {period} closed successfully', 'period': period}), 201
+    
+    except period_close.PeriodCloseError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
+@bp.route('/periods/<period>/reopen', methods=['POST'])
+def reopen_period(period):
+    """Reopen a closed month: drop its snapshots so it can be edited and is computed live again"""
+    session = Session()
+    try:
+        try:
+            period_close.period_bounds(period)
+        except ValueError:
+            return jsonify({'error': 'Invalid period format. Use YYYY-MM'}), 400
+        
+        period_close.reopen_period(session, period)
+        session.commit()
+        
+        return jsonify({'message': f'Period {period} reopened successfully', 'period': period})
     
-    except ValueError as e:
-        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    except period_close.PeriodCloseError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
+        session.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
-        session.close() 
\ No newline at end of file
+        session.close()
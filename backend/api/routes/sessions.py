@@ -1,17 +1,33 @@
 from flask import Blueprint, request, jsonify
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime, date
-from config.database import engine
-from models.session import Session as SessionModel
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker, selectinload
+from datetime import datetime, date, timedelta
+from config.database import engine, RoutingSession
+from models.session import Session as SessionModel, parse_minutes
+from models.session_series import SessionSeries
 from models.student import Student
-from models.course import Course
-from models.teacher import Teacher
+from models.period_close import ClosedPeriodError
+from models.archive import ArchivedSession
+from services import archive, ledger, reference_cache, scheduling, session_series
 
 # Create database session
-Session = sessionmaker(bind=engine)
+Session = sessionmaker(class_=RoutingSession, bind=engine)
 
 bp = Blueprint('sessions', __name__)
 
+def conflict_response(session, session_obj, exclude_id=None):
+    """409 response listing the teacher's and student's overlapping sessions, or None if there are none"""
+    conflicts = scheduling.find_conflicts(
+        session, session_obj.date, session_obj.start_minute, session_obj.end_minute,
+        teacher_id=session_obj.teacher_id, student_id=session_obj.student_id, exclude_id=exclude_id
+    )
+    if not conflicts:
+        return None
+    return jsonify({
+        'error': 'Session overlaps existing sessions of the teacher or student (send "allow_overlap": true to book anyway)',
+        'conflicts': conflicts
+    }), 409
+
 def session_to_dict(session_obj):
     """Convert Session object to dictionary"""
     return {
@@ -23,6 +39,7 @@ def session_to_dict(session_obj):
         'course_name': session_obj.course.name if session_obj.course else None,
         'teacher_id': session_obj.teacher_id,
         'teacher_name': session_obj.teacher.name if session_obj.teacher else None,
+        'series_id': session_obj.series_id,
         'start_time': session_obj.start_time,
         'end_time': session_obj.end_time,
         'hours': session_obj.hours,
@@ -30,12 +47,41 @@ def session_to_dict(session_obj):
         'salary_cost': session_obj.salary_cost,
         'notes': session_obj.notes,
         'created_at': session_obj.created_at,
-        'updated_at': session_obj.updated_at
+        'updated_at': session_obj.updated_at,
+        'archived': isinstance(session_obj, ArchivedSession)
+    }
+
+def series_to_dict(series, sessions=None):
+    """Convert SessionSeries object to dictionary, with its sessions if given"""
+    data = {
+        'id': series.id,
+        'student_id': series.student_id,
+        'student_name': series.student.name if series.student else None,
+        'course_id': series.course_id,
+        'course_name': series.course.name if series.course else None,
+        'teacher_id': series.teacher_id,
+        'teacher_name': series.teacher.name if series.teacher else None,
+        'weekdays': series.weekday_names,
+        'interval_weeks': series.interval_weeks,
+        'start_time': series.start_time,
+        'end_time': series.end_time,
+        'start_date': series.start_date.isoformat(),
+        'end_date': series.end_date.isoformat(),
+        'notes': series.notes,
+        'created_at': series.created_at,
+        'updated_at': series.updated_at
     }
+    if sessions is not None:
+        data['sessions'] = [session_to_dict(s) for s in sessions]
+    return data
+
+def parse_from_date(value):
+    """Date of a from_date parameter (default today); raises ValueError"""
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else date.today()
 
 @bp.route('/', methods=['GET'])
 def get_sessions():
-    """Get all sessions with optional filtering"""
+    """Get all sessions with optional filtering (start_time_from/start_time_to: sessions starting in [from, to))"""
     session = Session()
     try:
         # Query parameters for filtering
@@ -45,16 +91,24 @@ def get_sessions():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        query = session.query(SessionModel)
+        # Student, course and teacher names in one extra query each, not one per session
+        query = session.query(SessionModel).options(
+            selectinload(SessionModel.student), selectinload(SessionModel.course), selectinload(SessionModel.teacher)
+        )
+        filters = {}
+        start_date_obj = end_date_obj = None
         
         if student_id:
-            query = query.filter(SessionModel.student_id == int(student_id))
+            filters['student_id'] = int(student_id)
+            query = query.filter(SessionModel.student_id == filters['student_id'])
         
         if course_id:
-            query = query.filter(SessionModel.course_id == int(course_id))
+            filters['course_id'] = int(course_id)
+            query = query.filter(SessionModel.course_id == filters['course_id'])
         
         if teacher_id:
-            query = query.filter(SessionModel.teacher_id == int(teacher_id))
+            filters['teacher_id'] = int(teacher_id)
+            query = query.filter(SessionModel.teacher_id == filters['teacher_id'])
         
         if start_date:
             start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
@@ -64,7 +118,24 @@ def get_sessions():
             end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
             query = query.filter(SessionModel.date <= end_date_obj)
         
-        sessions = query.order_by(SessionModel.date.desc(), SessionModel.start_time.desc()).all()
+        # Time of day filters compare the stored minutes
+        try:
+            if request.args.get('start_time_from'):
+                filters['start_minute_from'] = parse_minutes(request.args['start_time_from'])
+                query = query.filter(SessionModel.start_minute >= filters['start_minute_from'])
+            
+            if request.args.get('start_time_to'):
+                filters['start_minute_to'] = parse_minutes(request.args['start_time_to'], end_of_day=True)
+                query = query.filter(SessionModel.start_minute < filters['start_minute_to'])
+        except ValueError:
+            return jsonify({'error': 'Invalid start_time_from or start_time_to. Use HH:MM'}), 400
+        
+        sessions = query.order_by(SessionModel.date.desc(), SessionModel.start_minute.desc()).all()
+        
+        # Archived sessions only when the range reaches the archive
+        archived = archive.list_rows(session, SessionModel, start_date_obj, end_date_obj, **filters)
+        if archived:
+            sessions = sorted(sessions + archived, key=lambda s: (s.date, s.start_minute), reverse=True)
         
         return jsonify([session_to_dict(s) for s in sessions])
     
@@ -80,7 +151,7 @@ def get_session(session_id):
     """Get specific session by ID"""
     session = Session()
     try:
-        session_obj = session.query(SessionModel).filter(SessionModel.id == session_id).first()
+        session_obj = session.query(SessionModel).filter(SessionModel.id == session_id).first() or archive.get_row(session, SessionModel, session_id)
         
         if not session_obj:
             return jsonify({'error': 'Session not found'}), 404
@@ -109,12 +180,12 @@ def create_session():
         if missing_fields:
             return jsonify({'error': f'Missing required fields: {", ".join(missing_fields)}'}), 400
         
-        # Validate and get related entities
-        student = session.query(Student).filter(Student.id == data['student_id']).first()
+        # Validate and get related entities (course and teacher come from the reference cache)
+        student, reference = reference_cache.resolve(session, data['student_id'])
         if not student:
             return jsonify({'error': 'Student not found'}), 404
         
-        course = session.query(Course).filter(Course.id == data['course_id']).first()
+        course = reference.course(session, data['course_id'])
         if not course:
             return jsonify({'error': 'Course not found'}), 404
         
@@ -123,7 +194,7 @@ def create_session():
         if not teacher_id:
             return jsonify({'error': 'No teacher assigned to this course'}), 400
         
-        teacher = session.query(Teacher).filter(Teacher.id == teacher_id).first()
+        teacher = reference.teacher(session, teacher_id)
         if not teacher:
             return jsonify({'error': 'Teacher not found'}), 404
         
@@ -154,23 +225,31 @@ def create_session():
         if validation_errors:
             return jsonify({'error': validation_errors}), 400
         
-        # Check if student has sufficient balance
-        current_balance = student.get_balance(course.name)
-        if current_balance < calculated_hours:
-            return jsonify({
-                'error': f'Insufficient balance. Current: {current_balance:.1f}h, Required: {calculated_hours:.1f}h'
-            }), 400
-        
-        # Deduct from student balance
-        student.update_balance(course.name, -calculated_hours)
-        student.updated_at = datetime.now().isoformat()
+        # Teacher and student must be free at that time
+        if not data.get('allow_overlap'):
+            conflict = conflict_response(session, session_obj)
+            if conflict:
+                return conflict
         
         session.add(session_obj)
+        session.flush()
+        
+        # Deduct from student balance; the conditional update fails if the balance is insufficient
+        try:
+            ledger.debit(session, student.id, course.id, calculated_hours, 'consume', session_id=session_obj.id)
+        except ledger.InsufficientBalanceError as e:
+            session.rollback()
+            return jsonify({'error': str(e)}), 400
+        ledger.refresh_balance_mirror(session, student)
+        
         session.commit()
         session.refresh(session_obj)
         
         return jsonify(session_to_dict(session_obj)), 201
     
+    except ClosedPeriodError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -213,27 +292,34 @@ def update_session(session_id):
                 return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
         
         # Recalculate hours if time changed
+        hours_difference = 0
         if 'start_time' in data or 'end_time' in data:
             new_hours = session_obj.calculate_hours()
             hours_difference = new_hours - original_hours
-            
-            # Check if student has sufficient balance for increase
-            if hours_difference > 0:
-                current_balance = student.get_balance(course.name)
-                if current_balance < hours_difference:
-                    return jsonify({
-                        'error': f'Insufficient balance for increase. Available: {current_balance:.1f}h, Required: {hours_difference:.1f}h'
-                    }), 400
-            
-            # Update student balance with the difference
-            student.update_balance(course.name, -hours_difference)
-            student.updated_at = datetime.now().isoformat()
         
         # Validate updated session
         validation_errors = session_obj.validate_session()
         if validation_errors:
             return jsonify({'error': validation_errors}), 400
         
+        # A new time or date must not overlap the teacher's or student's other sessions
+        if ('start_time' in data or 'end_time' in data or 'date' in data) and not data.get('allow_overlap'):
+            conflict = conflict_response(session, session_obj, exclude_id=session_obj.id)
+            if conflict:
+                return conflict
+        
+        # Update student balance with the difference; an increase fails if the balance is insufficient
+        if hours_difference:
+            entry_type = 'consume' if hours_difference > 0 else 'reverse'
+            try:
+                ledger.apply_change(session, student.id, course.id, -hours_difference, entry_type, session_id=session_obj.id)
+            except ledger.InsufficientBalanceError as e:
+                session.rollback()
+                return jsonify({
+                    'error': f'Insufficient balance for increase. Available: {e.available:.1f}h, Required: {e.required:.1f}h'
+                }), 400
+            ledger.refresh_balance_mirror(session, student)
+        
         session_obj.updated_at = datetime.now().isoformat()
         
         session.commit()
@@ -241,6 +327,9 @@ def update_session(session_id):
         
         return jsonify(session_to_dict(session_obj))
     
+    except ClosedPeriodError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -263,20 +352,58 @@ def delete_session(session_id):
         hours_to_restore = session_obj.hours or 0
         
         if hours_to_restore > 0:
-            student.update_balance(course.name, hours_to_restore)
-            student.updated_at = datetime.now().isoformat()
+            ledger.credit(session, student.id, course.id, hours_to_restore, 'reverse', session_id=session_obj.id)
+            ledger.refresh_balance_mirror(session, student)
         
         session.delete(session_obj)
         session.commit()
         
         return jsonify({'message': 'Session deleted successfully'}), 200
     
+    except ClosedPeriodError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 500
     finally:
         session.close()
 
+@bp.route('/availability', methods=['GET'])
+def get_availability():
+    """Get busy and free times per day of a teacher or a student"""
+    session = Session()
+    try:
+        teacher_id = request.args.get('teacher_id', type=int)
+        student_id = request.args.get('student_id', type=int)
+        
+        # Default to the next 7 days
+        try:
+            start_date = request.args.get('start_date')
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else date.today()
+            end_date = request.args.get('end_date')
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else start_date + timedelta(days=6)
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        try:
+            day_start = parse_minutes(request.args.get('day_start', '00:00'), end_of_day=True)
+            day_end = parse_minutes(request.args.get('day_end', '24:00'), end_of_day=True)
+        except ValueError:
+            return jsonify({'error': 'Invalid day_start or day_end. Use HH:MM'}), 400
+        
+        return jsonify(scheduling.availability(
+            session, start_date, end_date, teacher_id=teacher_id, student_id=student_id,
+            day_start=day_start, day_end=day_end
+        ))
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
 @bp.route('/summary', methods=['GET'])
 def get_session_summary():
     """Get session summary statistics"""
@@ -296,39 +423,42 @@ def get_session_summary():
             end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
             query = query.filter(SessionModel.date <= end_date_obj)
         
-        sessions = query.all()
-        
-        total_hours = sum(s.hours or 0 for s in sessions)
-        total_salary_cost = sum(s.salary_cost for s in sessions)
-        session_count = len(sessions)
-        
-        # Teacher breakdown
+        # Durations summed in SQL per (teacher, course, grade); the rate depends on all three
+        groups = query.with_entities(
+            SessionModel.teacher_id,
+            SessionModel.course_id,
+            Student.grade,
+            func.count(SessionModel.id),
+            func.sum(SessionModel.end_minute - SessionModel.start_minute)
+        ).outerjoin(
+            Student, Student.id == SessionModel.student_id
+        ).group_by(
+            SessionModel.teacher_id, SessionModel.course_id, Student.grade
+        ).all()
+        
+        reference = reference_cache.get_reference_data(session)
+        total_hours = 0
+        total_salary_cost = 0
+        session_count = 0
         teacher_stats = {}
-        for s in sessions:
-            teacher_name = s.teacher.name if s.teacher else 'Unknown'
-            if teacher_name not in teacher_stats:
-                teacher_stats[teacher_name] = {
-                    'sessions': 0,
-                    'hours': 0,
-                    'salary_cost': 0
-                }
-            teacher_stats[teacher_name]['sessions'] += 1
-            teacher_stats[teacher_name]['hours'] += s.hours or 0
-            teacher_stats[teacher_name]['salary_cost'] += s.salary_cost
-        
-        # Course breakdown
         course_stats = {}
-        for s in sessions:
-            course_name = s.course.name if s.course else 'Unknown'
-            if course_name not in course_stats:
-                course_stats[course_name] = {
-                    'sessions': 0,
-                    'hours': 0,
-                    'salary_cost': 0
-                }
-            course_stats[course_name]['sessions'] += 1
-            course_stats[course_name]['hours'] += s.hours or 0
-            course_stats[course_name]['salary_cost'] += s.salary_cost
+        for teacher_id, course_id, grade, count, minutes in groups:
+            hours = (minutes or 0) / 60.0
+            rate = reference.rates.rate_for_teacher(teacher_id, grade)
+            salary_cost = hours * rate if rate is not None else 0.0
+            total_hours += hours
+            total_salary_cost += salary_cost
+            session_count += count
+            
+            teacher = reference.teachers.get(teacher_id)
+            course = reference.courses.get(course_id)
+            # Teacher and course breakdowns
+            for stats, name in ((teacher_stats, teacher.name if teacher else 'Unknown'),
+                                (course_stats, course.name if course else 'Unknown')):
+                entry = stats.setdefault(name, {'sessions': 0, 'hours': 0, 'salary_cost': 0})
+                entry['sessions'] += count
+                entry['hours'] += hours
+                entry['salary_cost'] += salary_cost
         
         return jsonify({
             'period': {
@@ -351,4 +481,253 @@ def get_session_summary():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
-        session.close() 
\ No newline at end of file
+        session.close() 
+
+@bp.route('/series', methods=['GET'])
+def get_series_list():
+    """Get all recurring series with optional student, course or teacher filter"""
+    session = Session()
+    try:
+        query = session.query(SessionSeries).options(
+            selectinload(SessionSeries.student), selectinload(SessionSeries.course), selectinload(SessionSeries.teacher)
+        )
+        for field in ('student_id', 'course_id', 'teacher_id'):
+            if request.args.get(field):
+                query = query.filter(getattr(SessionSeries, field) == int(request.args[field]))
+        
+        return jsonify([series_to_dict(series) for series in query.order_by(SessionSeries.id).all()])
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
+@bp.route('/series/<int:series_id>', methods=['GET'])
+def get_series(series_id):
+    """Get a recurring series with its sessions"""
+    session = Session()
+    try:
+        series = session.query(SessionSeries).filter(SessionSeries.id == series_id).first()
+        
+        if not series:
+            return jsonify({'error': 'Series not found'}), 404
+        
+        sessions = session.query(SessionModel).options(
+            selectinload(SessionModel.student), selectinload(SessionModel.course), selectinload(SessionModel.teacher)
+        ).filter(SessionModel.series_id == series.id).order_by(SessionModel.date).all()
+        return jsonify(series_to_dict(series, sessions))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
+@bp.route('/series', methods=['POST'])
+def create_series():
+    """Create a weekly series and all its sessions, deducting their hours from the student balance at once"""
+    session = Session()
+    try:
+        data = request.get_json()
+        
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        # Validate required fields
+        required_fields = ['student_id', 'course_id', 'weekdays', 'start_time', 'end_time', 'end_date']
+        missing_fields = [field for field in required_fields if field not in data or not data[field]]
+        
+        if missing_fields:
+            return jsonify({'error': f'Missing required fields: {", ".join(missing_fields)}'}), 400
+        
+        # Validate and get related entities (course and teacher come from the reference cache)
+        student, reference = reference_cache.resolve(session, data['student_id'])
+        if not student:
+            return jsonify({'error': 'Student not found'}), 404
+        
+        course = reference.course(session, data['course_id'])
+        if not course:
+            return jsonify({'error': 'Course not found'}), 404
+        
+        # Use course's teacher if not specified
+        teacher_id = data.get('teacher_id', course.teacher_id)
+        if not teacher_id:
+            return jsonify({'error': 'No teacher assigned to this course'}), 400
+        
+        teacher = reference.teacher(session, teacher_id)
+        if not teacher:
+            return jsonify({'error': 'Teacher not found'}), 404
+        
+        try:
+            start_date = parse_from_date(data.get('start_date'))
+            end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        try:
+            weekdays = session_series.parse_weekdays(data['weekdays'])
+            start_minute, end_minute = session_series.parse_slot(data['start_time'], data['end_time'])
+            interval_weeks = int(data.get('interval_weeks', 1))
+            if interval_weeks < 1:
+                raise ValueError("interval_weeks must be at least 1")
+            
+            series = SessionSeries(
+                student_id=student.id,
+                course_id=course.id,
+                teacher_id=teacher.id,
+                weekdays=weekdays,
+                interval_weeks=interval_weeks,
+                start_minute=start_minute,
+                end_minute=end_minute,
+                start_date=start_date,
+                end_date=end_date,
+                notes=data.get('notes', '')
+            )
+            slots = session_series.occurrences(series)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Teacher and student must be free at every occurrence
+        if not data.get('allow_overlap'):
+            conflicts = scheduling.find_series_conflicts(session, slots, teacher_id=teacher.id, student_id=student.id)
+            if conflicts:
+                return jsonify({
+                    'error': 'Series overlaps existing sessions of the teacher or student (send "allow_overlap": true to book anyway)',
+                    'conflicts': conflicts
+                }), 409
+        
+        try:
+            sessions = session_series.generate(session, series)
+        except ValueError as e:
+            session.rollback()
+            return jsonify({'error': str(e)}), 400
+        except ledger.InsufficientBalanceError as e:
+            session.rollback()
+            return jsonify({'error': str(e)}), 400
+        
+        # Built before the commit expires the sessions, which would reload them one by one
+        result = series_to_dict(series, sessions)
+        session.commit()
+        
+        return jsonify(result), 201
+    
+    except ClosedPeriodError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
+@bp.route('/series/<int:series_id>', methods=['PUT'])
+def update_series(series_id):
+    """Change the times, teacher or notes of a series' sessions from from_date (default today) on"""
+    session = Session()
+    try:
+        series = session.query(SessionSeries).filter(SessionSeries.id == series_id).first()
+        
+        if not series:
+            return jsonify({'error': 'Series not found'}), 404
+        
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        try:
+            from_date = parse_from_date(data.get('from_date'))
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        start_minute = end_minute = None
+        if 'start_time' in data or 'end_time' in data:
+            try:
+                start_minute, end_minute = session_series.parse_slot(
+                    data.get('start_time', series.start_time), data.get('end_time', series.end_time)
+                )
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        
+        teacher_id = None
+        if data.get('teacher_id') is not None:
+            teacher = reference_cache.get_reference_data(session).teacher(session, data['teacher_id'])
+            if not teacher:
+                return jsonify({'error': 'Teacher not found'}), 404
+            teacher_id = teacher.id
+        
+        # New times or teacher must not overlap other sessions (the series' own changed sessions excepted)
+        if (start_minute is not None or teacher_id is not None) and not data.get('allow_overlap'):
+            rows = session.query(SessionModel.id, SessionModel.date).filter(
+                SessionModel.series_id == series.id, SessionModel.date >= from_date
+            ).all()
+            slots = [
+                (row_date, series.start_minute if start_minute is None else start_minute,
+                 series.end_minute if end_minute is None else end_minute)
+                for _, row_date in rows
+            ]
+            conflicts = scheduling.find_series_conflicts(
+                session, slots, teacher_id=teacher_id or series.teacher_id, student_id=series.student_id,
+                exclude_ids={row_id for row_id, _ in rows}
+            )
+            if conflicts:
+                return jsonify({
+                    'error': 'Series overlaps existing sessions of the teacher or student (send "allow_overlap": true to book anyway)',
+                    'conflicts': conflicts
+                }), 409
+        
+        try:
+            updated = session_series.update_occurrences(
+                session, series, from_date, start_minute, end_minute, teacher_id, data.get('notes')
+            )
+        except ledger.InsufficientBalanceError as e:
+            session.rollback()
+            return jsonify({
+                'error': f'Insufficient balance for increase. Available: {e.available:.1f}h, Required: {e.required:.1f}h'
+            }), 400
+        
+        session.commit()
+        
+        response = series_to_dict(series)
+        response['sessions_updated'] = updated
+        return jsonify(response)
+    
+    except ClosedPeriodError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
+@bp.route('/series/<int:series_id>', methods=['DELETE'])
+def cancel_series(series_id):
+    """Cancel a series from from_date (default today) on: delete those sessions and restore their hours"""
+    session = Session()
+    try:
+        series = session.query(SessionSeries).filter(SessionSeries.id == series_id).first()
+        
+        if not series:
+            return jsonify({'error': 'Series not found'}), 404
+        
+        try:
+            from_date = parse_from_date(request.args.get('from_date'))
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        cancelled, hours_restored = session_series.cancel_occurrences(session, series, from_date)
+        session.commit()
+        
+        return jsonify({
+            'message': f'Cancelled {cancelled} sessions of the series',
+            'sessions_cancelled': cancelled,
+            'hours_restored': hours_restored
+        }), 200
+    
+    except ClosedPeriodError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
@@ -2,11 +2,14 @@ from flask import Blueprint, request, jsonify
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import or_
 from datetime import datetime, date
-from config.database import engine
+from config.database import engine, RoutingSession
 from models.student import Student
+from models.course import Course
+from models.period_close import ClosedPeriodError
+from services import ledger, archive
 
 # Create database session
-Session = sessionmaker(bind=engine)
+Session = sessionmaker(class_=RoutingSession, bind=engine)
 
 bp = Blueprint('students', __name__)
 
@@ -102,10 +105,28 @@ def create_student():
             grade=data.get('grade'),  # NEW: Include grade
             parent=data.get('parent'),
             contact=data.get('contact'),
-            balances=data.get('balances', {})
+            balances={}
         )
         
         session.add(student)
+        session.flush()
+        
+        # Opening balances are recorded as ledger adjustments
+        for course_name, hours in (data.get('balances') or {}).items():
+            course = session.query(Course).filter(Course.name == course_name).first()
+            if not course:
+                session.rollback()
+                return jsonify({'error': f'Course not found: {course_name}'}), 404
+            try:
+                ledger.apply_change(session, student.id, course.id, float(hours), 'adjust', note='Opening balance')
+            except (TypeError, ValueError):
+                session.rollback()
+                return jsonify({'error': f'Invalid balance for {course_name}: hours must be a number'}), 400
+            except ledger.InsufficientBalanceError:
+                session.rollback()
+                return jsonify({'error': f'Invalid balance for {course_name}: hours cannot be negative'}), 400
+        ledger.refresh_balance_mirror(session, student)
+        
         session.commit()
         session.refresh(student)
         
@@ -157,7 +178,24 @@ def update_student(student_id):
             student.contact = data['contact']
         
         if 'balances' in data:
-            student.balances = data['balances']
+            # Each balance is moved to its new value through a ledger adjustment
+            for course_name, hours in (data['balances'] or {}).items():
+                course = session.query(Course).filter(Course.name == course_name).first()
+                if not course:
+                    session.rollback()
+                    return jsonify({'error': f'Course not found: {course_name}'}), 404
+                try:
+                    hours_change = float(hours) - ledger.get_balance(session, student.id, course.id)
+                except (TypeError, ValueError):
+                    session.rollback()
+                    return jsonify({'error': f'Invalid balance for {course_name}: hours must be a number'}), 400
+                try:
+                    ledger.apply_change(session, student.id, course.id, hours_change, 'adjust', note='Balance set')
+                except ledger.InsufficientBalanceError as e:
+                    # Balance changed concurrently since it was read
+                    session.rollback()
+                    return jsonify({'error': str(e)}), 409
+            ledger.refresh_balance_mirror(session, student)
         
         student.updated_at = datetime.now().isoformat()
         
@@ -181,11 +219,16 @@ def delete_student(student_id):
         if not student:
             return jsonify({'error': 'Student not found'}), 404
         
+        ledger.delete_student_ledger(session, student.id)
+        archive.delete_student_rows(session, student.id)
         session.delete(student)
         session.commit()
         
         return jsonify({'message': 'Student deleted successfully'})
     
+    except ClosedPeriodError as e:
+        session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -233,16 +276,22 @@ def update_student_balance(student_id, course_name):
         if not data or 'hours_change' not in data:
             return jsonify({'error': 'hours_change is required'}), 400
         
+        course = session.query(Course).filter(Course.name == course_name).first()
+        if not course:
+            return jsonify({'error': 'Course not found'}), 404
+        
         hours_change = float(data['hours_change'])
-        old_balance = student.get_balance(course_name)
         
-        student.update_balance(course_name, hours_change)
-        student.updated_at = datetime.now().isoformat()
+        try:
+            new_balance = ledger.apply_change(session, student.id, course.id, hours_change, 'adjust', note=data.get('note'))
+        except ledger.InsufficientBalanceError as e:
+            session.rollback()
+            return jsonify({'error': str(e)}), 400
+        old_balance = new_balance - hours_change
+        ledger.refresh_balance_mirror(session, student)
         
         session.commit()
         
-        new_balance = student.get_balance(course_name)
-        
         return jsonify({
             'student_id': student_id,
             'student_name': student.name,
@@ -0,0 +1,160 @@
+import base64
+import json
+from flask import Blueprint, request, jsonify, current_app
+from sqlalchemy.orm import sessionmaker, selectinload
+from datetime import datetime, timedelta
+from config.database import engine, RoutingSession
+from models.student import Student
+from models.teacher import Teacher
+from models.course import Course
+from models.payment import Payment
+from models.session import Session as SessionModel
+from models.expense import Expense
+from models.tombstone import Tombstone
+from api.routes.students import student_to_dict
+from api.routes.teachers import teacher_to_dict
+from api.routes.courses import course_to_dict
+from api.routes.payments import payment_to_dict
+from api.routes.sessions import session_to_dict
+from api.routes.expenses import expense_to_dict
+
+# Create database session
+Session = sessionmaker(class_=RoutingSession, bind=engine)
+
+bp = Blueprint('sync', __name__)
+
+# Entity name -> (model, serializer, relationships to eager-load for the serializer)
+SYNC_ENTITIES = {
+    'students': (Student, student_to_dict, []),
+    'teachers': (Teacher, teacher_to_dict, []),
+    'courses': (Course, course_to_dict, ['teacher']),
+    'payments': (Payment, payment_to_dict, ['student', 'course', 'teacher']),
+    'sessions': (SessionModel, session_to_dict, ['student', 'course', 'teacher']),
+    'expenses': (Expense, expense_to_dict, [])
+}
+
+# Most rows per entity (and deletions) one page may return
+MAX_PAGE_SIZE = 5000
+
+def parse_cursor(cursor):
+    """Validate a sync cursor (ISO timestamp) and return it in canonical form"""
+    return datetime.fromisoformat(cursor).isoformat()
+
+def encode_page(state):
+    """Opaque continuation token of a partly returned sync"""
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+def decode_page(token):
+    """State of a continuation token; raises ValueError"""
+    state = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    if not isinstance(state, dict) or not isinstance(state.get('after'), dict) or not state.get('cursor'):
+        raise ValueError("Malformed page token")
+    if not all(isinstance(last_id, int) for last_id in state['after'].values()):
+        raise ValueError("Malformed page token")
+    if state.get('since'):
+        parse_cursor(state['since'])
+    parse_cursor(state['cursor'])
+    return state
+
+@bp.route('/', methods=['GET'])
+def get_changes():
+    """Get rows inserted, updated or deleted since a cursor across all entities.
+    
+    At most `limit` rows per entity, and `limit` deletions, are returned. When
+    more remain, `has_more` is true and `next` is a token to pass as `page`;
+    the `cursor` of the first page is the one to poll with afterwards.
+    """
+    session = Session()
+    try:
+        try:
+            limit = int(request.args.get('limit') or current_app.config.get('SYNC_PAGE_SIZE', 500))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({'error': f'limit must be a whole number from 1 to {MAX_PAGE_SIZE}'}), 400
+        
+        page = request.args.get('page', '').strip()
+        if page:
+            # Continuation: same since and cursor, after the last ids already returned
+            state = decode_page(page)
+            since = state.get('since')
+            next_cursor = state['cursor']
+            after = {entity: last_id for entity, last_id in state['after'].items() if entity in SYNC_ENTITIES}
+            deleted_after = state.get('deleted_after')
+            if deleted_after is not None and not isinstance(deleted_after, int):
+                raise ValueError("Malformed page token")
+        else:
+            since = request.args.get('since', '').strip()
+            since = parse_cursor(since) if since else None
+            
+            # The next cursor trails the clock so rows committed by slower concurrent
+            # transactions (with an earlier updated_at) are picked up by the next poll.
+            # Clients upsert by id, so re-sending a few recent rows is harmless.
+            lag_seconds = current_app.config.get('SYNC_CURSOR_LAG_SECONDS', 5)
+            next_cursor = (datetime.now() - timedelta(seconds=lag_seconds)).isoformat()
+            after = {entity: 0 for entity in SYNC_ENTITIES}
+            deleted_after = 0 if since else None
+        
+        changes = {}
+        more_after = {}
+        for entity, (model, to_dict, eager) in SYNC_ENTITIES.items():
+            inserted = []
+            updated = []
+            if entity in after:
+                query = session.query(model).options(
+                    *[selectinload(getattr(model, name)) for name in eager]
+                ).filter(model.id > after[entity])
+                if since:
+                    query = query.filter(model.updated_at >= since)
+                
+                rows = query.order_by(model.id).limit(limit + 1).all()
+                if len(rows) > limit:
+                    rows = rows[:limit]
+                    more_after[entity] = rows[-1].id
+                for row in rows:
+                    if since and row.created_at and row.created_at < since:
+                        updated.append(to_dict(row))
+                    else:
+                        inserted.append(to_dict(row))
+            
+            changes[entity] = {
+                'inserted': inserted,
+                'updated': updated,
+                'deleted': []
+            }
+        
+        # Deletions of all entities in one query
+        more_deleted_after = None
+        if since and deleted_after is not None:
+            tombstones = session.query(Tombstone.id, Tombstone.entity, Tombstone.entity_id).filter(
+                Tombstone.entity.in_(list(SYNC_ENTITIES)),
+                Tombstone.deleted_at >= since,
+                Tombstone.id > deleted_after
+            ).order_by(Tombstone.id).limit(limit + 1).all()
+            if len(tombstones) > limit:
+                tombstones = tombstones[:limit]
+                more_deleted_after = tombstones[-1].id
+            for _, entity, entity_id in tombstones:
+                changes[entity]['deleted'].append(entity_id)
+        
+        has_more = bool(more_after) or more_deleted_after is not None
+        return jsonify({
+            'since': since,
+            'cursor': next_cursor,
+            'full': since is None,
+            'has_more': has_more,
+            'next': encode_page({
+                'since': since,
+                'cursor': next_cursor,
+                'after': more_after,
+                'deleted_after': more_deleted_after
+            }) if has_more else None,
+            'changes': changes
+        })
+    
+    except ValueError as e:
+        return jsonify({'error': 'Invalid cursor or page. Use the cursor or next token returned by a previous sync'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
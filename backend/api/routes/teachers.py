@@ -1,12 +1,13 @@
 from flask import Blueprint, request, jsonify
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import or_
-from datetime import datetime, date
-from config.database import engine
+from datetime import datetime, date, timedelta
+from config.database import engine, RoutingSession
 from models.teacher import Teacher
+from services import reference_cache, payroll, archive
 
 # Create database session
-Session = sessionmaker(bind=engine)
+Session = sessionmaker(class_=RoutingSession, bind=engine)
 
 bp = Blueprint('teachers', __name__)
 
@@ -82,6 +83,7 @@ def create_teacher():
         )
         
         session.add(teacher)
+        reference_cache.invalidate(session)
         session.commit()
         session.refresh(teacher)
         
@@ -129,6 +131,7 @@ def update_teacher(teacher_id):
         
         teacher.updated_at = datetime.now().isoformat()
         
+        reference_cache.invalidate(session)
         session.commit()
         
         return jsonify(teacher_to_dict(teacher))
@@ -165,6 +168,7 @@ def set_grade_rate(teacher_id):
         teacher.set_rate_for_grade(grade, rate)
         teacher.updated_at = datetime.now().isoformat()
         
+        reference_cache.invalidate(session)
         session.commit()
         
         return jsonify({
@@ -191,12 +195,13 @@ def delete_teacher(teacher_id):
             return jsonify({'error': 'Teacher not found'}), 404
         
         # Check if teacher has associated courses, payments, or sessions
-        if teacher.courses or teacher.payments or teacher.sessions:
+        if teacher.courses or teacher.payments or teacher.sessions or archive.has_rows(session, teacher_id=teacher.id):
             return jsonify({
                 'error': 'Cannot delete teacher with associated courses, payments, or sessions'
             }), 400
         
         session.delete(teacher)
+        reference_cache.invalidate(session)
         session.commit()
         
         return jsonify({'message': 'Teacher deleted successfully'})
@@ -224,14 +229,14 @@ def get_teacher_stats(teacher_id):
         start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
         end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
         
-        total_hours = teacher.calculate_total_hours(start_date_obj, end_date_obj)
-        total_salary = teacher.calculate_salary(start_date_obj, end_date_obj)
+        # Aggregated in SQL against the grade-rate matrix instead of loading the session history
+        teacher_payroll = payroll.teacher_payroll(session, teacher.id, start_date_obj, end_date_obj)
         
         return jsonify({
             'teacher_id': teacher.id,
             'teacher_name': teacher.name,
-            'total_hours': total_hours,
-            'total_salary': total_salary,
+            'total_hours': teacher_payroll['total_hours'],
+            'total_salary': teacher_payroll['total_salary'],
             'default_rate': teacher.default_rate,
             'grade_rates': teacher.grade_rates or {},
             'period': {
@@ -245,4 +250,39 @@ def get_teacher_stats(teacher_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     finally:
-        session.close() 
\ No newline at end of file
+        session.close() 
+
+@bp.route('/payroll/', methods=['GET'])
+def get_payroll():
+    """Hours, sessions and salary of every teacher in a period, broken down by student grade"""
+    session = Session()
+    try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        
+        # Default to the current calendar month
+        today = date.today()
+        if start_date:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+        else:
+            start_date = today.replace(day=1)
+        
+        if end_date:
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+        else:
+            end_date = (today.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        
+        report = payroll.build_payroll(payroll.payroll_groups(session, start_date, end_date))
+        report['period'] = {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        }
+        
+        return jsonify(report)
+    
+    except ValueError as e:
+        return jsonify({'error': f'Invalid date format: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
\ No newline at end of file
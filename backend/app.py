@@ -1,8 +1,57 @@
-from flask import Flask, send_from_directory
+from flask import Flask, send_from_directory, request, jsonify, g
 from flask_cors import CORS
 from config.settings import config
-from config.database import init_db
+from config.database import init_db, all_engines
+from config.tenancy import DEFAULT_CENTER_ID, set_current_center, reset_current_center
 import os
+import threading
+
+def initialize_database():
+    """Create missing tables (skipped if the stored schema version is current)"""
+    try:
+        print("Initializing database...")
+        init_db()
+        print("Database initialized successfully!")
+    except Exception as e:
+        print(f"Database initialization error: {e}")
+        # Continue anyway - the app might still work
+
+def initialize_database_on_first_request(app):
+    """Defer database initialization until the app serves its first request"""
+    lock = threading.Lock()
+    state = {'initialized': False}
+    
+    @app.before_request
+    def ensure_database_initialized():
+        if state['initialized']:
+            return
+        with lock:
+            if not state['initialized']:
+                initialize_database()
+                state['initialized'] = True
+
+def scope_requests_to_center(app):
+    """Serve each API request as the center named in its X-Center-Id header (DEFAULT_CENTER_ID if absent)"""
+    
+    @app.before_request
+    def enter_center_scope():
+        header = request.headers.get('X-Center-Id')
+        if header is None:
+            center_id = DEFAULT_CENTER_ID
+        else:
+            try:
+                center_id = int(header)
+            except ValueError:
+                center_id = 0
+            if center_id < 1:
+                return jsonify({'error': 'X-Center-Id must be a positive integer'}), 400
+        g.center_token = set_current_center(center_id)
+    
+    @app.teardown_request
+    def leave_center_scope(exc):
+        token = g.pop('center_token', None)
+        if token is not None:
+            reset_current_center(token)
 
 def create_app(config_name=None):
     """Application factory pattern"""
@@ -22,20 +71,42 @@ def create_app(config_name=None):
              'null'
          ],
          methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-         allow_headers=['Content-Type', 'Authorization'],
+         allow_headers=['Content-Type', 'Authorization', 'X-Center-Id'],
          supports_credentials=True)
     
-    # Initialize database
-    try:
-        print("Initializing database...")
-        init_db()
-        print("Database initialized successfully!")
-    except Exception as e:
-        print(f"Database initialization error: {e}")
-        # Continue anyway - the app might still work
+    # Initialize database now, or on the first request in lazy startup mode
+    if app.config['STARTUP_MODE'] == 'lazy':
+        initialize_database_on_first_request(app)
+    else:
+        initialize_database()
+    
+    # Every query of a request only sees the rows of the request's center
+    scope_requests_to_center(app)
+    
+    # Request latency, response size and SQL metrics, exposed at /metrics
+    if app.config['METRICS_ENABLED']:
+        from instrumentation.metrics import init_metrics
+        init_metrics(app, *all_engines())
+    
+    # Development/test check for lazy loads in loops (no hooks when NPLUSONE_MODE is 'off')
+    if app.config['NPLUSONE_MODE'] != 'off':
+        from instrumentation.nplusone import init_nplusone
+        init_nplusone(app, *all_engines())
+    
+    # On-demand profiling of single requests (off, with no hooks, unless PROFILING_ENABLED)
+    if app.config['PROFILING_ENABLED']:
+        from instrumentation.profiling import init_profiling
+        init_profiling(app, *all_engines())
+    
+    # Change events written with each transaction, optionally delivered by a thread of this process
+    if app.config['OUTBOX_ENABLED']:
+        from services import outbox
+        outbox.enable()
+        if app.config['OUTBOX_DISPATCHER'] == 'thread':
+            outbox.start_dispatcher_thread(app.config)
     
     # Register blueprints (routes)
-    from api.routes import students, teachers, courses, payments, sessions, expenses, reports
+    from api.routes import students, teachers, courses, payments, sessions, expenses, reports, sync
     
     api_prefix = app.config['API_PREFIX']
     app.register_blueprint(students.bp, url_prefix=f"{api_prefix}/students")
@@ -45,6 +116,7 @@ def create_app(config_name=None):
     app.register_blueprint(sessions.bp, url_prefix=f"{api_prefix}/sessions")
     app.register_blueprint(expenses.bp, url_prefix=f"{api_prefix}/expenses")
     app.register_blueprint(reports.bp, url_prefix=f"{api_prefix}/reports")
+    app.register_blueprint(sync.bp, url_prefix=f"{api_prefix}/sync")
     
     # Health check endpoint
     @app.route('/health')
@@ -77,7 +149,9 @@ def create_app(config_name=None):
                 "payments": f"{api_prefix}/payments",
                 "sessions": f"{api_prefix}/sessions",
                 "expenses": f"{api_prefix}/expenses",
-                "reports": f"{api_prefix}/reports"
+                "reports": f"{api_prefix}/reports",
+                "sync": f"{api_prefix}/sync",
+                "metrics": "/metrics"
             }
         }
     
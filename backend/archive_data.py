@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Hot/cold archiving CLI
+Moves payments and sessions older than the archive horizon into the archive
+tables (or ARCHIVE_DATABASE_URL), or restores archived rows to the live tables.
+Rows are moved in batches, one transaction per batch, so the job can be stopped
+and run again at any time. Runs for every center unless --center-id is given.
+
+Usage: python archive_data.py archive [--months 24 | --before 2024-01-01] [--batch-size 1000] [--center-id 1]
+       python archive_data.py restore [--start-date 2023-01-01] [--end-date 2023-12-31] [--student-id 7] [--center-id 1]
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from sqlalchemy import select
+from config.database import init_db, SessionLocal, center_engines
+from config.tenancy import center_scope
+from models.student import Student
+from models.archive import ArchiveWatermark
+from services import archive
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def _centers():
+    """Centers of the main database plus every center with its own database"""
+    session = SessionLocal()
+    try:
+        centers = set(session.execute(select(Student.center_id).distinct()).scalars())
+        centers |= set(session.execute(select(ArchiveWatermark.center_id)).scalars())
+    finally:
+        session.close()
+    return sorted(centers | set(center_engines))
+
+def _progress(table_name, count):
+    print(f"   {table_name}: {count} rows moved", file=sys.stderr)
+
+def run_for_centers(action, center_id=None, **options):
+    """Run archive.archive or archive.restore for one center or all of them; returns {center_id: counts}"""
+    results = {}
+    for center in ([center_id] if center_id is not None else _centers()):
+        print(f"\n🔄 Center {center}...")
+        with center_scope(center):
+            session = SessionLocal()
+            try:
+                results[center] = action(session, progress=_progress, **options)
+                print(f"✅ Center {center}: {results[center]['payments']} payments, {results[center]['sessions']} sessions")
+            except Exception as e:
+                print(f"❌ Center {center} failed: {e}")
+                session.rollback()
+                raise
+            finally:
+                session.close()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Archive old payments and sessions, or restore them')
+    parser.add_argument('--center-id', type=int, help='only this center (default: every center)')
+    parser.add_argument('--batch-size', type=int, default=archive.ARCHIVE_BATCH_SIZE, help='rows per transaction')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    archive_parser = commands.add_parser('archive', help='move rows older than the horizon to the archive')
+    archive_parser.add_argument('--months', type=int, default=archive.ARCHIVE_HORIZON_MONTHS, help='whole months kept live')
+    archive_parser.add_argument('--before', type=_parse_date, help='archive rows dated before this day instead (YYYY-MM-DD)')
+    
+    restore_parser = commands.add_parser('restore', help='move archived rows back to the live tables')
+    restore_parser.add_argument('--start-date', type=_parse_date, help='first day to restore (YYYY-MM-DD)')
+    restore_parser.add_argument('--end-date', type=_parse_date, help='last day to restore (YYYY-MM-DD)')
+    restore_parser.add_argument('--student-id', type=int, help='only this student')
+    args = parser.parse_args()
+    
+    init_db()  # Ensure the archive tables exist
+    if args.command == 'archive':
+        cutoff = args.before or archive.horizon_cutoff(months=args.months)
+        print(f"🔄 Archiving payments and sessions dated before {cutoff.isoformat()}...")
+        run_for_centers(archive.archive, args.center_id, cutoff=cutoff, batch_size=args.batch_size)
+    else:
+        print("🔄 Restoring archived payments and sessions...")
+        run_for_centers(
+            archive.restore, args.center_id,
+            start_date=args.start_date, end_date=args.end_date, student_id=args.student_id, batch_size=args.batch_size
+        )
+    print("\n🎉 Done!")
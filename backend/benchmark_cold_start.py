@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Cold start benchmark
+Starts fresh Python processes and measures how long it takes until the app is
+imported, built, and has answered its first request, for both entry points
+(`app.py` and the Vercel `api/index.py`) in eager and lazy startup modes.
+
+Usage: python backend/benchmark_cold_start.py [--runs 5] [--database-url URL]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BACKEND_DIR)
+
+# Runs in a fresh interpreter; prints {"import": s, "first_request": s} as the last line
+PROBE = '''
+import json, os, sys, time
+started = time.perf_counter()
+if {entry!r} == 'api/index.py':
+    sys.path.insert(0, os.path.join({project_dir!r}, 'api'))
+    import index
+    app = index.app
+else:
+    sys.path.insert(0, {backend_dir!r})
+    from app import create_app
+    app = create_app('production')
+imported = time.perf_counter()
+
+def start_response(status, headers, exc_info=None):
+    assert status.startswith('200'), status
+
+environ = {{
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api/v1/expenses/', 'QUERY_STRING': '',
+    'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+    'wsgi.url_scheme': 'http', 'wsgi.input': sys.stdin.buffer, 'wsgi.errors': sys.stderr,
+    'wsgi.multithread': False, 'wsgi.multiprocess': False, 'wsgi.run_once': False
+}}
+b''.join(app(environ, start_response))
+answered = time.perf_counter()
+print(json.dumps({{'import': imported - started, 'first_request': answered - imported}}))
+'''
+
+def probe(entry, startup_mode, database_url):
+    """Time one cold start in a new process"""
+    env = dict(os.environ, STARTUP_MODE=startup_mode, DATABASE_URL=database_url, FLASK_ENV='production')
+    code = PROBE.format(entry=entry, project_dir=PROJECT_DIR, backend_dir=BACKEND_DIR)
+    result = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def run_benchmark(runs, database_url):
+    # Warm-up start, so the database exists and records the current schema version
+    probe('app.py', 'eager', database_url)
+
+    print(f"{'entry point':<14}{'mode':<8}{'import (ms)':>14}{'first request (ms)':>22}{'total (ms)':>14}")
+    for entry in ('app.py', 'api/index.py'):
+        for startup_mode in ('eager', 'lazy'):
+            timings = [probe(entry, startup_mode, database_url) for _ in range(runs)]
+            imported = statistics.median(t['import'] for t in timings) * 1000
+            first_request = statistics.median(t['first_request'] for t in timings) * 1000
+            total = statistics.median(t['import'] + t['first_request'] for t in timings) * 1000
+            print(f"{entry:<14}{startup_mode:<8}{imported:>14.1f}{first_request:>22.1f}{total:>14.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure cold start time of the API entry points')
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per configuration (median is reported)')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL', 'sqlite:///benchmark_cold_start.db'))
+    args = parser.parse_args()
+    run_benchmark(args.runs, args.database_url)
@@ -1,24 +1,121 @@
+import json
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc, text, select, insert, func, Table, Column, Integer, String
+from datetime import datetime
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from config.tenancy import current_center_id
 
 # Database configuration
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///tutoring_center.db')
 
-# Create engine
-engine = create_engine(
-    DATABASE_URL,
-    echo=True if os.getenv('DEBUG') else False,
-    connect_args={"check_same_thread": False} if 'sqlite' in DATABASE_URL else {}
-)
+# Optional per-center databases, as JSON: {"<center_id>": "<database url>"}.
+# Centers not listed use DATABASE_URL.
+CENTER_DATABASE_URLS = {
+    int(center_id): url for center_id, url in json.loads(os.getenv('CENTER_DATABASE_URLS') or '{}').items()
+}
+
+# Optional separate database for archived payments and sessions (services.archive).
+# Without it the archive tables live next to the live tables of each database.
+ARCHIVE_DATABASE_URL = os.getenv('ARCHIVE_DATABASE_URL')
+
+# PID of the process that owns the current connection pools (see dispose_engine_after_fork)
+_pool_pid = os.getpid()
+
+def _record_connection_pid(dbapi_connection, connection_record):
+    connection_record.info['pid'] = os.getpid()
+
+def _check_connection_pid(dbapi_connection, connection_record, connection_proxy):
+    """Never hand a connection opened by a parent process to a forked worker"""
+    pid = os.getpid()
+    if connection_record.info.get('pid') != pid:
+        connection_record.dbapi_connection = connection_proxy.dbapi_connection = None
+        raise exc.DisconnectionError(
+            f"Connection record belongs to pid {connection_record.info.get('pid')}, "
+            f"attempting to check out in pid {pid}"
+        )
+
+def _create_engine(url):
+    db_engine = create_engine(
+        url,
+        echo=True if os.getenv('DEBUG') else False,
+        connect_args={"check_same_thread": False} if 'sqlite' in url else {}
+    )
+    event.listen(db_engine, 'connect', _record_connection_pid)
+    event.listen(db_engine, 'checkout', _check_connection_pid)
+    return db_engine
+
+# Create engines
+engine = _create_engine(DATABASE_URL)
+center_engines = {center_id: _create_engine(url) for center_id, url in CENTER_DATABASE_URLS.items()}
+archive_engine = _create_engine(ARCHIVE_DATABASE_URL) if ARCHIVE_DATABASE_URL else None
+
+def engine_for_center(center_id):
+    """Engine holding a center's data"""
+    return center_engines.get(center_id, engine)
+
+def live_engines():
+    """The default engine followed by every per-center engine"""
+    return [engine] + list(center_engines.values())
+
+def all_engines():
+    """Every engine: the live ones and the archive engine, if configured"""
+    return live_engines() + ([archive_engine] if archive_engine is not None else [])
+
+def dispose_engine_after_fork():
+    """Give a forked worker process its own connection pools.
+    
+    close=False leaves the parent's connections alone; the child simply forgets them.
+    """
+    global _pool_pid
+    for db_engine in all_engines():
+        db_engine.dispose(close=False)
+    _pool_pid = os.getpid()
+
+def verify_engine_pool():
+    """Startup self-check: the pools were created in this process and hand out working connections"""
+    pid = os.getpid()
+    if _pool_pid != pid:
+        raise RuntimeError(f"Engine pool was created in pid {_pool_pid} but is used in pid {pid}; "
+                           f"call dispose_engine_after_fork() in the worker after fork")
+    
+    for db_engine in all_engines():
+        with db_engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+            owner = connection.connection.info.get('pid')
+            if owner != pid:
+                raise RuntimeError(f"Checked out a connection opened by pid {owner} in pid {pid}")
+
+class RoutingSession(Session):
+    """Session that runs each center's statements on that center's database, and archive statements on the archive database"""
+    
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if archive_engine is not None and mapper is not None and mapper.local_table.metadata is ArchiveBase.metadata:
+            return archive_engine
+        if center_engines:
+            return engine_for_center(current_center_id())
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
 
 # Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
 
 # Base class for models
 Base = declarative_base()
 
+# Base class for archive tables, kept apart so they can live in ARCHIVE_DATABASE_URL
+ArchiveBase = declarative_base()
+
+# Version of the table layout defined by the models. Bump it whenever a model or
+# table is added or changed, so init_db runs create_all again on the next start.
+SCHEMA_VERSION = 10
+
+# Single row recording the schema version the database was last initialized with
+schema_version_table = Table(
+    'schema_version', Base.metadata,
+    Column('version', Integer, primary_key=True),
+    Column('applied_at', String, nullable=False)
+)
+
 def get_db():
     """Database dependency for getting database session"""
     db = SessionLocal()
@@ -27,9 +124,29 @@ def get_db():
     finally:
         db.close()
 
-def init_db():
-    """Initialize database - create all tables"""
-    print(f"Creating tables with database URL: {DATABASE_URL}")
+def get_stored_schema_version(db_engine=None):
+    """Schema version recorded in a database (default: the main one), or None if it was never initialized"""
+    try:
+        with (db_engine or engine).connect() as connection:
+            return connection.execute(select(func.max(schema_version_table.c.version))).scalar()
+    except exc.DBAPIError:
+        # schema_version table doesn't exist yet
+        return None
+
+def init_db(force=False):
+    """Initialize database - create all tables.
+    
+    Skipped (one SELECT instead of introspecting every table) when the database
+    already records the current SCHEMA_VERSION, unless force is set.
+    Returns True if tables were created or checked.
+    """
+    engines = [
+        db_engine for db_engine in all_engines()
+        if force or (get_stored_schema_version(db_engine) or 0) < SCHEMA_VERSION
+    ]
+    if not engines:
+        print(f"Database schema is at version {SCHEMA_VERSION}, skipping table creation")
+        return False
     
     # Import all models to ensure they're registered with Base
     try:
@@ -39,7 +156,16 @@ def init_db():
         from models.course import Course
         from models.payment import Payment
         from models.session import Session
+        from models.session_series import SessionSeries
         from models.expense import Expense
+        from models.tombstone import Tombstone
+        from models.hours_balance import HoursBalance
+        from models.hours_ledger import HoursLedgerEntry
+        from models.cache_version import CacheVersion
+        from models.teacher_grade_rate import TeacherGradeRate
+        from models.period_close import PeriodClose, PeriodSummarySnapshot, PeriodCourseSnapshot, PeriodTeacherSnapshot, PeriodGradeSnapshot
+        from models.archive import ArchivedPayment, ArchivedSession, ArchiveWatermark
+        from models.outbox import OutboxEvent, OutboxCursor, OutboxGap
     except ImportError:
         # Fallback to absolute imports (for local development)
         from backend.models.student import Student
@@ -47,7 +173,32 @@ def init_db():
         from backend.models.course import Course
         from backend.models.payment import Payment
         from backend.models.session import Session
+        from backend.models.session_series import SessionSeries
         from backend.models.expense import Expense
+        from backend.models.tombstone import Tombstone
+        from backend.models.hours_balance import HoursBalance
+        from backend.models.hours_ledger import HoursLedgerEntry
+        from backend.models.cache_version import CacheVersion
+        from backend.models.teacher_grade_rate import TeacherGradeRate
+        from backend.models.period_close import PeriodClose, PeriodSummarySnapshot, PeriodCourseSnapshot, PeriodTeacherSnapshot, PeriodGradeSnapshot
+        from backend.models.archive import ArchivedPayment, ArchivedSession, ArchiveWatermark
+        from backend.models.outbox import OutboxEvent, OutboxCursor, OutboxGap
+    
+    for db_engine in engines:
+        print(f"Creating tables with database URL: {db_engine.url.render_as_string(hide_password=True)}")
+        if db_engine is archive_engine:
+            schema_version_table.create(bind=db_engine, checkfirst=True)
+        else:
+            Base.metadata.create_all(bind=db_engine)
+        if archive_engine is None or db_engine is archive_engine:
+            ArchiveBase.metadata.create_all(bind=db_engine)
+        
+        with db_engine.begin() as connection:
+            connection.execute(schema_version_table.delete())
+            connection.execute(insert(schema_version_table).values(
+                version=SCHEMA_VERSION,
+                applied_at=datetime.now().isoformat()
+            ))
     
-    Base.metadata.create_all(bind=engine)
-    print("All tables created successfully!") 
\ No newline at end of file
+    print("All tables created successfully!")
+    return True
\ No newline at end of file
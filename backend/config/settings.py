@@ -10,6 +10,53 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     API_PREFIX = os.environ.get('API_PREFIX', '/api/v1')
     
+    # Delta sync: how far the returned cursor trails the clock, to cover in-flight transactions
+    SYNC_CURSOR_LAG_SECONDS = int(os.environ.get('SYNC_CURSOR_LAG_SECONDS', 5))
+    # Rows per entity in one /sync page (clients may ask for fewer or more with ?limit=)
+    SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+    
+    # Composite reports: 'concurrent' runs independent sub-queries on separate pooled connections, 'serial' on one
+    REPORT_EXECUTOR_MODE = os.environ.get('REPORT_EXECUTOR_MODE', 'concurrent')
+    REPORT_EXECUTOR_WORKERS = int(os.environ.get('REPORT_EXECUTOR_WORKERS', 4))
+    
+    # Long report ranges are split into month shards, computed by a process pool (0 = in-process)
+    REPORT_SHARD_MONTHS = int(os.environ.get('REPORT_SHARD_MONTHS', 1))
+    REPORT_SHARD_WORKERS = int(os.environ.get('REPORT_SHARD_WORKERS', 0))
+    REPORT_SHARD_MIN_MONTHS = int(os.environ.get('REPORT_SHARD_MIN_MONTHS', 12))
+    
+    # 'eager' initializes the database in create_app, 'lazy' on the first request
+    STARTUP_MODE = os.environ.get('STARTUP_MODE', 'eager')
+    
+    # Request/SQL metrics at /metrics (with METRICS_TOKEN, only for "Authorization: Bearer <token>");
+    # statements slower than the threshold are logged, with their parameters only if asked for
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'false').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 500))
+    SLOW_QUERY_LOG_PARAMETERS = os.environ.get('SLOW_QUERY_LOG_PARAMETERS', 'false').lower() == 'true'
+    
+    # N+1 detector: 'log' or 'raise' when one statement shape repeats more than the threshold in a request
+    NPLUSONE_MODE = os.environ.get('NPLUSONE_MODE', 'off')
+    NPLUSONE_THRESHOLD = int(os.environ.get('NPLUSONE_THRESHOLD', 5))
+    
+    # Opt-in request profiling (X-Profile header or ?profile=); no hooks are installed when disabled
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+    PROFILING_INTERVAL_MS = float(os.environ.get('PROFILING_INTERVAL_MS', 1))
+    PROFILING_DIR = os.environ.get('PROFILING_DIR', 'profiles')
+    
+    # Transactional outbox: record change events, and deliver them to OUTBOX_SINKS (webhook, file, queue)
+    # with dispatch_outbox.py or, with OUTBOX_DISPATCHER=thread, a thread of the app process (not under serve.py)
+    OUTBOX_ENABLED = os.environ.get('OUTBOX_ENABLED', 'false').lower() == 'true'
+    OUTBOX_DISPATCHER = os.environ.get('OUTBOX_DISPATCHER', 'off')
+    OUTBOX_SINKS = os.environ.get('OUTBOX_SINKS', '')
+    OUTBOX_WEBHOOK_URL = os.environ.get('OUTBOX_WEBHOOK_URL')
+    OUTBOX_WEBHOOK_TIMEOUT_SECONDS = float(os.environ.get('OUTBOX_WEBHOOK_TIMEOUT_SECONDS', 10))
+    OUTBOX_FILE_PATH = os.environ.get('OUTBOX_FILE_PATH', 'outbox/events.jsonl')
+    OUTBOX_QUEUE_MAXSIZE = int(os.environ.get('OUTBOX_QUEUE_MAXSIZE', 10000))
+    OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 100))
+    OUTBOX_POLL_SECONDS = float(os.environ.get('OUTBOX_POLL_SECONDS', 2))
+    OUTBOX_MAX_BACKOFF_SECONDS = float(os.environ.get('OUTBOX_MAX_BACKOFF_SECONDS', 300))
+    OUTBOX_RETENTION_DAYS = int(os.environ.get('OUTBOX_RETENTION_DAYS', 7))
+    
     # CORS settings
     ALLOWED_ORIGINS = os.environ.get('ALLOWED_ORIGINS', 'http://localhost:8080,http://127.0.0.1:8080').split(',')
 
@@ -18,6 +65,8 @@ class DevelopmentConfig(Config):
     DEBUG = True
     DEVELOPMENT = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///tutoring_center.db'
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    NPLUSONE_MODE = os.environ.get('NPLUSONE_MODE', 'log')
 
 class ProductionConfig(Config):
     """Production configuration"""
@@ -42,6 +91,7 @@ class TestConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    NPLUSONE_MODE = os.environ.get('NPLUSONE_MODE', 'raise')
 
 # Configuration dictionary
 config = {
@@ -0,0 +1,78 @@
+"""
+Center (tenant) scoping.
+
+Rows of center-scoped models carry a `center_id`. The center being served is
+held in a context variable (set per request from the X-Center-Id header, see
+app.py), and while one is set:
+
+- every ORM SELECT, UPDATE and DELETE touching a scoped model, including joined,
+  aliased and lazily loaded ones, is limited to that center;
+- new rows are stamped with it on flush, and flushing a row of another center
+  raises CenterMismatchError.
+
+With no center set (scripts and migrations) queries see every center and new
+rows go to DEFAULT_CENTER_ID.
+"""
+
+import contextvars
+import os
+from contextlib import contextmanager
+from sqlalchemy import Column, Integer, event
+from sqlalchemy.orm import Session, with_loader_criteria
+
+DEFAULT_CENTER_ID = int(os.getenv('DEFAULT_CENTER_ID', '1'))
+
+_current_center = contextvars.ContextVar('current_center', default=None)
+
+class CenterMismatchError(Exception):
+    """Raised when a flush would write a row belonging to another center"""
+
+def current_center_id():
+    """Center being served, or None outside a center scope"""
+    return _current_center.get()
+
+def set_current_center(center_id):
+    """Enter a center scope; returns a token for reset_current_center"""
+    return _current_center.set(center_id)
+
+def reset_current_center(token):
+    _current_center.reset(token)
+
+@contextmanager
+def center_scope(center_id):
+    """Run a block as center `center_id` (None: unscoped)"""
+    token = _current_center.set(center_id)
+    try:
+        yield
+    finally:
+        _current_center.reset(token)
+
+class CenterScoped:
+    """Mixin for models partitioned by center. Give each model center-leading indexes."""
+    
+    center_id = Column(Integer, nullable=False, default=lambda: current_center_id() or DEFAULT_CENTER_ID)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _limit_to_center(execute_state):
+    center_id = current_center_id()
+    if center_id is None or execute_state.is_column_load:
+        return
+    if execute_state.is_select or execute_state.is_update or execute_state.is_delete:
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(CenterScoped, lambda cls: cls.center_id == center_id, include_aliases=True)
+        )
+
+@event.listens_for(Session, 'before_flush')
+def _stamp_center(session, flush_context, instances):
+    center_id = current_center_id()
+    for obj in session.new:
+        if isinstance(obj, CenterScoped) and obj.center_id is None:
+            obj.center_id = center_id or DEFAULT_CENTER_ID
+    if center_id is None:
+        return
+    
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, CenterScoped) and obj.center_id != center_id:
+            raise CenterMismatchError(
+                f"{type(obj).__name__} belongs to center {obj.center_id}, not to center {center_id}"
+            )
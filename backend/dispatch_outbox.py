@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Outbox dispatcher CLI
+Delivers the change events recorded in outbox_events (OUTBOX_ENABLED) to the
+sinks in OUTBOX_SINKS: a webhook (OUTBOX_WEBHOOK_URL), a JSON-lines file
+(OUTBOX_FILE_PATH) or the in-process queue. Runs until interrupted, or once
+with --once. Run a single dispatcher per deployment; a second one only causes
+duplicate deliveries.
+
+Usage: python dispatch_outbox.py [--once] [--sinks webhook,file] [--batch-size 100]
+"""
+
+import argparse
+import sys
+from config.database import init_db
+from config.settings import Config
+from services import outbox
+
+def run_dispatcher(config, once=False):
+    """Deliver pending events once, or until interrupted"""
+    
+    try:
+        dispatcher = outbox.Dispatcher.from_config(config)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    
+    sink_names = ', '.join(sink.name for sink in dispatcher.sinks)
+    if once:
+        print(f"🔄 Delivering pending events to {sink_names}...")
+        total = 0
+        while True:
+            delivered = dispatcher.dispatch_once()
+            total += delivered
+            if not delivered:
+                break
+        print(f"✅ {total} event deliveries")
+        if dispatcher.failures:
+            print(f"⚠️ {len(dispatcher.failures)} sink(s) failed, their events stay pending")
+        return total
+    
+    print(f"🔄 Dispatching events to {sink_names} every {dispatcher.poll_seconds}s (Ctrl+C to stop)...")
+    try:
+        dispatcher.run()
+    except KeyboardInterrupt:
+        print("\n👋 Dispatcher stopped")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Deliver outbox events to the configured sinks')
+    parser.add_argument('--once', action='store_true', help='deliver the pending events and exit')
+    parser.add_argument('--sinks', help='comma-separated sinks (default: OUTBOX_SINKS)')
+    parser.add_argument('--batch-size', type=int, help='events per delivery (default: OUTBOX_BATCH_SIZE)')
+    args = parser.parse_args()
+    
+    config = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+    if args.sinks:
+        config['OUTBOX_SINKS'] = args.sinks
+    if args.batch_size:
+        config['OUTBOX_BATCH_SIZE'] = args.batch_size
+    
+    init_db()
+    run_dispatcher(config, args.once)
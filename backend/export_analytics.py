@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Columnar analytics export CLI
+Writes payments, sessions and expenses, denormalized with student grade and
+course and teacher names, to Parquet or Arrow IPC files in an output
+directory. The first run (or --full) exports every row; later runs only export
+the rows changed and the ids deleted since the previous run, using the cursors
+kept in the directory's manifest.json. Needs pyarrow (pip install pyarrow).
+
+Usage: python export_analytics.py [--output exports] [--format parquet|arrow] [--full]
+                                  [--tables payments,sessions,expenses] [--row-group-size 50000] [--center-id 1]
+"""
+
+import argparse
+import os
+import sys
+from contextlib import nullcontext
+from config.database import init_db, SessionLocal
+from config.tenancy import center_scope
+from services import analytics_export
+
+def run_export(output_dir, file_format='parquet', tables=None, full=False,
+               row_group_size=analytics_export.DEFAULT_ROW_GROUP_SIZE, center_id=None):
+    """Export to output_dir (one center with center_id, else every center of the main database)"""
+    
+    print(f"🔄 Exporting {', '.join(tables or analytics_export.EXPORT_TABLES)} to {output_dir} ({file_format})...")
+    os.makedirs(output_dir, exist_ok=True)
+    
+    with center_scope(center_id) if center_id is not None else nullcontext():
+        session = SessionLocal()
+        try:
+            results = analytics_export.export(
+                session, output_dir, file_format, tables, full, row_group_size, center_id
+            )
+            for table_name, result in results.items():
+                deleted = f", {result['deleted']} deleted" if result['mode'] == 'delta' else ''
+                print(f"✅ {table_name}: {result['rows']} rows ({result['mode']}){deleted}")
+            print("\n🎉 Export completed successfully!")
+            return results
+        
+        except analytics_export.ExportError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        except Exception as e:
+            print(f"❌ Export failed: {e}")
+            raise
+        finally:
+            session.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export payments, sessions and expenses to columnar files')
+    parser.add_argument('--output', default=os.getenv('EXPORT_DIR', 'exports'), help='output directory (holds manifest.json)')
+    parser.add_argument('--format', choices=list(analytics_export.EXPORT_FORMATS), default='parquet', help='file format')
+    parser.add_argument('--full', action='store_true', help='export every row instead of the changes since the last run')
+    parser.add_argument('--tables', help='comma-separated tables (default: payments,sessions,expenses)')
+    parser.add_argument('--row-group-size', type=int, default=analytics_export.DEFAULT_ROW_GROUP_SIZE, help='rows per row group / record batch')
+    parser.add_argument('--center-id', type=int, help='only this center (needed for centers with their own database)')
+    args = parser.parse_args()
+    
+    init_db()
+    run_export(
+        args.output, args.format, args.tables.split(',') if args.tables else None,
+        args.full, args.row_group_size, args.center_id
+    )
@@ -0,0 +1 @@
+# Instrumentation package: request metrics and diagnostics for the API
\ No newline at end of file
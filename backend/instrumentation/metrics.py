@@ -0,0 +1,249 @@
+"""
+Request and database metrics, exposed at /metrics in Prometheus text format.
+
+Per Flask endpoint (blueprint route) this records a latency histogram, a
+response size histogram, and the number and total time of SQL statements,
+collected with SQLAlchemy engine events. It also records how long requests
+wait to check a connection out of the pool and logs statements slower than
+SLOW_QUERY_THRESHOLD_MS. Their bound parameters (student names, amounts) are
+only logged with SLOW_QUERY_LOG_PARAMETERS, and with METRICS_TOKEN set
+/metrics answers only requests carrying it as a bearer token.
+
+Metrics live in process memory: with several gunicorn workers each worker
+reports its own numbers, so scrape each worker or aggregate by instance.
+"""
+
+import contextvars
+import hmac
+import logging
+import threading
+import time
+from flask import g, request, Response
+from sqlalchemy import event
+
+slow_query_log = logging.getLogger('slow_query')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+# Statistics of the request being served, also seen by report executor threads
+_current_request = contextvars.ContextVar('current_request', default=None)
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in labels) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter with labels"""
+    
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(list(zip(self.label_names, key)))} {_format_value(value)}')
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+    
+    def __init__(self, name, documentation, buckets, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            labels = list(zip(self.label_names, key))
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", _format_value(bound))])} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {counts[-1]}')
+        return lines
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint',
+    LATENCY_BUCKETS, ('endpoint', 'method', 'status')
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'Response body size by endpoint',
+    SIZE_BUCKETS, ('endpoint', 'method')
+)
+REQUEST_STATEMENTS = Histogram(
+    'http_request_sql_statements', 'SQL statements issued per request by endpoint',
+    STATEMENT_BUCKETS, ('endpoint', 'method')
+)
+SQL_STATEMENTS = Counter(
+    'sql_statements_total', 'SQL statements executed, by endpoint ("none" outside requests)', ('endpoint',)
+)
+SQL_DURATION = Counter(
+    'sql_statement_duration_seconds_total', 'Time spent executing SQL statements, by endpoint', ('endpoint',)
+)
+SLOW_QUERIES = Counter(
+    'sql_slow_statements_total', 'SQL statements slower than the slow-query threshold, by endpoint', ('endpoint',)
+)
+POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting to check a connection out of the pool',
+    POOL_WAIT_BUCKETS
+)
+
+REGISTRY = (
+    REQUEST_LATENCY, RESPONSE_SIZE, REQUEST_STATEMENTS,
+    SQL_STATEMENTS, SQL_DURATION, SLOW_QUERIES, POOL_CHECKOUT_WAIT
+)
+
+class RequestStats:
+    """SQL activity of one request (shared with the threads it hands work to)"""
+    
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self._lock = threading.Lock()
+    
+    def record(self, seconds):
+        with self._lock:
+            self.statements += 1
+            self.sql_seconds += seconds
+
+def current_request_stats():
+    """RequestStats of the request being served in this context, or None"""
+    return _current_request.get()
+
+def render_metrics():
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def _instrument_engine(engine, slow_query_threshold, log_parameters=False):
+    """Register statement timing and pool wait listeners (once per engine)"""
+    engine._metrics_slow_query_threshold = slow_query_threshold
+    engine._metrics_log_parameters = log_parameters
+    if getattr(engine, '_metrics_instrumented', False):
+        return
+    engine._metrics_instrumented = True
+    
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+    
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+        stats = _current_request.get()
+        endpoint = stats.endpoint if stats is not None else 'none'
+        if stats is not None:
+            stats.record(elapsed)
+        SQL_STATEMENTS.inc(endpoint=endpoint)
+        SQL_DURATION.inc(elapsed, endpoint=endpoint)
+        
+        threshold = engine._metrics_slow_query_threshold
+        if threshold is not None and elapsed >= threshold:
+            SLOW_QUERIES.inc(endpoint=endpoint)
+            if engine._metrics_log_parameters:
+                slow_query_log.warning(
+                    "Slow query (%.1f ms) in %s: %s | parameters: %.500r",
+                    elapsed * 1000, endpoint, ' '.join(statement.split()), parameters
+                )
+            else:
+                slow_query_log.warning(
+                    "Slow query (%.1f ms) in %s: %s",
+                    elapsed * 1000, endpoint, ' '.join(statement.split())
+                )
+    
+    # The pool has no "checkout requested" event, so time the call that blocks on it
+    raw_connection = engine.raw_connection
+    
+    def timed_raw_connection():
+        started = time.perf_counter()
+        try:
+            return raw_connection()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+    
+    engine.raw_connection = timed_raw_connection
+
+def init_metrics(app, *engines):
+    """Instrument the app's requests and its database engines, and add GET /metrics"""
+    threshold_ms = app.config.get('SLOW_QUERY_THRESHOLD_MS')
+    log_parameters = app.config.get('SLOW_QUERY_LOG_PARAMETERS', False)
+    for engine in engines:
+        _instrument_engine(engine, threshold_ms / 1000.0 if threshold_ms is not None else None, log_parameters)
+    
+    @app.before_request
+    def _start_request_metrics():
+        stats = RequestStats(request.endpoint or 'unmatched')
+        g.metrics_stats = stats
+        g.metrics_token = _current_request.set(stats)
+        g.metrics_started = time.perf_counter()
+    
+    @app.after_request
+    def _record_request_metrics(response):
+        stats = g.pop('metrics_stats', None)
+        if stats is None or stats.endpoint == 'metrics':
+            return response
+        
+        method = request.method
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - g.metrics_started,
+            endpoint=stats.endpoint, method=method, status=response.status_code
+        )
+        size = response.calculate_content_length()
+        if size is not None:
+            RESPONSE_SIZE.observe(size, endpoint=stats.endpoint, method=method)
+        REQUEST_STATEMENTS.observe(stats.statements, endpoint=stats.endpoint, method=method)
+        return response
+    
+    @app.teardown_request
+    def _clear_request_metrics(exc):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            _current_request.reset(token)
+    
+    @app.route('/metrics')
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain',
+                            headers={'WWW-Authenticate': 'Bearer'})
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,146 @@
+"""
+N+1 query detector for development and tests.
+
+Counts the SQL statements of each request, grouped by normalized SQL (literals
+and parameter lists collapsed), and remembers where each statement shape was
+first issued. When one shape runs more than NPLUSONE_THRESHOLD times in a
+request - the signature of a lazy load inside a loop - the detector logs it
+('log' mode) or fails the request with NPlusOneError ('raise' mode), so new
+N+1 regressions fail in CI. In 'off' mode no hooks are installed.
+"""
+
+import contextlib
+import contextvars
+import logging
+import os
+import re
+import threading
+import traceback
+from flask import g, request
+from sqlalchemy import event
+
+NPLUSONE_MODES = ('off', 'log', 'raise')
+
+nplusone_log = logging.getLogger('nplusone')
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+_current_tracker = contextvars.ContextVar('nplusone_tracker', default=None)
+
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_NAMED_PARAMETER = re.compile(r'%\([^)]+\)s|%s|:\w+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_WHITESPACE = re.compile(r'\s+')
+
+class NPlusOneError(Exception):
+    """A statement shape repeated more than the threshold within one request"""
+    
+    def __init__(self, endpoint, offenders):
+        self.endpoint = endpoint
+        self.offenders = offenders
+        super().__init__(format_report(endpoint, offenders))
+
+def normalize_sql(statement):
+    """Statement shape: literals and parameter lists replaced by '?', whitespace collapsed"""
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NAMED_PARAMETER.sub('?', shape)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _PLACEHOLDER_LIST.sub('(?)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+def _application_stack():
+    """Frames of our own code that led to the current statement, outermost first"""
+    frames = [
+        frame for frame in traceback.extract_stack()[:-1]
+        if frame.filename.startswith(_APP_ROOT) and os.path.abspath(frame.filename) != _THIS_FILE
+    ]
+    return ''.join(traceback.format_list(frames))
+
+class QueryTracker:
+    """Statement counts of one request, by statement shape"""
+    
+    def __init__(self, endpoint, threshold):
+        self.endpoint = endpoint
+        self.threshold = threshold
+        self.counts = {}
+        self.stacks = {}
+        self._lock = threading.Lock()
+    
+    def record(self, statement):
+        shape = normalize_sql(statement)
+        with self._lock:
+            count = self.counts.get(shape, 0) + 1
+            self.counts[shape] = count
+        if count == 1:
+            self.stacks[shape] = _application_stack()
+    
+    def offenders(self):
+        """[(shape, count, stack)] for shapes repeated more than the threshold, most repeated first"""
+        repeated = [(shape, count) for shape, count in self.counts.items() if count > self.threshold]
+        repeated.sort(key=lambda item: item[1], reverse=True)
+        return [(shape, count, self.stacks.get(shape, '')) for shape, count in repeated]
+
+def format_report(endpoint, offenders):
+    lines = [f"Possible N+1 queries in {endpoint}:"]
+    for shape, count, stack in offenders:
+        lines.append(f"  {count}x {shape}")
+        lines.append("  first issued from:")
+        lines.extend(f"    {line}" for line in stack.rstrip().splitlines())
+    return '\n'.join(lines)
+
+@contextlib.contextmanager
+def suppressed():
+    """Don't count statements issued inside this block (for queries repeated by design)"""
+    token = _current_tracker.set(None)
+    try:
+        yield
+    finally:
+        _current_tracker.reset(token)
+
+def _instrument_engine(engine):
+    if getattr(engine, '_nplusone_instrumented', False):
+        return
+    engine._nplusone_instrumented = True
+    
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _count_statement(conn, cursor, statement, parameters, context, executemany):
+        tracker = _current_tracker.get()
+        if tracker is not None:
+            tracker.record(statement)
+
+def init_nplusone(app, *engines):
+    """Check every request for repeated statement shapes according to NPLUSONE_MODE"""
+    mode = app.config.get('NPLUSONE_MODE', 'off')
+    if mode not in NPLUSONE_MODES:
+        raise ValueError(f"Unknown NPLUSONE_MODE '{mode}', expected one of {NPLUSONE_MODES}")
+    if mode == 'off':
+        return
+    
+    threshold = app.config.get('NPLUSONE_THRESHOLD', 5)
+    for engine in engines:
+        _instrument_engine(engine)
+    
+    @app.before_request
+    def _start_query_tracking():
+        tracker = QueryTracker(request.endpoint or 'unmatched', threshold)
+        g.nplusone_tracker = tracker
+        g.nplusone_token = _current_tracker.set(tracker)
+    
+    @app.after_request
+    def _check_query_tracking(response):
+        tracker = g.pop('nplusone_tracker', None)
+        offenders = tracker.offenders() if tracker is not None else []
+        if not offenders:
+            return response
+        if mode == 'raise':
+            raise NPlusOneError(tracker.endpoint, offenders)
+        nplusone_log.warning(format_report(tracker.endpoint, offenders))
+        return response
+    
+    @app.teardown_request
+    def _stop_query_tracking(exc):
+        token = g.pop('nplusone_token', None)
+        if token is not None:
+            _current_tracker.reset(token)
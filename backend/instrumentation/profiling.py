@@ -0,0 +1,195 @@
+"""
+On-demand request profiling.
+
+Enabled with PROFILING_ENABLED (off by default; when off no hooks are
+installed at all). A request is profiled when it carries an `X-Profile`
+header or a `profile` query parameter:
+
+    X-Profile: 1        profile the request, save the profile under PROFILING_DIR
+                        (its file name is returned in X-Profile-File)
+    X-Profile: folded   return the profile instead of the normal response
+
+A sampling profiler records the request thread's stack every
+PROFILING_INTERVAL_MS. Samples are classified as SQL (inside SQLAlchemy's
+engine), serialization (JSON encoding and *_to_dict helpers), waiting (on
+concurrent sub-queries) or Python, and written as folded stacks with the
+category as root frame, which flamegraph.pl and speedscope read directly.
+Per-category times are also returned in a Server-Timing header, next to the
+exact SQL statement count and time measured with engine events.
+"""
+
+import contextvars
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from flask import g, request, Response
+from sqlalchemy import event
+
+CATEGORIES = ('sql', 'serialization', 'wait', 'python')
+
+_SQL_PATH = os.sep + os.path.join('sqlalchemy', 'engine') + os.sep
+_JSON_PATHS = (os.sep + os.path.join('flask', 'json') + os.sep, os.sep + 'json' + os.sep)
+_WAIT_PATH = os.sep + os.path.join('concurrent', 'futures') + os.sep
+
+_current_profile = contextvars.ContextVar('current_profile', default=None)
+
+def _frame_name(frame):
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}:{frame.f_code.co_name}"
+
+def classify(frames):
+    """Category of a sample, given its frames (root first)"""
+    filenames = [frame.f_code.co_filename for frame in frames]
+    if any(_SQL_PATH in filename for filename in filenames):
+        return 'sql'
+    if any(frame.f_code.co_name.endswith('_to_dict') for frame in frames) or \
+            any(path in filename for path in _JSON_PATHS for filename in filenames):
+        return 'serialization'
+    if _WAIT_PATH in filenames[-1] or filenames[-1].endswith(os.sep + 'threading.py'):
+        return 'wait'
+    return 'python'
+
+class SamplingProfiler:
+    """Samples one thread's stack on a background thread"""
+    
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self.category_samples = dict.fromkeys(CATEGORIES, 0)
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._lock = threading.Lock()
+    
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+    
+    def record_sql(self, seconds):
+        with self._lock:
+            self.sql_statements += 1
+            self.sql_seconds += seconds
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                frames.append(frame)
+                frame = frame.f_back
+            if not frames:
+                continue
+            
+            frames.reverse()
+            category = classify(frames)
+            key = ';'.join([category] + [_frame_name(frame) for frame in frames])
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.category_samples[category] += 1
+    
+    def folded(self):
+        """Folded stacks ("frame;frame;frame count" per line), heaviest first"""
+        lines = sorted(self.stacks.items(), key=lambda item: item[1], reverse=True)
+        return ''.join(f"{stack} {count}\n" for stack, count in lines)
+    
+    def category_seconds(self):
+        """Wall time per category, estimated from the share of samples"""
+        total = sum(self.category_samples.values())
+        if not total:
+            return dict.fromkeys(CATEGORIES, 0.0)
+        return {category: self.elapsed * count / total for category, count in self.category_samples.items()}
+    
+    def server_timing(self):
+        entries = [f'total;dur={self.elapsed * 1000:.1f}']
+        entries.extend(f'{category};dur={seconds * 1000:.1f}' for category, seconds in self.category_seconds().items())
+        entries.append(f'sql-exact;dur={self.sql_seconds * 1000:.1f};desc="{self.sql_statements} statements"')
+        return ', '.join(entries)
+
+def _requested_mode():
+    """None, 'store' or 'folded' from the X-Profile header or profile query parameter"""
+    value = request.headers.get('X-Profile') or request.args.get('profile')
+    if not value or value.lower() in ('0', 'false', 'off'):
+        return None
+    return 'folded' if value.lower() == 'folded' else 'store'
+
+def _save(profiler, directory, endpoint):
+    """Write the folded stacks under directory; returns the file name"""
+    os.makedirs(directory, exist_ok=True)
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)
+    path = os.path.join(directory, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{name}-{os.getpid()}.folded")
+    with open(path, 'w') as profile_file:
+        profile_file.write(profiler.folded())
+    return os.path.basename(path)
+
+def _instrument_engine(engine):
+    if getattr(engine, '_profiling_instrumented', False):
+        return
+    engine._profiling_instrumented = True
+    
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        if _current_profile.get() is not None:
+            conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+    
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+        profiler = _current_profile.get()
+        starts = conn.info.get('profile_query_start')
+        if profiler is not None and starts:
+            profiler.record_sql(time.perf_counter() - starts.pop())
+
+def init_profiling(app, *engines):
+    """Profile requests that ask for it (only call when PROFILING_ENABLED)"""
+    interval = app.config.get('PROFILING_INTERVAL_MS', 1) / 1000.0
+    directory = app.config.get('PROFILING_DIR', 'profiles')
+    for engine in engines:
+        _instrument_engine(engine)
+    
+    @app.before_request
+    def _start_profile():
+        mode = _requested_mode()
+        if mode is None:
+            return
+        profiler = SamplingProfiler(threading.get_ident(), interval)
+        g.profile_mode = mode
+        g.profiler = profiler
+        g.profile_token = _current_profile.set(profiler)
+        profiler.start()
+    
+    @app.after_request
+    def _finish_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return response
+        
+        # Include the body encoding of lazy responses in the profile; files and
+        # streams are sent after the request and can't be read here
+        if not (response.direct_passthrough or response.is_streamed):
+            response.get_data()
+        profiler.stop()
+        endpoint = request.endpoint or 'unmatched'
+        
+        if g.profile_mode == 'folded':
+            response = Response(profiler.folded(), mimetype='text/plain')
+        else:
+            response.headers['X-Profile-File'] = _save(profiler, directory, endpoint)
+        response.headers['Server-Timing'] = profiler.server_timing()
+        return response
+    
+    @app.teardown_request
+    def _clear_profile(exc):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.stop()
+        token = g.pop('profile_token', None)
+        if token is not None:
+            _current_profile.reset(token)
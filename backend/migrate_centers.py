@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Migration script to add multi-center support
+Adds `center_id` to students, teachers, courses, payments, sessions, expenses and
+tombstones, creates their center-leading indexes (except those on columns that a
+later migration adds, which create them), makes course names unique per center
+instead of globally, and rebuilds the period close tables with a center-leading
+key. Existing rows are assigned to one center: --center-id for the main database
+(default DEFAULT_CENTER_ID), and the configured center for each database in
+CENTER_DATABASE_URLS. Safe to run more than once.
+
+Usage: python migrate_centers.py [--center-id 1]
+"""
+
+import argparse
+from sqlalchemy import inspect, text
+from config.database import init_db, engine, center_engines
+from config.tenancy import DEFAULT_CENTER_ID
+from models.student import Student
+from models.teacher import Teacher
+from models.course import Course
+from models.payment import Payment
+from models.session import Session
+from models.expense import Expense
+from models.tombstone import Tombstone
+from models.period_close import (
+    PeriodClose, PeriodSummarySnapshot, PeriodCourseSnapshot, PeriodTeacherSnapshot, PeriodGradeSnapshot
+)
+
+SCOPED_MODELS = [Student, Teacher, Course, Payment, Session, Expense, Tombstone]
+
+# Parent table first (dropped last)
+PERIOD_MODELS = [PeriodClose, PeriodSummarySnapshot, PeriodCourseSnapshot, PeriodTeacherSnapshot, PeriodGradeSnapshot]
+
+def _columns(connection, table_name):
+    return {column['name'] for column in inspect(connection).get_columns(table_name)}
+
+def add_center_columns(connection, center_id):
+    for model in SCOPED_MODELS:
+        table_name = model.__tablename__
+        if 'center_id' in _columns(connection, table_name):
+            print(f"ℹ️ {table_name} already has a center_id column")
+            continue
+        connection.execute(text(
+            f"ALTER TABLE {table_name} ADD COLUMN center_id INTEGER NOT NULL DEFAULT {int(center_id)}"
+        ))
+        print(f"✅ Added 'center_id' column to {table_name} (existing rows: center {center_id})")
+
+def make_course_names_unique_per_center(connection):
+    for index in inspect(connection).get_indexes('courses'):
+        if index['unique'] and index['column_names'] == ['name']:
+            connection.execute(text(f"DROP INDEX {index['name']}"))
+            print(f"✅ Dropped global unique index {index['name']} on course names")
+    # Names stay indexed for lookups, without the global uniqueness
+    for index in Course.__table__.indexes:
+        if index.columns.keys() == ['name']:
+            index.create(bind=connection, checkfirst=True)
+
+def create_center_indexes(connection):
+    """Create the center-leading indexes whose columns exist (later migrations add the others)"""
+    for model in SCOPED_MODELS:
+        columns = _columns(connection, model.__tablename__)
+        for index in model.__table__.indexes:
+            index_columns = index.columns.keys()
+            if index_columns[0] != 'center_id':
+                continue
+            if not set(index_columns) <= columns:
+                print(f"ℹ️ Skipped {index.name}: its columns are added by a later migration")
+                continue
+            index.create(bind=connection, checkfirst=True)
+    print("✅ Center-leading indexes are in place")
+
+def rebuild_period_tables(connection, center_id):
+    existing = set(inspect(connection).get_table_names())
+    outdated = [
+        model for model in PERIOD_MODELS
+        if model.__tablename__ in existing and 'center_id' not in _columns(connection, model.__tablename__)
+    ]
+    if not outdated:
+        print("ℹ️ Period close tables already have a center_id column")
+        return
+    
+    rows = {}
+    for model in reversed(outdated):
+        table_name = model.__tablename__
+        rows[model] = [dict(row) for row in connection.execute(text(f"SELECT * FROM {table_name}")).mappings()]
+        connection.execute(text(f"DROP TABLE {table_name}"))
+    
+    for model in outdated:
+        model.__table__.create(bind=connection)
+        if rows[model]:
+            connection.execute(model.__table__.insert(), [dict(row, center_id=center_id) for row in rows[model]])
+        print(f"✅ Rebuilt {model.__tablename__} with a center-leading key ({len(rows[model])} rows)")
+
+def migrate_database(db_engine, center_id):
+    """Migrate one database, assigning its existing rows to center_id"""
+    print(f"\n🔄 Migrating {db_engine.url.render_as_string(hide_password=True)} (center {center_id})...")
+    with db_engine.begin() as connection:
+        add_center_columns(connection, center_id)
+        make_course_names_unique_per_center(connection)
+        create_center_indexes(connection)
+        rebuild_period_tables(connection, center_id)
+
+def migrate_centers(center_id=DEFAULT_CENTER_ID):
+    """Add center columns and indexes to the main database and every per-center database"""
+    
+    print("🔄 Starting migration to multi-center data...")
+    
+    try:
+        migrate_database(engine, center_id)
+        for engine_center_id, db_engine in center_engines.items():
+            migrate_database(db_engine, engine_center_id)
+        
+        print("\n🎉 Migration completed successfully!")
+    
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        raise
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Add center_id columns and indexes to existing databases')
+    parser.add_argument('--center-id', type=int, default=DEFAULT_CENTER_ID, help='center that owns the existing rows of the main database')
+    args = parser.parse_args()
+    
+    init_db(force=True)  # Create missing tables in every database
+    migrate_centers(args.center_id)
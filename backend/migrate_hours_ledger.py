@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Migration script to move student balances into the hours ledger
+Creates a balance row (with an opening 'adjust' ledger entry) for every
+course in each student's legacy `balances` JSON. Safe to run more than once.
+Runs on the main database and every center database (CENTER_DATABASE_URLS).
+Students are read with explicit columns, so this also works on a database that
+hasn't run migrate_centers.py yet.
+"""
+
+from sqlalchemy import inspect, select
+from sqlalchemy.orm import sessionmaker
+from config.database import init_db, live_engines
+from models.student import Student
+from services import ledger
+
+def seed_database(db_engine, batch_size):
+    """Seed the balance rows of one database's students; returns the number created"""
+    Session = sessionmaker(bind=db_engine)
+    session = Session()
+    
+    try:
+        students = Student.__table__
+        columns = [students.c.id, students.c.balances]
+        if 'center_id' in {column['name'] for column in inspect(db_engine).get_columns('students')}:
+            columns.append(students.c.center_id)
+        
+        created = 0
+        last_id = 0
+        while True:
+            rows = session.execute(
+                select(*columns).where(students.c.id > last_id).order_by(students.c.id).limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                break
+            
+            for row in rows:
+                created += ledger.seed_balance_rows(session, row['id'], row['balances'], row.get('center_id'))
+            
+            last_id = rows[-1]['id']
+            session.commit()
+            print(f"✅ Processed students up to id {last_id}")
+        return created
+    
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+def migrate_to_hours_ledger(batch_size=500):
+    """Seed hours_balances from the legacy students.balances JSON column in every live database"""
+    
+    print("🔄 Starting migration to the hours ledger...")
+    
+    try:
+        created = 0
+        for db_engine in live_engines():
+            print(f"\n🔄 Migrating {db_engine.url.render_as_string(hide_password=True)}...")
+            created += seed_database(db_engine, batch_size)
+        
+        print(f"\n🎉 Migration completed successfully! Created {created} balance rows.")
+    
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        raise
+
+if __name__ == "__main__":
+    init_db()  # Ensure ledger tables exist
+    migrate_to_hours_ledger()
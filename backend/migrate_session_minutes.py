@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Migration script to add minutes-of-day intervals to sessions
+Adds `start_minute` and `end_minute` to sessions and sessions_archive and fills
+them from the "HH:MM" start and end times (end_minute past 1440 for sessions
+crossing midnight), in resumable batches. Then, in one transaction per database,
+it creates the teacher and student interval indexes used for conflict detection
+(those whose columns exist: on a database without center_id, migrate_centers.py
+creates them) and drops the old start_time/end_time string columns once every
+row has its minutes. A failure leaves the string columns in place; re-run to
+finish. Safe to run more than once, before or after migrate_centers.py.
+
+Usage: python migrate_session_minutes.py [--batch-size 1000]
+"""
+
+import argparse
+from sqlalchemy import inspect, text, select, update, bindparam, MetaData, Table
+from config.database import init_db, live_engines, archive_engine
+from models.session import Session, parse_minutes, MINUTES_PER_DAY
+from models.archive import ArchivedSession
+
+MINUTE_COLUMNS = ['start_minute', 'end_minute']
+
+# "HH:MM" columns replaced by the minutes
+TIME_COLUMNS = ['start_time', 'end_time']
+
+# Replaced by ix_sessions_center_teacher_date_minutes, which has the same leading columns
+OBSOLETE_INDEXES = ['ix_sessions_center_teacher_date']
+
+def _interval(start_time, end_time):
+    """(start_minute, end_minute) of "HH:MM" times, or None if they don't parse"""
+    try:
+        start_minute, end_minute = parse_minutes(start_time), parse_minutes(end_time)
+    except (ValueError, AttributeError):
+        return None
+    if end_minute < start_minute:
+        end_minute += MINUTES_PER_DAY
+    return start_minute, end_minute
+
+def add_minute_columns(connection, table_name):
+    existing = {column['name'] for column in inspect(connection).get_columns(table_name)}
+    for column_name in MINUTE_COLUMNS:
+        if column_name in existing:
+            print(f"ℹ️ {table_name} already has a {column_name} column")
+            continue
+        connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} INTEGER"))
+        print(f"✅ Added '{column_name}' column to {table_name}")
+
+def _time_columns(db_engine, table_name):
+    """The old string columns still present in a table"""
+    existing = {column['name'] for column in inspect(db_engine).get_columns(table_name)}
+    return [column_name for column_name in TIME_COLUMNS if column_name in existing]
+
+def fill_minutes(db_engine, table_name, batch_size):
+    """Fill the intervals of rows without one from the string columns, one transaction per batch"""
+    if not _time_columns(db_engine, table_name):
+        print(f"ℹ️ {table_name} has no start_time/end_time columns left to read")
+        return
+    # Reflected, as the model no longer maps the string columns
+    table = Table(table_name, MetaData(), autoload_with=db_engine)
+    filled = 0
+    last_id = 0
+    while True:
+        with db_engine.begin() as connection:
+            rows = connection.execute(
+                select(table.c.id, table.c.start_time, table.c.end_time)
+                .where(table.c.id > last_id, table.c.start_minute.is_(None))
+                .order_by(table.c.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            values = []
+            for row_id, start_time, end_time in rows:
+                interval = _interval(start_time, end_time)
+                if interval is None:
+                    print(f"⚠️ {table.name} {row_id}: unreadable times {start_time!r}-{end_time!r}, left without minutes")
+                    continue
+                values.append({'row_id': row_id, 'start_minute': interval[0], 'end_minute': interval[1]})
+            if values:
+                connection.execute(
+                    update(table).where(table.c.id == bindparam('row_id'))
+                    .values(start_minute=bindparam('start_minute'), end_minute=bindparam('end_minute')),
+                    values
+                )
+            filled += len(values)
+            last_id = rows[-1][0]
+    print(f"✅ Filled minutes of {filled} {table.name} rows")
+
+def rows_without_minutes(connection, table_name):
+    return connection.execute(
+        text(f"SELECT COUNT(*) FROM {table_name} WHERE start_minute IS NULL OR end_minute IS NULL")
+    ).scalar()
+
+def drop_time_columns(connection, table_name):
+    for column_name in _time_columns(connection, table_name):
+        connection.execute(text(f"ALTER TABLE {table_name} DROP COLUMN {column_name}"))
+        print(f"✅ Dropped '{column_name}' column from {table_name}")
+
+def create_interval_indexes(connection):
+    """Create the interval indexes whose columns exist, replacing the obsolete ones"""
+    existing = {index['name'] for index in inspect(connection).get_indexes('sessions')}
+    columns = {column['name'] for column in inspect(connection).get_columns('sessions')}
+    for index in Session.__table__.indexes:
+        # Only the interval indexes: other migrations add the other columns
+        if not set(MINUTE_COLUMNS) <= set(index.columns.keys()):
+            continue
+        if not set(index.columns.keys()) <= columns:
+            print(f"ℹ️ Skipped {index.name}: run migrate_centers.py to create it")
+            continue
+        index.create(bind=connection, checkfirst=True)
+        for index_name in OBSOLETE_INDEXES:
+            if index_name in existing:
+                connection.execute(text(f"DROP INDEX {index_name}"))
+                existing.discard(index_name)
+                print(f"✅ Dropped {index_name}")
+    print("✅ Session interval indexes are in place")
+
+def finish_database(db_engine, table_names):
+    """Create the interval indexes and drop the string columns, in one transaction.
+    
+    The columns are only dropped when every row of every table has its minutes.
+    """
+    with db_engine.begin() as connection:
+        if connection.dialect.name == 'sqlite':
+            # pysqlite runs DDL outside any transaction unless one is already open
+            connection.exec_driver_sql('BEGIN')
+        if Session.__tablename__ in table_names:
+            create_interval_indexes(connection)
+        
+        missing = {table_name: rows_without_minutes(connection, table_name) for table_name in table_names}
+        if any(missing.values()):
+            for table_name, count in missing.items():
+                if count:
+                    print(f"⚠️ {count} {table_name} rows have no minutes; fix their times and re-run to drop start_time and end_time")
+            return
+        for table_name in table_names:
+            drop_time_columns(connection, table_name)
+
+def migrate_tables(db_engine, table_names, batch_size):
+    """Add and fill the minutes of a database's tables, then finish them together"""
+    for table_name in table_names:
+        with db_engine.begin() as connection:
+            add_minute_columns(connection, table_name)
+        fill_minutes(db_engine, table_name, batch_size)
+    finish_database(db_engine, table_names)
+
+def migrate_session_minutes(batch_size=1000):
+    """Add and fill the interval columns in every live database and the archive"""
+    
+    print("🔄 Starting migration to session minute intervals...")
+    
+    try:
+        for db_engine in live_engines():
+            print(f"\n🔄 Migrating {db_engine.url.render_as_string(hide_password=True)}...")
+            table_names = [Session.__tablename__]
+            if archive_engine is None:
+                table_names.append(ArchivedSession.__tablename__)
+            migrate_tables(db_engine, table_names, batch_size)
+        
+        if archive_engine is not None:
+            print(f"\n🔄 Migrating archive {archive_engine.url.render_as_string(hide_password=True)}...")
+            migrate_tables(archive_engine, [ArchivedSession.__tablename__], batch_size)
+        
+        print("\n🎉 Migration completed successfully!")
+    
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        raise
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Add minutes-of-day intervals to existing sessions')
+    parser.add_argument('--batch-size', type=int, default=1000, help='rows updated per transaction')
+    args = parser.parse_args()
+    
+    init_db(force=True)  # Create missing tables in every database
+    migrate_session_minutes(args.batch_size)
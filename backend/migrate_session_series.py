@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Migration script to add recurring session series
+Creates the session_series table and adds `series_id` (with its index) to
+sessions, sessions_archive and hours_ledger. Existing sessions stay single
+sessions (series_id NULL). Safe to run more than once.
+
+Usage: python migrate_session_series.py
+"""
+
+from sqlalchemy import inspect, text
+from config.database import init_db, live_engines, archive_engine
+from models.session import Session
+from models.hours_ledger import HoursLedgerEntry
+from models.archive import ArchivedSession
+
+# Live tables getting a series_id column
+SERIES_MODELS = [Session, HoursLedgerEntry]
+
+def add_series_column(connection, model):
+    table_name = model.__tablename__
+    if 'series_id' in {column['name'] for column in inspect(connection).get_columns(table_name)}:
+        print(f"ℹ️ {table_name} already has a series_id column")
+    else:
+        connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN series_id INTEGER"))
+        print(f"✅ Added 'series_id' column to {table_name}")
+    for index in model.__table__.indexes:
+        if index.columns.keys() == ['series_id']:
+            index.create(bind=connection, checkfirst=True)
+
+def migrate_session_series():
+    """Add the series columns in every live database and the archive"""
+    
+    print("🔄 Starting migration to recurring session series...")
+    
+    try:
+        for db_engine in live_engines():
+            print(f"\n🔄 Migrating {db_engine.url.render_as_string(hide_password=True)}...")
+            models = SERIES_MODELS + ([ArchivedSession] if archive_engine is None else [])
+            with db_engine.begin() as connection:
+                for model in models:
+                    add_series_column(connection, model)
+        
+        if archive_engine is not None:
+            print(f"\n🔄 Migrating archive {archive_engine.url.render_as_string(hide_password=True)}...")
+            with archive_engine.begin() as connection:
+                add_series_column(connection, ArchivedSession)
+        
+        print("\n🎉 Migration completed successfully!")
+    
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        raise
+
+if __name__ == "__main__":
+    init_db(force=True)  # Creates the session_series table in every database
+    migrate_session_series()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Migration script to fill the teacher_grade_rates table
+Copies every teacher's `grade_rates` JSON into teacher_grade_rates, which
+payroll joins against. New changes are kept in sync automatically; this is
+only needed once for teachers created before the table existed. Runs on the
+main database and every center database. Safe to run more than once, and
+before or after migrate_centers.py.
+"""
+
+from sqlalchemy import select
+from config.database import init_db, live_engines
+from models.teacher import Teacher
+from models.teacher_grade_rate import rebuild_grade_rates
+
+def migrate_teacher_grade_rates():
+    """Rebuild teacher_grade_rates from teachers.grade_rates in every live database"""
+    
+    print("🔄 Starting migration of teacher grade rates...")
+    
+    try:
+        copied = 0
+        for db_engine in live_engines():
+            print(f"\n🔄 Migrating {db_engine.url.render_as_string(hide_password=True)}...")
+            with db_engine.begin() as connection:
+                teachers = connection.execute(select(Teacher.__table__.c.id, Teacher.__table__.c.grade_rates)).all()
+                for teacher in teachers:
+                    rebuild_grade_rates(connection, teacher.id, teacher.grade_rates)
+            copied += len(teachers)
+        
+        print(f"\n🎉 Migration completed successfully! Copied grade rates of {copied} teachers.")
+    
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        raise
+
+if __name__ == "__main__":
+    init_db()  # Ensure the teacher_grade_rates table exists
+    migrate_teacher_grade_rates()
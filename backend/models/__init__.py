@@ -3,6 +3,15 @@ from .teacher import Teacher
 from .course import Course
 from .payment import Payment
 from .session import Session
+from .session_series import SessionSeries
 from .expense import Expense
+from .tombstone import Tombstone
+from .hours_balance import HoursBalance
+from .hours_ledger import HoursLedgerEntry
+from .cache_version import CacheVersion
+from .teacher_grade_rate import TeacherGradeRate
+from .period_close import PeriodClose, PeriodSummarySnapshot, PeriodCourseSnapshot, PeriodTeacherSnapshot, PeriodGradeSnapshot
+from .archive import ArchivedPayment, ArchivedSession, ArchiveWatermark
+from .outbox import OutboxEvent, OutboxCursor
 
-__all__ = ['Student', 'Teacher', 'Course', 'Payment', 'Session', 'Expense'] 
\ No newline at end of file
+__all__ = ['Student', 'Teacher', 'Course', 'Payment', 'Session', 'SessionSeries', 'Expense', 'Tombstone', 'HoursBalance', 'HoursLedgerEntry', 'CacheVersion', 'TeacherGradeRate', 'PeriodClose', 'PeriodSummarySnapshot', 'PeriodCourseSnapshot', 'PeriodTeacherSnapshot', 'PeriodGradeSnapshot', 'ArchivedPayment', 'ArchivedSession', 'ArchiveWatermark', 'OutboxEvent', 'OutboxCursor'] 
\ No newline at end of file
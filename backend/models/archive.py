@@ -0,0 +1,77 @@
+from sqlalchemy import Column, Integer, String, Float, Date, Index
+from datetime import datetime
+from config.database import Base, ArchiveBase
+from config.tenancy import CenterScoped
+from models.payment import PaymentFigures
+from models.session import SessionFigures
+
+# Archive tables mirror the columns of payments and sessions and keep the live row's id.
+# They have no foreign keys or relationships: they may live in ARCHIVE_DATABASE_URL.
+# student, course and teacher are plain attributes filled in by services.archive.attach_references.
+
+class ArchivedPayment(PaymentFigures, CenterScoped, ArchiveBase):
+    __tablename__ = 'payments_archive'
+    __table_args__ = (
+        Index('ix_payments_archive_center_date', 'center_id', 'date'),
+        Index('ix_payments_archive_center_student', 'center_id', 'student_id'),
+        Index('ix_payments_archive_center_course', 'center_id', 'course_id'),
+        Index('ix_payments_archive_center_teacher', 'center_id', 'teacher_id'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    date = Column(Date, nullable=False)
+    student_id = Column(Integer, nullable=False)
+    course_id = Column(Integer, nullable=False)
+    teacher_id = Column(Integer, nullable=False)
+    hourly_rate = Column(Float, nullable=False)
+    purchased_hours = Column(Float, nullable=False, default=0.0)
+    discounted_tuition = Column(Float, nullable=False, default=0.0)
+    amount_paid = Column(Float, nullable=False, default=0.0)
+    payment_method = Column(String(50), nullable=False, default='Cash')
+    created_at = Column(String)
+    updated_at = Column(String)
+    archived_at = Column(String, nullable=False, default=lambda: datetime.now().isoformat())
+    
+    student = course = teacher = None
+    
+    def __repr__(self):
+        return f"<ArchivedPayment(id={self.id}, student_id={self.student_id}, course_id={self.course_id}, amount={self.amount_paid})>"
+
+class ArchivedSession(SessionFigures, CenterScoped, ArchiveBase):
+    __tablename__ = 'sessions_archive'
+    __table_args__ = (
+        Index('ix_sessions_archive_center_date', 'center_id', 'date'),
+        Index('ix_sessions_archive_center_student', 'center_id', 'student_id'),
+        Index('ix_sessions_archive_center_course', 'center_id', 'course_id'),
+        Index('ix_sessions_archive_center_teacher_date', 'center_id', 'teacher_id', 'date'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    date = Column(Date, nullable=False)
+    student_id = Column(Integer, nullable=False)
+    course_id = Column(Integer, nullable=False)
+    teacher_id = Column(Integer, nullable=False)
+    series_id = Column(Integer, nullable=True)
+    start_minute = Column(Integer, nullable=False)
+    end_minute = Column(Integer, nullable=False)
+    hours = Column(Float, nullable=True)
+    notes = Column(String(500), nullable=True)
+    created_at = Column(String)
+    updated_at = Column(String)
+    archived_at = Column(String, nullable=False, default=lambda: datetime.now().isoformat())
+    
+    student = course = teacher = None
+    
+    def __repr__(self):
+        return f"<ArchivedSession(id={self.id}, student_id={self.student_id}, course_id={self.course_id}, hours={self.hours})>"
+
+class ArchiveWatermark(CenterScoped, Base):
+    __tablename__ = 'archive_watermarks'
+    
+    # Lives with the live data: every archived row of the center is dated before archived_before
+    center_id = Column(Integer, primary_key=True)
+    archived_before = Column(Date, nullable=False)
+    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat())
+    
+    def __repr__(self):
+        return f"<ArchiveWatermark(center_id={self.center_id}, archived_before='{self.archived_before}')>"
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String
+from config.database import Base
+
+class CacheVersion(Base):
+    __tablename__ = 'cache_versions'
+    
+    # Version stamp per cached dataset; bumped in the same transaction as the write that changes it
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<CacheVersion(name='{self.name}', version={self.version})>"
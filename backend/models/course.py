@@ -1,18 +1,29 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, func, distinct, case, exists, and_, or_, Index
+from sqlalchemy.orm import relationship, object_session
 from datetime import datetime
 from config.database import Base
+from config.tenancy import CenterScoped
+from models.payment import Payment
+from models.session import Session as SessionModel
+from models.student import Student
+from models.teacher import Teacher
+from models.teacher_grade_rate import TeacherGradeRate
+from services import archive
 
-class Course(Base):
+class Course(CenterScoped, Base):
     __tablename__ = 'courses'
+    __table_args__ = (
+        Index('uq_courses_center_name', 'center_id', 'name', unique=True),
+        Index('ix_courses_center_updated_at', 'center_id', 'updated_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(100), nullable=False, index=True, unique=True)
+    name = Column(String(100), nullable=False, index=True)  # Unique per center (uq_courses_center_name)
     # MODIFIED: Keep base_rate for backwards compatibility, but use teacher's grade-based rates
     base_rate = Column(Float, nullable=False, default=0.0)  # Base rate or fallback rate
     teacher_id = Column(Integer, ForeignKey('teachers.id'), nullable=True)
     created_at = Column(String, default=lambda: datetime.now().isoformat())
-    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat())
+    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat(), index=True)
     
     # Relationships
     teacher = relationship("Teacher", back_populates="courses")
@@ -37,45 +48,94 @@ class Course(Base):
             return self.teacher.get_rate_for_grade(grade)
         return self.base_rate
     
-    def get_enrollment_count(self):
+    def _in_range(self, query, column, start_date=None, end_date=None):
+        """Restrict an aggregate query to a date range"""
+        if start_date:
+            query = query.filter(column >= start_date)
+        if end_date:
+            query = query.filter(column <= end_date)
+        return query
+    
+    def get_enrollment_count(self, start_date=None, end_date=None):
         """Get number of unique students enrolled in this course"""
-        unique_students = set()
-        for payment in self.payments:
-            unique_students.add(payment.student_id)
-        return len(unique_students)
+        db = object_session(self)
+        if archive.reaches_archive(db, start_date):
+            # Students may have paid in both tables: count the union of ids
+            query = db.query(Payment.student_id).distinct().filter(Payment.course_id == self.id)
+            student_ids = {student_id for student_id, in self._in_range(query, Payment.date, start_date, end_date).all()}
+            return len(student_ids | archive.payment_students(db, start_date, end_date, course_id=self.id))
+        query = db.query(func.count(distinct(Payment.student_id))).filter(Payment.course_id == self.id)
+        return self._in_range(query, Payment.date, start_date, end_date).scalar()
     
     def calculate_total_revenue(self, start_date=None, end_date=None):
         """Calculate total revenue for this course in a date range"""
-        payments = self.payments
-        if start_date:
-            payments = [p for p in payments if p.date >= start_date]
-        if end_date:
-            payments = [p for p in payments if p.date <= end_date]
-        return sum(payment.amount_paid for payment in payments)
+        db = object_session(self)
+        query = db.query(func.coalesce(func.sum(Payment.amount_paid), 0)).filter(Payment.course_id == self.id)
+        revenue = self._in_range(query, Payment.date, start_date, end_date).scalar()
+        if archive.reaches_archive(db, start_date):
+            revenue += sum(row[3] for row in archive.payment_groups(db, start_date, end_date, course_id=self.id))
+        return revenue
     
     def calculate_total_hours_taught(self, start_date=None, end_date=None):
         """Calculate total hours taught for this course"""
-        sessions = self.sessions
-        if start_date:
-            sessions = [s for s in sessions if s.date >= start_date]
-        if end_date:
-            sessions = [s for s in sessions if s.date <= end_date]
-        return sum(session.hours or 0 for session in sessions)
+        return self.calculate_session_totals(start_date, end_date)[1]
+    
+    def calculate_session_totals(self, start_date=None, end_date=None):
+        """Sessions of this course in a date range: (count, hours, salary cost at each session teacher's rate)"""
+        rate = func.coalesce(TeacherGradeRate.rate, Teacher.default_rate)
+        hours = func.coalesce(SessionModel.hours, 0.0)
+        query = object_session(self).query(
+            func.count(SessionModel.id),
+            func.coalesce(func.sum(hours), 0),
+            func.coalesce(func.sum(case((Teacher.id.is_(None), 0.0), else_=hours * rate)), 0)
+        ).select_from(SessionModel).outerjoin(
+            Student, Student.id == SessionModel.student_id
+        ).outerjoin(
+            Teacher, Teacher.id == SessionModel.teacher_id
+        ).outerjoin(
+            TeacherGradeRate, and_(
+                TeacherGradeRate.teacher_id == SessionModel.teacher_id,
+                TeacherGradeRate.grade == Student.grade
+            )
+        ).filter(SessionModel.course_id == self.id)
+        count, total_hours, salary_cost = self._in_range(query, SessionModel.date, start_date, end_date).one()
+        db = object_session(self)
+        if archive.reaches_archive(db, start_date):
+            archived_count, archived_hours, archived_salary = archive.session_totals(db, start_date, end_date, course_id=self.id)
+            count += archived_count
+            total_hours += archived_hours
+            salary_cost += archived_salary
+        return count, total_hours, salary_cost
     
     def calculate_salary_cost(self, start_date=None, end_date=None):
         """Calculate total salary cost for this course using grade-based rates"""
-        total_cost = 0
-        sessions = self.sessions
-        if start_date:
-            sessions = [s for s in sessions if s.date >= start_date]
-        if end_date:
-            sessions = [s for s in sessions if s.date <= end_date]
-        
-        for session in sessions:
-            rate = self.get_rate_for_student(session.student) if session.student else self.base_rate
-            total_cost += (session.hours or 0) * rate
-        
-        return total_cost
+        # Course teacher's rate for the student's grade; course base rate without a teacher or student
+        rate = case(
+            (or_(Student.id.is_(None), Teacher.id.is_(None)), self.base_rate),
+            else_=func.coalesce(TeacherGradeRate.rate, Teacher.default_rate)
+        )
+        query = object_session(self).query(
+            func.coalesce(func.sum(func.coalesce(SessionModel.hours, 0.0) * rate), 0)
+        ).select_from(SessionModel).outerjoin(
+            Student, Student.id == SessionModel.student_id
+        ).outerjoin(
+            Teacher, Teacher.id == self.teacher_id
+        ).outerjoin(
+            TeacherGradeRate, and_(
+                TeacherGradeRate.teacher_id == self.teacher_id,
+                TeacherGradeRate.grade == Student.grade
+            )
+        ).filter(SessionModel.course_id == self.id)
+        return self._in_range(query, SessionModel.date, start_date, end_date).scalar()
+    
+    def has_payments_or_sessions(self):
+        """Check whether any payment or session, live or archived, references this course, without loading them"""
+        db = object_session(self)
+        return db.query(
+            exists().where(Payment.course_id == self.id)
+        ).scalar() or db.query(
+            exists().where(SessionModel.course_id == self.id)
+        ).scalar() or archive.has_rows(db, course_id=self.id)
     
     def get_outstanding_balance(self):
         """Get total outstanding balance (purchased but not used hours) for this course"""
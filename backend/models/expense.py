@@ -1,9 +1,15 @@
-from sqlalchemy import Column, Integer, String, Float, Date
+from sqlalchemy import Column, Integer, String, Float, Date, Index
 from datetime import datetime, date
 from config.database import Base
+from config.tenancy import CenterScoped
 
-class Expense(Base):
+class Expense(CenterScoped, Base):
     __tablename__ = 'expenses'
+    __table_args__ = (
+        Index('ix_expenses_center_date', 'center_id', 'date'),
+        Index('ix_expenses_center_category', 'center_id', 'category'),
+        Index('ix_expenses_center_updated_at', 'center_id', 'updated_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     date = Column(Date, nullable=False, default=date.today, index=True)
@@ -12,7 +18,7 @@ class Expense(Base):
     category = Column(String(50), nullable=True, default='General')
     description = Column(String(500), nullable=True)
     created_at = Column(String, default=lambda: datetime.now().isoformat())
-    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat())
+    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat(), index=True)
     
     def validate_expense(self):
         """Validate expense data"""
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, Float, String, ForeignKey
+from datetime import datetime
+from config.database import Base
+
+class HoursBalance(Base):
+    __tablename__ = 'hours_balances'
+    
+    # One row per (student, course); only ever changed by conditional UPDATEs in services.ledger
+    student_id = Column(Integer, ForeignKey('students.id'), primary_key=True)
+    course_id = Column(Integer, ForeignKey('courses.id'), primary_key=True, index=True)
+    hours = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat())
+    
+    def __repr__(self):
+        return f"<HoursBalance(student_id={self.student_id}, course_id={self.course_id}, hours={self.hours})>"
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, Float, String, Enum, ForeignKey
+from datetime import datetime
+from config.database import Base
+
+LEDGER_ENTRY_TYPES = ('purchase', 'consume', 'adjust', 'reverse')
+
+class HoursLedgerEntry(Base):
+    __tablename__ = 'hours_ledger'
+    
+    # Append-only: rows are never updated, corrections are new 'adjust' or 'reverse' entries
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey('students.id'), nullable=False, index=True)
+    course_id = Column(Integer, ForeignKey('courses.id'), nullable=False, index=True)
+    entry_type = Column(Enum(*LEDGER_ENTRY_TYPES, name='ledger_entry_type_enum'), nullable=False)
+    hours = Column(Float, nullable=False)  # Signed change: positive credits, negative debits
+    balance_after = Column(Float, nullable=False)
+    payment_id = Column(Integer, nullable=True, index=True)  # No FK: entries outlive deleted payments
+    session_id = Column(Integer, nullable=True, index=True)  # No FK: entries outlive deleted sessions
+    series_id = Column(Integer, nullable=True, index=True)  # Aggregated entries of a session series' occurrences
+    note = Column(String(200), nullable=True)
+    created_at = Column(String, default=lambda: datetime.now().isoformat())
+    
+    def __repr__(self):
+        return f"<HoursLedgerEntry(id={self.id}, type='{self.entry_type}', student_id={self.student_id}, course_id={self.course_id}, hours={self.hours})>"
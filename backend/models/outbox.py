@@ -0,0 +1,43 @@
+from sqlalchemy import Column, Integer, String, JSON, Index
+from datetime import datetime
+from config.database import Base
+from config.tenancy import CenterScoped
+
+class OutboxEvent(CenterScoped, Base):
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        Index('ix_outbox_events_center_created_at', 'center_id', 'created_at'),
+    )
+    
+    # Append-only: written in the transaction of the change, delivered in id order by services.outbox
+    id = Column(Integer, primary_key=True, index=True)
+    event_type = Column(String(50), nullable=False)  # e.g. "payment.created"
+    entity = Column(String(20), nullable=False)  # Table name of the changed row
+    entity_id = Column(Integer, nullable=False)
+    payload = Column(JSON, nullable=False)  # Row values after the change (before it, for deletions)
+    created_at = Column(String, nullable=False, index=True, default=lambda: datetime.now().isoformat())
+    
+    def __repr__(self):
+        return f"<OutboxEvent(id={self.id}, event_type='{self.event_type}', entity_id={self.entity_id})>"
+
+class OutboxCursor(Base):
+    __tablename__ = 'outbox_cursors'
+    
+    # One row per sink: the last event id delivered to it
+    sink = Column(String(50), primary_key=True)
+    last_event_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat())
+    
+    def __repr__(self):
+        return f"<OutboxCursor(sink='{self.sink}', last_event_id={self.last_event_id})>"
+
+class OutboxGap(Base):
+    __tablename__ = 'outbox_gaps'
+    
+    # Event ids below a sink's cursor that weren't committed yet when later ids were delivered
+    sink = Column(String(50), primary_key=True)
+    event_id = Column(Integer, primary_key=True)
+    seen_at = Column(String, nullable=False, default=lambda: datetime.now().isoformat())
+    
+    def __repr__(self):
+        return f"<OutboxGap(sink='{self.sink}', event_id={self.event_id})>"
@@ -1,28 +1,11 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime, date
 from config.database import Base
+from config.tenancy import CenterScoped
 
-class Payment(Base):
-    __tablename__ = 'payments'
-    
-    id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False, default=date.today, index=True)
-    student_id = Column(Integer, ForeignKey('students.id'), nullable=False, index=True)
-    course_id = Column(Integer, ForeignKey('courses.id'), nullable=False, index=True)
-    teacher_id = Column(Integer, ForeignKey('teachers.id'), nullable=False, index=True)
-    hourly_rate = Column(Float, nullable=False)
-    purchased_hours = Column(Float, nullable=False, default=0.0)
-    discounted_tuition = Column(Float, nullable=False, default=0.0)
-    amount_paid = Column(Float, nullable=False, default=0.0)
-    payment_method = Column(String(50), nullable=False, default='Cash')
-    created_at = Column(String, default=lambda: datetime.now().isoformat())
-    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat())
-    
-    # Relationships
-    student = relationship("Student", back_populates="payments")
-    course = relationship("Course", back_populates="payments")
-    teacher = relationship("Teacher", back_populates="payments")
+class PaymentFigures:
+    """Amounts derived from a payment's columns (shared by live and archived payments)"""
     
     @property
     def expected_amount(self):
@@ -45,6 +28,32 @@ class Payment(Base):
     def is_underpaid(self):
         """Check if payment amount is less than expected amount"""
         return self.amount_paid < self.expected_amount
+
+class Payment(PaymentFigures, CenterScoped, Base):
+    __tablename__ = 'payments'
+    __table_args__ = (
+        Index('ix_payments_center_date', 'center_id', 'date'),
+        Index('ix_payments_center_student', 'center_id', 'student_id'),
+        Index('ix_payments_center_updated_at', 'center_id', 'updated_at'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    date = Column(Date, nullable=False, default=date.today, index=True)
+    student_id = Column(Integer, ForeignKey('students.id'), nullable=False, index=True)
+    course_id = Column(Integer, ForeignKey('courses.id'), nullable=False, index=True)
+    teacher_id = Column(Integer, ForeignKey('teachers.id'), nullable=False, index=True)
+    hourly_rate = Column(Float, nullable=False)
+    purchased_hours = Column(Float, nullable=False, default=0.0)
+    discounted_tuition = Column(Float, nullable=False, default=0.0)
+    amount_paid = Column(Float, nullable=False, default=0.0)
+    payment_method = Column(String(50), nullable=False, default='Cash')
+    created_at = Column(String, default=lambda: datetime.now().isoformat())
+    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat(), index=True)
+    
+    # Relationships
+    student = relationship("Student", back_populates="payments")
+    course = relationship("Course", back_populates="payments")
+    teacher = relationship("Teacher", back_populates="payments")
     
     def validate_payment(self):
         """Validate payment data"""
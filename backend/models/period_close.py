@@ -0,0 +1,128 @@
+from sqlalchemy import Column, Integer, String, Float, JSON, ForeignKeyConstraint, event, select
+from sqlalchemy.orm import Session as OrmSession, attributes
+from datetime import datetime
+from config.database import Base
+from config.tenancy import CenterScoped, DEFAULT_CENTER_ID
+from models.payment import Payment
+from models.session import Session
+from models.expense import Expense
+
+# Rows whose month is frozen once the month is closed
+PERIOD_GUARDED_MODELS = (Payment, Session, Expense)
+
+class PeriodClose(CenterScoped, Base):
+    __tablename__ = 'period_closes'
+    
+    # The period tables lead with center_id; it is stamped from the current center on flush
+    center_id = Column(Integer, primary_key=True)
+    period = Column(String(7), primary_key=True)  # YYYY-MM
+    closed_at = Column(String, nullable=False, default=lambda: datetime.now().isoformat())
+    note = Column(String(200))
+    
+    def __repr__(self):
+        return f"<PeriodClose(period='{self.period}', closed_at='{self.closed_at}')>"
+
+def _closed_period_fk():
+    return ForeignKeyConstraint(
+        ['center_id', 'period'], ['period_closes.center_id', 'period_closes.period'], ondelete='CASCADE'
+    )
+
+class PeriodSummarySnapshot(CenterScoped, Base):
+    __tablename__ = 'period_summary_snapshots'
+    __table_args__ = (_closed_period_fk(),)
+    
+    center_id = Column(Integer, primary_key=True)
+    period = Column(String(7), primary_key=True)
+    revenue = Column(Float, nullable=False, default=0.0)
+    expenses = Column(Float, nullable=False, default=0.0)
+    expense_count = Column(Integer, nullable=False, default=0)
+    salary_cost = Column(Float, nullable=False, default=0.0)
+    hours_taught = Column(Float, nullable=False, default=0.0)
+    payment_count = Column(Integer, nullable=False, default=0)
+    session_count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<PeriodSummarySnapshot(period='{self.period}', revenue={self.revenue})>"
+
+class PeriodCourseSnapshot(CenterScoped, Base):
+    __tablename__ = 'period_course_snapshots'
+    __table_args__ = (_closed_period_fk(),)
+    
+    # No foreign key to courses: a snapshot outlives changes to the course it describes
+    center_id = Column(Integer, primary_key=True)
+    period = Column(String(7), primary_key=True)
+    course_id = Column(Integer, primary_key=True)
+    revenue = Column(Float, nullable=False, default=0.0)
+    salary_cost = Column(Float, nullable=False, default=0.0)
+    hours_taught = Column(Float, nullable=False, default=0.0)
+    student_ids = Column(JSON, nullable=False, default=list)  # Paying students, for enrollment counts across months
+    
+    def __repr__(self):
+        return f"<PeriodCourseSnapshot(period='{self.period}', course_id={self.course_id}, revenue={self.revenue})>"
+
+class PeriodTeacherSnapshot(CenterScoped, Base):
+    __tablename__ = 'period_teacher_snapshots'
+    __table_args__ = (_closed_period_fk(),)
+    
+    center_id = Column(Integer, primary_key=True)
+    period = Column(String(7), primary_key=True)
+    teacher_id = Column(Integer, primary_key=True)
+    total_hours = Column(Float, nullable=False, default=0.0)
+    total_salary = Column(Float, nullable=False, default=0.0)
+    signed_hours = Column(Float, nullable=False, default=0.0)
+    sessions_count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<PeriodTeacherSnapshot(period='{self.period}', teacher_id={self.teacher_id}, total_salary={self.total_salary})>"
+
+class PeriodGradeSnapshot(CenterScoped, Base):
+    __tablename__ = 'period_grade_snapshots'
+    __table_args__ = (_closed_period_fk(),)
+    
+    center_id = Column(Integer, primary_key=True)
+    period = Column(String(7), primary_key=True)
+    grade = Column(String(20), primary_key=True)
+    hours_taught = Column(Float, nullable=False, default=0.0)
+    salary_cost = Column(Float, nullable=False, default=0.0)
+    sessions_count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<PeriodGradeSnapshot(period='{self.period}', grade='{self.grade}', salary_cost={self.salary_cost})>"
+
+class ClosedPeriodError(Exception):
+    """Raised when a flush would add, change or remove rows of a closed month"""
+    
+    def __init__(self, periods):
+        self.periods = periods
+        super().__init__(f"Period {', '.join(periods)} is closed. Reopen it before changing its payments, sessions or expenses")
+
+def _touched_periods(session):
+    """(center_id, YYYY-MM) of the guarded rows in this flush, before and after any date change"""
+    periods = set()
+    dirty = [obj for obj in session.dirty if isinstance(obj, PERIOD_GUARDED_MODELS) and session.is_modified(obj)]
+    for obj in list(session.new) + dirty + list(session.deleted):
+        if not isinstance(obj, PERIOD_GUARDED_MODELS):
+            continue
+        center_id = obj.center_id if obj.center_id is not None else DEFAULT_CENTER_ID
+        history = attributes.get_history(obj, 'date')
+        for value in history.sum():
+            if value:
+                periods.add((center_id, value.strftime('%Y-%m')))
+    return periods
+
+@event.listens_for(OrmSession, 'before_flush')
+def _reject_closed_period_writes(session, flush_context, instances):
+    periods = _touched_periods(session)
+    if not periods:
+        return
+    
+    with session.no_autoflush:
+        rows = session.execute(
+            select(PeriodClose.center_id, PeriodClose.period).where(
+                PeriodClose.center_id.in_({center_id for center_id, _ in periods}),
+                PeriodClose.period.in_({period for _, period in periods})
+            )
+        ).all()
+    closed = sorted(period for center_id, period in rows if (center_id, period) in periods)
+    if closed:
+        raise ClosedPeriodError(closed)
@@ -1,62 +1,54 @@
-from sqlalchemy import Column, Integer, String, Float, Date, Time, ForeignKey
-from sqlalchemy.orm import relationship
-from datetime import datetime, date, time as time_obj
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Index
+from sqlalchemy.orm import relationship, object_session
+from datetime import datetime, date
 from config.database import Base
+from config.tenancy import CenterScoped
+from services import reference_cache
 
-class Session(Base):
-    __tablename__ = 'sessions'
+MINUTES_PER_DAY = 24 * 60
+
+# Longest session accepted by validate_session
+MAX_SESSION_MINUTES = 12 * 60
+
+def parse_minutes(value, end_of_day=False):
+    """Minutes since midnight of an "HH:MM" string ("24:00" too with end_of_day); raises ValueError"""
+    hours, minutes = value.split(':')
+    hours, minutes_value = int(hours), int(minutes)
+    if len(minutes) != 2 or not 0 <= minutes_value <= 59 or not 0 <= hours * 60 + minutes_value <= MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time {value!r}")
+    if hours == 24 and not end_of_day:
+        raise ValueError(f"Invalid time {value!r}")
+    return hours * 60 + minutes_value
+
+def format_minutes(minutes):
+    """HH:MM string of minutes since midnight"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+class SessionFigures:
+    """Times, duration and salary cost of a session (shared by live and archived sessions)"""
     
-    id = Column(Integer, primary_key=True, index=True)
-    date = Column(Date, nullable=False, default=date.today, index=True)
-    student_id = Column(Integer, ForeignKey('students.id'), nullable=False, index=True)
-    course_id = Column(Integer, ForeignKey('courses.id'), nullable=False, index=True)
-    teacher_id = Column(Integer, ForeignKey('teachers.id'), nullable=False, index=True)
-    start_time = Column(String(10), nullable=False)  # Store as "HH:MM" format
-    end_time = Column(String(10), nullable=False)    # Store as "HH:MM" format
-    hours = Column(Float, nullable=True)  # Calculated from start/end time
-    notes = Column(String(500), nullable=True)
-    created_at = Column(String, default=lambda: datetime.now().isoformat())
-    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat())
+    @property
+    def start_time(self):
+        """Start as "HH:MM" (API format)"""
+        return format_minutes(self.start_minute) if self.start_minute is not None else None
     
-    # Relationships
-    student = relationship("Student", back_populates="sessions")
-    course = relationship("Course", back_populates="sessions")
-    teacher = relationship("Teacher", back_populates="sessions")
+    @property
+    def end_time(self):
+        """End as "HH:MM" (API format); the clock time on the next day for sessions crossing midnight"""
+        return format_minutes(self.end_minute % MINUTES_PER_DAY) if self.end_minute is not None else None
     
-    def calculate_hours(self):
-        """Calculate hours from start and end time"""
-        try:
-            # Parse time strings (format: "HH:MM")
-            start_parts = self.start_time.split(':')
-            end_parts = self.end_time.split(':')
-            
-            start_hour, start_min = int(start_parts[0]), int(start_parts[1])
-            end_hour, end_min = int(end_parts[0]), int(end_parts[1])
-            
-            # Convert to minutes
-            start_minutes = start_hour * 60 + start_min
-            end_minutes = end_hour * 60 + end_min
-            
-            # Handle sessions that cross midnight
-            if end_minutes < start_minutes:
-                end_minutes += 24 * 60
-            
-            # Calculate difference in hours
-            duration_minutes = end_minutes - start_minutes
-            duration_hours = duration_minutes / 60.0
-            
-            self.hours = round(duration_hours, 2)
-            return self.hours
-            
-        except (ValueError, IndexError):
-            return 0.0
+    @property
+    def duration_minutes(self):
+        """Length in minutes"""
+        if self.start_minute is None or self.end_minute is None:
+            return 0
+        return self.end_minute - self.start_minute
     
     @property
     def duration_formatted(self):
         """Get formatted duration string"""
-        if self.hours:
-            hours = int(self.hours)
-            minutes = int((self.hours - hours) * 60)
+        if self.duration_minutes > 0:
+            hours, minutes = divmod(self.duration_minutes, 60)
             if hours > 0 and minutes > 0:
                 return f"{hours}h {minutes}m"
             elif hours > 0:
@@ -68,6 +60,20 @@ class Session(Base):
     @property
     def salary_cost(self):
         """Calculate salary cost for this session using grade-based rates"""
+        if not self.hours:
+            return 0.0
+        
+        db = object_session(self)
+        if db is None:
+            return self._uncached_salary_cost()
+        
+        # Grade-based rate from the cached rate table, teacher default rate if no student info
+        grade = self.student.grade if self.student else None
+        rate = reference_cache.get_rate_table(db).rate_for_teacher(self.teacher_id, grade)
+        return self.hours * rate if rate is not None else 0.0
+    
+    def _uncached_salary_cost(self):
+        """Salary cost of a session not attached to a database session"""
         if self.teacher and self.hours and self.student:
             # Use grade-based rate calculation
             rate = self.teacher.get_rate_for_grade(self.student.grade)
@@ -76,41 +82,83 @@ class Session(Base):
             # Fallback to default rate if no student info
             return self.hours * self.teacher.default_rate
         return 0.0
+
+class Session(SessionFigures, CenterScoped, Base):
+    __tablename__ = 'sessions'
+    __table_args__ = (
+        Index('ix_sessions_center_date', 'center_id', 'date'),
+        Index('ix_sessions_center_teacher_date_minutes', 'center_id', 'teacher_id', 'date', 'start_minute', 'end_minute'),
+        Index('ix_sessions_center_student', 'center_id', 'student_id'),
+        Index('ix_sessions_center_student_date_minutes', 'center_id', 'student_id', 'date', 'start_minute', 'end_minute'),
+        Index('ix_sessions_center_updated_at', 'center_id', 'updated_at'),
+    )
     
-    def validate_session(self):
-        """Validate session data"""
-        errors = []
+    id = Column(Integer, primary_key=True, index=True)
+    date = Column(Date, nullable=False, default=date.today, index=True)
+    student_id = Column(Integer, ForeignKey('students.id'), nullable=False, index=True)
+    course_id = Column(Integer, ForeignKey('courses.id'), nullable=False, index=True)
+    teacher_id = Column(Integer, ForeignKey('teachers.id'), nullable=False, index=True)
+    series_id = Column(Integer, ForeignKey('session_series.id'), nullable=True, index=True)  # Set on occurrences of a recurring series
+    start_minute = Column(Integer, nullable=False)  # Minutes since midnight (API: start_time "HH:MM")
+    end_minute = Column(Integer, nullable=False)    # Above 1440 when the session crosses midnight
+    hours = Column(Float, nullable=True)  # Calculated from start/end minutes
+    notes = Column(String(500), nullable=True)
+    created_at = Column(String, default=lambda: datetime.now().isoformat())
+    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat(), index=True)
+    
+    # Relationships
+    student = relationship("Student", back_populates="sessions")
+    course = relationship("Course", back_populates="sessions")
+    teacher = relationship("Teacher", back_populates="sessions")
+    series = relationship("SessionSeries", back_populates="sessions")
+    
+    @SessionFigures.start_time.setter
+    def start_time(self, value):
+        self._set_time('start_time', value)
+    
+    @SessionFigures.end_time.setter
+    def end_time(self, value):
+        self._set_time('end_time', value)
+    
+    def _set_time(self, field, value):
+        """Parse an "HH:MM" start or end time into minutes; errors are reported by validate_session"""
+        errors = self.__dict__.setdefault('_time_errors', {})
+        errors.pop(field, None)
+        try:
+            minute = parse_minutes(value)
+        except (ValueError, AttributeError):
+            errors[field] = "Start time and end time are required" if not value else f"Invalid {field.replace('_', ' ')}, use HH:MM"
+            minute = None
         
-        if not self.start_time or not self.end_time:
-            errors.append("Start time and end time are required")
-            return errors
+        start = minute if field == 'start_time' else self.start_minute
+        if field == 'end_time':
+            end = minute
+        else:
+            end = self.end_minute % MINUTES_PER_DAY if self.end_minute is not None else None
         
-        # Validate time format
-        try:
-            start_parts = self.start_time.split(':')
-            end_parts = self.end_time.split(':')
-            
-            if len(start_parts) != 2 or len(end_parts) != 2:
-                errors.append("Time format must be HH:MM")
-                return errors
-            
-            start_hour, start_min = int(start_parts[0]), int(start_parts[1])
-            end_hour, end_min = int(end_parts[0]), int(end_parts[1])
-            
-            if not (0 <= start_hour <= 23 and 0 <= start_min <= 59):
-                errors.append("Invalid start time")
-            
-            if not (0 <= end_hour <= 23 and 0 <= end_min <= 59):
-                errors.append("Invalid end time")
-                
-        except ValueError:
-            errors.append("Time format must be HH:MM with valid numbers")
+        # Handle sessions that cross midnight
+        if start is not None and end is not None and end < start:
+            end += MINUTES_PER_DAY
+        self.start_minute = start
+        self.end_minute = end
+    
+    def calculate_hours(self):
+        """Calculate hours from the start and end minutes"""
+        self.hours = round(self.duration_minutes / 60.0, 2)
+        return self.hours
+    
+    def validate_session(self):
+        """Validate session data (the times were parsed when they were set)"""
+        time_errors = self.__dict__.get('_time_errors')
+        if time_errors:
+            return list(dict.fromkeys(time_errors.values()))
+        if self.start_minute is None or self.end_minute is None:
+            return ["Start time and end time are required"]
         
-        # Calculate and validate duration
-        calculated_hours = self.calculate_hours()
-        if calculated_hours <= 0:
+        errors = []
+        if self.duration_minutes <= 0:
             errors.append("End time must be after start time")
-        elif calculated_hours > 12:  # Reasonable maximum session length
+        elif self.duration_minutes > MAX_SESSION_MINUTES:  # Reasonable maximum session length
             errors.append("Session duration cannot exceed 12 hours")
         
         return errors
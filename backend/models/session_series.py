@@ -0,0 +1,67 @@
+from sqlalchemy import Column, Integer, String, Date, ForeignKey, JSON, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime, timedelta
+from config.database import Base
+from config.tenancy import CenterScoped
+from models.session import MINUTES_PER_DAY, format_minutes
+
+WEEKDAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+class SessionSeries(CenterScoped, Base):
+    __tablename__ = 'session_series'
+    __table_args__ = (
+        Index('ix_session_series_center_student', 'center_id', 'student_id'),
+        Index('ix_session_series_center_teacher', 'center_id', 'teacher_id'),
+    )
+    
+    # Weekly slot of a student; its occurrences are ordinary sessions with series_id set
+    id = Column(Integer, primary_key=True, index=True)
+    student_id = Column(Integer, ForeignKey('students.id'), nullable=False, index=True)
+    course_id = Column(Integer, ForeignKey('courses.id'), nullable=False, index=True)
+    teacher_id = Column(Integer, ForeignKey('teachers.id'), nullable=False, index=True)
+    weekdays = Column(JSON, nullable=False)  # Sorted weekday numbers, Monday = 0
+    interval_weeks = Column(Integer, nullable=False, default=1)
+    start_minute = Column(Integer, nullable=False)  # Same minutes as Session
+    end_minute = Column(Integer, nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)  # Last day occurrences are scheduled on
+    notes = Column(String(500), nullable=True)
+    created_at = Column(String, default=lambda: datetime.now().isoformat())
+    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat())
+    
+    # Relationships
+    student = relationship("Student", back_populates="series")
+    course = relationship("Course")
+    teacher = relationship("Teacher")
+    sessions = relationship("Session", back_populates="series")
+    
+    @property
+    def start_time(self):
+        """Start as "HH:MM" (API format)"""
+        return format_minutes(self.start_minute)
+    
+    @property
+    def end_time(self):
+        """End as "HH:MM" (API format)"""
+        return format_minutes(self.end_minute % MINUTES_PER_DAY)
+    
+    @property
+    def weekday_names(self):
+        """Weekdays as names ("mon" to "sun")"""
+        return [WEEKDAY_NAMES[weekday] for weekday in self.weekdays]
+    
+    def occurrence_dates(self, from_date=None):
+        """Dates of the occurrences from from_date (default start_date) to end_date"""
+        dates = []
+        # Weeks are counted from the Monday of the start date's week
+        first_monday = self.start_date - timedelta(days=self.start_date.weekday())
+        day = max(self.start_date, from_date or self.start_date)
+        while day <= self.end_date:
+            weeks = (day - first_monday).days // 7
+            if weeks % self.interval_weeks == 0 and day.weekday() in self.weekdays:
+                dates.append(day)
+            day += timedelta(days=1)
+        return dates
+    
+    def __repr__(self):
+        return f"<SessionSeries(id={self.id}, student_id={self.student_id}, course_id={self.course_id}, weekdays={self.weekday_names})>"
@@ -1,10 +1,16 @@
-from sqlalchemy import Column, Integer, String, Date, Text, Enum, JSON
+from sqlalchemy import Column, Integer, String, Date, Text, Enum, JSON, Index
 from sqlalchemy.orm import relationship
 from datetime import date, datetime
 from config.database import Base
+from config.tenancy import CenterScoped
 
-class Student(Base):
+class Student(CenterScoped, Base):
     __tablename__ = 'students'
+    __table_args__ = (
+        Index('ix_students_center_name', 'center_id', 'name'),
+        Index('ix_students_center_grade', 'center_id', 'grade'),
+        Index('ix_students_center_updated_at', 'center_id', 'updated_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False, index=True)
@@ -15,11 +21,12 @@ class Student(Base):
     contact = Column(String(255), nullable=True)
     balances = Column(JSON, default=dict)  # Store course balances as JSON
     created_at = Column(String, default=lambda: datetime.now().isoformat())
-    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat())
+    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat(), index=True)
     
     # Relationships
     payments = relationship("Payment", back_populates="student", cascade="all, delete-orphan")
     sessions = relationship("Session", back_populates="student", cascade="all, delete-orphan")
+    series = relationship("SessionSeries", back_populates="student", cascade="all, delete-orphan")
     
     @property
     def age(self):
@@ -44,7 +51,7 @@ class Student(Base):
         
         # SQLAlchemy requires explicit flag for JSON field updates
         self.balances = dict(self.balances)
-        
+    
     def has_low_balance(self, course_name, threshold=2.0):
         """Check if student has low balance for a course"""
         return self.get_balance(course_name) < threshold
@@ -1,10 +1,16 @@
-from sqlalchemy import Column, Integer, String, Float, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, JSON, Index
+from sqlalchemy.orm import relationship, object_session
 from datetime import datetime
 from config.database import Base
+from config.tenancy import CenterScoped
+from services import reference_cache
 
-class Teacher(Base):
+class Teacher(CenterScoped, Base):
     __tablename__ = 'teachers'
+    __table_args__ = (
+        Index('ix_teachers_center_name', 'center_id', 'name'),
+        Index('ix_teachers_center_updated_at', 'center_id', 'updated_at'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False, index=True)
@@ -13,7 +19,7 @@ class Teacher(Base):
     grade_rates = Column(JSON, default=dict)  # {"Grade 1": 25.0, "Grade 2": 30.0, "High School": 45.0, "University": 60.0}
     default_rate = Column(Float, nullable=False, default=30.0)  # Fallback rate if grade not specified
     created_at = Column(String, default=lambda: datetime.now().isoformat())
-    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat())
+    updated_at = Column(String, default=lambda: datetime.now().isoformat(), onupdate=lambda: datetime.now().isoformat(), index=True)
     
     # Relationships
     courses = relationship("Course", back_populates="teacher", cascade="all, delete-orphan")
@@ -29,12 +35,10 @@ class Teacher(Base):
     
     def set_rate_for_grade(self, grade, rate):
         """Set hourly rate for a specific grade"""
-        if not self.grade_rates:
-            self.grade_rates = {}
-        
-        self.grade_rates[grade] = float(rate)
-        # SQLAlchemy requires explicit flag for JSON field updates
-        self.grade_rates = dict(self.grade_rates)
+        # Assign a new dict: SQLAlchemy doesn't detect in-place changes to JSON fields
+        grade_rates = dict(self.grade_rates) if self.grade_rates else {}
+        grade_rates[grade] = float(rate)
+        self.grade_rates = grade_rates
     
     def get_all_grades_rates(self):
         """Get all grades and their rates"""
@@ -60,9 +64,14 @@ class Teacher(Base):
         if end_date:
             sessions = [s for s in sessions if s.date <= end_date]
         
+        db = object_session(self)
+        rates = reference_cache.get_rate_table(db) if db is not None else None
         for session in sessions:
             student_grade = session.student.grade if session.student else None
-            rate = self.get_rate_for_grade(student_grade)
+            if rates is not None:
+                rate = rates.rate_for_teacher(self.id, student_grade)
+            else:
+                rate = self.get_rate_for_grade(student_grade)
             total_salary += (session.hours or 0) * rate
         
         return total_salary
@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, event, delete, insert
+from sqlalchemy.orm import attributes
+from config.database import Base
+from models.teacher import Teacher
+
+class TeacherGradeRate(Base):
+    __tablename__ = 'teacher_grade_rates'
+    
+    # Relational copy of Teacher.grade_rates, so rates can be joined in SQL (kept in sync below)
+    teacher_id = Column(Integer, ForeignKey('teachers.id', ondelete='CASCADE'), primary_key=True)
+    grade = Column(String(20), primary_key=True)
+    rate = Column(Float, nullable=False)
+    
+    def __repr__(self):
+        return f"<TeacherGradeRate(teacher_id={self.teacher_id}, grade='{self.grade}', rate={self.rate})>"
+
+def rebuild_grade_rates(connection, teacher_id, grade_rates):
+    """Replace a teacher's rows with the contents of its grade_rates JSON"""
+    connection.execute(delete(TeacherGradeRate).where(TeacherGradeRate.teacher_id == teacher_id))
+    rows = [
+        {'teacher_id': teacher_id, 'grade': grade, 'rate': float(rate)}
+        for grade, rate in (grade_rates or {}).items()
+        if grade and rate is not None
+    ]
+    if rows:
+        connection.execute(insert(TeacherGradeRate), rows)
+
+@event.listens_for(Teacher, 'after_insert')
+def _insert_grade_rates(mapper, connection, target):
+    rebuild_grade_rates(connection, target.id, target.grade_rates)
+
+@event.listens_for(Teacher, 'after_update')
+def _update_grade_rates(mapper, connection, target):
+    if attributes.get_history(target, 'grade_rates').has_changes():
+        rebuild_grade_rates(connection, target.id, target.grade_rates)
+
+@event.listens_for(Teacher, 'after_delete')
+def _delete_grade_rates(mapper, connection, target):
+    connection.execute(delete(TeacherGradeRate).where(TeacherGradeRate.teacher_id == target.id))
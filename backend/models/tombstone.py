@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Integer, String, event, Index, inspect
+from sqlalchemy.orm import Session as OrmSession
+from datetime import datetime
+from config.database import Base
+from config.tenancy import CenterScoped
+from models.student import Student
+from models.teacher import Teacher
+from models.course import Course
+from models.payment import Payment
+from models.session import Session
+from models.expense import Expense
+
+# Entities whose deletions are tracked for delta sync
+SYNCED_MODELS = (Student, Teacher, Course, Payment, Session, Expense)
+
+class Tombstone(CenterScoped, Base):
+    __tablename__ = 'tombstones'
+    __table_args__ = (
+        Index('ix_tombstones_center_entity_deleted_at', 'center_id', 'entity', 'deleted_at'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    entity = Column(String(20), nullable=False, index=True)  # Table name of the deleted row
+    entity_id = Column(Integer, nullable=False)
+    deleted_at = Column(String, nullable=False, index=True, default=lambda: datetime.now().isoformat())
+    
+    def __repr__(self):
+        return f"<Tombstone(entity='{self.entity}', entity_id={self.entity_id}, deleted_at='{self.deleted_at}')>"
+
+def _record_tombstones(session, flush_context):
+    """Tombstones of the rows deleted by the flush (ORM cascades too), written in one INSERT in its transaction"""
+    now = datetime.now().isoformat()
+    rows = [
+        {'center_id': obj.center_id, 'entity': obj.__tablename__, 'entity_id': obj.id, 'deleted_at': now}
+        for obj in session.deleted if isinstance(obj, SYNCED_MODELS)
+    ]
+    if rows:
+        connection = session.connection(bind_arguments={'mapper': inspect(Tombstone)})
+        connection.execute(Tombstone.__table__.insert(), rows)
+
+event.listen(OrmSession, 'after_flush', _record_tombstones)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Balance reconciliation CLI
+Recomputes expected hours balances from payments, sessions and manual ledger
+adjustments and prints every difference with the stored balances as one JSON
+line. With --repair, drifted balances are corrected with a 'Reconciliation'
+ledger adjustment and the students' `balances` JSON is rebuilt. Balances
+entered before the ledger count as manual adjustments unless
+--include-legacy-openings is given. Students are processed in batches, so
+memory use stays bounded on large databases. Every center is reconciled in its
+own scope (so centers with their own database are included), and each
+difference carries its center_id.
+
+Usage: python reconcile_balances.py [--repair] [--include-legacy-openings] [--center-id 1] [--batch-size 1000] [--tolerance 1e-6]
+"""
+
+import argparse
+import json
+import sys
+from sqlalchemy import select
+from config.database import init_db, SessionLocal, center_engines
+from config.tenancy import center_scope
+from models.student import Student
+from services.reconciliation import reconcile, DEFAULT_TOLERANCE
+
+def _centers():
+    """Centers of the main database plus every center with its own database"""
+    session = SessionLocal()
+    try:
+        centers = set(session.execute(select(Student.center_id).distinct()).scalars())
+    finally:
+        session.close()
+    return sorted(centers | set(center_engines))
+
+def run_reconciliation(batch_size=1000, repair=False, tolerance=DEFAULT_TOLERANCE, output=sys.stdout,
+                       include_legacy_openings=False, center_id=None):
+    """Stream differences of one center or all of them to `output`; returns {kind: count}"""
+    
+    print(f"🔄 Reconciling balances{' (repair mode)' if repair else ''}...", file=sys.stderr)
+    
+    counts = {}
+    repaired = 0
+    for center in ([center_id] if center_id is not None else _centers()):
+        with center_scope(center):
+            session = SessionLocal()
+            try:
+                for diff in reconcile(session, batch_size=batch_size, repair=repair, tolerance=tolerance,
+                                      include_legacy_openings=include_legacy_openings):
+                    counts[diff['kind']] = counts.get(diff['kind'], 0) + 1
+                    repaired += 1 if diff.get('repaired') else 0
+                    output.write(json.dumps(dict(center_id=center, **diff)) + '\n')
+            
+            except Exception as e:
+                print(f"❌ Reconciliation of center {center} failed: {e}", file=sys.stderr)
+                session.rollback()
+                raise
+            finally:
+                session.close()
+    
+    summary = ', '.join(f"{count} {kind}" for kind, count in sorted(counts.items())) or 'no differences'
+    print(f"\n🎉 Reconciliation completed: {summary}"
+          f"{f', {repaired} repaired' if repair else ''}.", file=sys.stderr)
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Reconcile stored hours balances with payments and sessions')
+    parser.add_argument('--repair', action='store_true', help='correct drifted balances and JSON mirrors')
+    parser.add_argument('--center-id', type=int, help='only this center (default: every center)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='students per batch')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='ignore differences up to this many hours')
+    parser.add_argument('--include-legacy-openings', action='store_true',
+                        help='report balances entered before the ledger as drift instead of manual adjustments')
+    args = parser.parse_args()
+    
+    init_db()  # Ensure ledger tables exist
+    counts = run_reconciliation(args.batch_size, args.repair, args.tolerance,
+                                include_legacy_openings=args.include_legacy_openings, center_id=args.center_id)
+    sys.exit(1 if counts and not args.repair else 0)
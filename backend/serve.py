@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Production server entry point
+Serves create_app('production') with gunicorn: several worker processes, each
+with a pool of threads. The app is loaded once in the master before forking,
+and each worker gets its own database connection pool after fork.
+
+Usage: python backend/serve.py
+"""
+
+import multiprocessing
+import os
+import sys
+from gunicorn.app.base import BaseApplication
+from app import create_app
+from config.settings import config
+from config.database import all_engines, dispose_engine_after_fork, verify_engine_pool
+
+def default_workers():
+    """Worker processes: 2 x CPU cores + 1 (gunicorn's recommendation)"""
+    return multiprocessing.cpu_count() * 2 + 1
+
+def default_threads():
+    """Threads per worker: one per CPU core, at least 2 so a slow report doesn't block its worker"""
+    return max(2, multiprocessing.cpu_count())
+
+def server_options():
+    """Build gunicorn settings from the environment, falling back to CPU-derived defaults"""
+    threads = int(os.environ.get('WEB_THREADS', default_threads()))
+    return {
+        'bind': f"0.0.0.0:{os.environ.get('PORT', 5000)}",
+        'workers': int(os.environ.get('WEB_CONCURRENCY', default_workers())),
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'preload_app': True,
+        # Recycle each worker gracefully after N requests (jittered so they don't restart together)
+        'max_requests': int(os.environ.get('MAX_REQUESTS', 1000)),
+        'max_requests_jitter': int(os.environ.get('MAX_REQUESTS_JITTER', 100)),
+        'timeout': int(os.environ.get('WEB_TIMEOUT', 60)),
+        'graceful_timeout': int(os.environ.get('GRACEFUL_TIMEOUT', 30)),
+        'accesslog': '-',
+        'pre_fork': pre_fork,
+        'post_fork': post_fork
+    }
+
+def pre_fork(server, worker):
+    """Close connections opened by the master while preloading (e.g. by init_db) before forking"""
+    for db_engine in all_engines():
+        db_engine.dispose()
+
+def post_fork(server, worker):
+    """Give each worker its own connection pool and verify it before serving requests"""
+    dispose_engine_after_fork()
+    verify_engine_pool()
+    server.log.info(f"Worker {worker.pid}: database connection pool created after fork")
+
+class ProductionServer(BaseApplication):
+    """Run a preloaded Flask app under gunicorn"""
+    
+    def __init__(self, application, options=None):
+        self.application = application
+        self.options = options or {}
+        super().__init__()
+    
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+    
+    def load(self):
+        return self.application
+
+if __name__ == '__main__':
+    if config['production'].OUTBOX_ENABLED and config['production'].OUTBOX_DISPATCHER == 'thread':
+        # The preloaded app would start it in the master, whose connections pre_fork disposes
+        print("❌ OUTBOX_DISPATCHER=thread only works with a single-process server. "
+              "Set OUTBOX_DISPATCHER=off and run python backend/dispatch_outbox.py next to serve.py")
+        sys.exit(1)
+    
+    options = server_options()
+    print(f"Starting production server on {options['bind']} "
+          f"with {options['workers']} workers x {options['threads']} threads")
+    ProductionServer(create_app('production'), options).run()
@@ -0,0 +1 @@
+# Services package: business logic shared by the API routes and maintenance scripts 
\ No newline at end of file
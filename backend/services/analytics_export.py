@@ -0,0 +1,311 @@
+"""
+Columnar analytics export of payments, sessions and expenses.
+
+Each table is written to an Arrow IPC or Parquet file, one row group (record
+batch) at a time while the rows are streamed from the database, so memory use
+is bounded by the row group size. Payments and sessions are denormalized with
+the student's name and grade and the course and teacher names (as of the
+export); sessions also carry the teacher's current rate and the salary cost.
+
+The output directory holds a manifest.json with a cursor per table. A run
+exports the rows with cursor <= updated_at < until (until trails the clock like
+the delta sync cursor) into a new delta file, plus the ids deleted in that
+window (from tombstones) into a `-deleted` file. A table without a cursor, or
+any table with full=True, gets a full file instead, which also includes
+archived rows and replaces the table's earlier files. Downstream readers keep
+the latest row per id.
+
+pyarrow is an optional dependency, only imported when exporting.
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from config.settings import Config
+from models.payment import Payment
+from models.session import Session as SessionModel, MINUTES_PER_DAY, format_minutes
+from models.expense import Expense
+from models.student import Student
+from models.teacher import Teacher
+from models.course import Course
+from models.tombstone import Tombstone
+from models.archive import ArchivedPayment, ArchivedSession
+from services import reference_cache
+
+EXPORT_FORMATS = {'parquet': 'parquet', 'arrow': 'arrow'}  # Format -> file extension
+DEFAULT_ROW_GROUP_SIZE = 50000
+MANIFEST_NAME = 'manifest.json'
+
+# Columns read from each table, then the columns added by denormalization
+SOURCE_COLUMNS = {
+    'payments': ['id', 'center_id', 'date', 'student_id', 'course_id', 'teacher_id', 'hourly_rate', 'purchased_hours',
+                 'discounted_tuition', 'amount_paid', 'payment_method', 'created_at', 'updated_at'],
+    'sessions': ['id', 'center_id', 'date', 'student_id', 'course_id', 'teacher_id', 'series_id', 'start_minute',
+                 'end_minute', 'hours', 'notes', 'created_at', 'updated_at'],
+    'expenses': ['id', 'center_id', 'date', 'item', 'amount', 'category', 'description', 'created_at', 'updated_at']
+}
+DENORMALIZED_COLUMNS = {
+    'payments': ['student_name', 'student_grade', 'course_name', 'teacher_name', 'archived'],
+    'sessions': ['start_time', 'end_time', 'student_name', 'student_grade', 'course_name', 'teacher_name', 'rate',
+                 'salary_cost', 'archived'],
+    'expenses': []
+}
+EXPORT_TABLES = {
+    'payments': (Payment, ArchivedPayment),
+    'sessions': (SessionModel, ArchivedSession),
+    'expenses': (Expense, None)
+}
+
+# Arrow type of each column; low-cardinality strings are dictionary encoded
+COLUMN_TYPES = {
+    'id': 'int64', 'center_id': 'int64', 'student_id': 'int64', 'course_id': 'int64', 'teacher_id': 'int64',
+    'series_id': 'int64', 'start_minute': 'int64', 'end_minute': 'int64',
+    'date': 'date', 'created_at': 'timestamp', 'updated_at': 'timestamp', 'deleted_at': 'timestamp',
+    'hourly_rate': 'float64', 'purchased_hours': 'float64', 'discounted_tuition': 'float64', 'amount_paid': 'float64',
+    'hours': 'float64', 'amount': 'float64', 'rate': 'float64', 'salary_cost': 'float64',
+    'payment_method': 'category', 'student_grade': 'category', 'course_name': 'category', 'teacher_name': 'category',
+    'category': 'category', 'start_time': 'category', 'end_time': 'category',
+    'student_name': 'string', 'notes': 'string', 'item': 'string', 'description': 'string',
+    'archived': 'bool'
+}
+DELETED_COLUMNS = ['id', 'deleted_at']
+
+class ExportError(Exception):
+    """Raised when an export can't run (missing pyarrow, mismatched output directory)"""
+
+def _pyarrow():
+    """Import pyarrow, which is only needed for exports"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ExportError("Columnar exports need pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+def _arrow_type(pa, type_name):
+    return {
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'date': pa.date32(),
+        'timestamp': pa.timestamp('us'),
+        'string': pa.string(),
+        'category': pa.dictionary(pa.int32(), pa.string()),
+        'bool': pa.bool_()
+    }[type_name]
+
+def export_columns(table_name):
+    return SOURCE_COLUMNS[table_name] + DENORMALIZED_COLUMNS[table_name]
+
+def arrow_schema(columns):
+    pa = _pyarrow()
+    return pa.schema([(name, _arrow_type(pa, COLUMN_TYPES[name])) for name in columns])
+
+def _timestamp(value):
+    return datetime.fromisoformat(value) if value else None
+
+class _References:
+    """Names, grades and rates for denormalization, loaded once per export"""
+    
+    def __init__(self, db):
+        self.students = {
+            student_id: (name, grade)
+            for student_id, name, grade in db.execute(select(Student.id, Student.name, Student.grade)).all()
+        }
+        self.teachers = dict(db.execute(select(Teacher.id, Teacher.name)).all())
+        self.courses = dict(db.execute(select(Course.id, Course.name)).all())
+        self.rate_table = reference_cache.get_rate_table(db)
+    
+    def denormalize(self, table_name, record, archived):
+        if table_name == 'expenses':
+            return record
+        record['student_name'], record['student_grade'] = self.students.get(record['student_id'], (None, None))
+        record['course_name'] = self.courses.get(record['course_id'])
+        record['teacher_name'] = self.teachers.get(record['teacher_id'])
+        if table_name == 'sessions':
+            # HH:MM like the API (end_minute is past 1440 for sessions crossing midnight)
+            record['start_time'] = format_minutes(record['start_minute'])
+            record['end_time'] = format_minutes(record['end_minute'] % MINUTES_PER_DAY)
+            # SessionFigures.salary_cost rules: the teacher's current rate for the student's grade
+            rate = self.rate_table.rate_for_teacher(record['teacher_id'], record['student_grade'])
+            record['rate'] = rate
+            record['salary_cost'] = record['hours'] * rate if record['hours'] and rate is not None else 0.0
+        record['archived'] = archived
+        return record
+
+class _BatchWriter:
+    """Writes rows to an Arrow IPC or Parquet file in row groups of row_group_size"""
+    
+    def __init__(self, path, columns, file_format, row_group_size):
+        pa = self.pa = _pyarrow()
+        self.columns = columns
+        self.schema = arrow_schema(columns)
+        self.row_group_size = row_group_size
+        self.buffer = {name: [] for name in columns}
+        self.buffered = 0
+        self.rows = 0
+        if file_format == 'parquet':
+            self.sink = None
+            self.writer = pa.parquet.ParquetWriter(path, self.schema, compression='zstd')
+        else:
+            self.sink = pa.OSFile(path, 'wb')
+            self.writer = pa.ipc.new_file(self.sink, self.schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+    
+    def add(self, record):
+        for name in self.columns:
+            self.buffer[name].append(record[name])
+        self.buffered += 1
+        if self.buffered >= self.row_group_size:
+            self.flush()
+    
+    def flush(self):
+        if self.buffered:
+            self.writer.write_batch(self.pa.RecordBatch.from_pydict(self.buffer, schema=self.schema))
+            self.rows += self.buffered
+            self.buffer = {name: [] for name in self.columns}
+            self.buffered = 0
+    
+    def close(self):
+        self.flush()
+        self.writer.close()
+        if self.sink is not None:
+            self.sink.close()
+
+def _stream(db, model, conditions, columns, batch_size):
+    """Rows of a model as dicts, in id order, fetched batch_size at a time"""
+    statement = select(*[getattr(model, name) for name in columns]).where(*conditions).order_by(model.id)
+    for row in db.execute(statement.execution_options(yield_per=batch_size)).mappings():
+        record = dict(row)
+        record['created_at'] = _timestamp(record['created_at'])
+        record['updated_at'] = _timestamp(record['updated_at'])
+        yield record
+
+def _write_table(db, references, table_name, path, file_format, row_group_size, since, until):
+    """Write one table's rows (full when since is None) to path; returns the row count"""
+    model, archive_model = EXPORT_TABLES[table_name]
+    columns = SOURCE_COLUMNS[table_name]
+    writer = _BatchWriter(path, export_columns(table_name), file_format, row_group_size)
+    try:
+        if since is None:
+            sources = [(model, [], False)]
+            if archive_model is not None:
+                sources.append((archive_model, [], True))
+        else:
+            sources = [(model, [model.updated_at >= since, model.updated_at < until], False)]
+        for source, conditions, archived in sources:
+            for record in _stream(db, source, conditions, columns, row_group_size):
+                writer.add(references.denormalize(table_name, record, archived))
+    finally:
+        writer.close()
+    return writer.rows
+
+def _write_deletions(db, table_name, path, file_format, row_group_size, since, until):
+    """Write the ids deleted from a table in [since, until) to path; returns the row count"""
+    writer = _BatchWriter(path, DELETED_COLUMNS, file_format, row_group_size)
+    try:
+        rows = db.execute(
+            select(Tombstone.entity_id, Tombstone.deleted_at).where(
+                Tombstone.entity == table_name,
+                Tombstone.deleted_at >= since,
+                Tombstone.deleted_at < until
+            ).order_by(Tombstone.id).execution_options(yield_per=row_group_size)
+        )
+        for entity_id, deleted_at in rows:
+            writer.add({'id': entity_id, 'deleted_at': _timestamp(deleted_at)})
+    finally:
+        writer.close()
+    return writer.rows
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+def _save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(path + '.tmp', path)
+
+def export(db, output_dir, file_format='parquet', tables=None, full=False, row_group_size=DEFAULT_ROW_GROUP_SIZE,
+           center_id=None, now=None):
+    """Export tables (default: all) to output_dir and advance the manifest's cursors.
+    
+    Files are written under temporary names and renamed once complete; the
+    manifest is only updated when every table succeeded, so a failed run is
+    simply repeated by the next one. Returns {table: {'mode', 'rows', 'deleted', 'files'}}.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ExportError(f"Unknown export format {file_format!r}; use {' or '.join(EXPORT_FORMATS)}")
+    _pyarrow()
+    tables = tables or list(EXPORT_TABLES)
+    unknown = [table_name for table_name in tables if table_name not in EXPORT_TABLES]
+    if unknown:
+        raise ExportError(f"Unknown tables: {', '.join(unknown)}")
+    
+    manifest = load_manifest(output_dir) or {'format': file_format, 'center_id': center_id, 'tables': {}}
+    if manifest['format'] != file_format or manifest['center_id'] != center_id:
+        raise ExportError(
+            f"{output_dir} holds a {manifest['format']} export of center {manifest['center_id']}; "
+            f"use another directory for {file_format} exports of center {center_id}"
+        )
+    
+    # Rows committed by slower concurrent transactions (with an earlier updated_at) land in the next window
+    until = ((now or datetime.now()) - timedelta(seconds=Config.SYNC_CURSOR_LAG_SECONDS)).isoformat()
+    stamp = until.replace('-', '').replace(':', '').replace('.', '')
+    extension = EXPORT_FORMATS[file_format]
+    references = _References(db)
+    
+    written = []
+    results = {}
+    state = {table_name: dict(manifest['tables'].get(table_name, {'cursor': None, 'files': []})) for table_name in tables}
+    try:
+        for table_name in tables:
+            since = None if full else state[table_name]['cursor']
+            mode = 'full' if since is None else 'delta'
+            os.makedirs(os.path.join(output_dir, table_name), exist_ok=True)
+            
+            files = []
+            name = f"{table_name}/{table_name}-{stamp}-{mode}.{extension}"
+            written.append(name)
+            rows = _write_table(db, references, table_name, os.path.join(output_dir, name + '.tmp'),
+                                file_format, row_group_size, since, until)
+            files.append({'path': name, 'rows': rows, 'mode': mode, 'since': since, 'until': until})
+            
+            deleted = 0
+            if since is not None:
+                name = f"{table_name}/{table_name}-{stamp}-deleted.{extension}"
+                written.append(name)
+                deleted = _write_deletions(db, table_name, os.path.join(output_dir, name + '.tmp'),
+                                           file_format, row_group_size, since, until)
+                files.append({'path': name, 'rows': deleted, 'mode': 'deleted', 'since': since, 'until': until})
+            
+            superseded = state[table_name]['files'] if mode == 'full' else []
+            state[table_name] = {
+                'cursor': until,
+                'files': files if mode == 'full' else state[table_name]['files'] + files,
+                'superseded': superseded
+            }
+            results[table_name] = {'mode': mode, 'rows': rows, 'deleted': deleted, 'files': [entry['path'] for entry in files]}
+    except Exception:
+        for name in written:
+            if os.path.exists(os.path.join(output_dir, name + '.tmp')):
+                os.remove(os.path.join(output_dir, name + '.tmp'))
+        raise
+    
+    for name in written:
+        os.replace(os.path.join(output_dir, name + '.tmp'), os.path.join(output_dir, name))
+    for table_name in tables:
+        manifest['tables'][table_name] = {'cursor': state[table_name]['cursor'], 'files': state[table_name]['files']}
+    _save_manifest(output_dir, manifest)
+    
+    # A full export replaces the table's earlier files
+    for table_name in tables:
+        for entry in state[table_name]['superseded']:
+            path = os.path.join(output_dir, entry['path'])
+            if os.path.exists(path) and entry['path'] not in written:
+                os.remove(path)
+    return results
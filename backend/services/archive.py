@@ -0,0 +1,356 @@
+"""
+Hot/cold archiving of payments and sessions.
+
+Rows dated before a horizon (ARCHIVE_HORIZON_MONTHS whole months back) are
+moved in id-ordered batches from `payments` and `sessions` into
+`payments_archive` and `sessions_archive`, keeping their ids. The archive
+tables live next to the live tables, or in ARCHIVE_DATABASE_URL (RoutingSession
+sends statements on archive models there), so archive queries never join live
+tables: student grades, names and rates are looked up separately.
+
+Each center records in `archive_watermarks` the date before which its rows may
+be archived. Reads whose range starts before that date, or has no start, add
+the archived rows; all other reads never touch the archive. Rows written later
+with an older date simply stay live: reads that reach the archive query both
+tables and every row is in exactly one of them.
+
+Archiving keeps the hours ledger and balances as they are, writes no
+tombstones (delta sync clients keep the rows they have; a full sync only
+returns live rows) and leaves closed periods' snapshots alone. restore() moves
+rows back.
+"""
+
+import os
+from datetime import date
+from sqlalchemy import select, insert, delete, func
+from config.database import archive_engine
+from config.tenancy import current_center_id
+from models.payment import Payment
+from models.session import Session as SessionModel
+from models.student import Student
+from models.teacher import Teacher
+from models.archive import ArchivedPayment, ArchivedSession, ArchiveWatermark
+from services import reference_cache
+
+ARCHIVE_HORIZON_MONTHS = int(os.getenv('ARCHIVE_HORIZON_MONTHS', '24'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '1000'))
+
+# Live model -> archive model
+ARCHIVE_MODELS = {Payment: ArchivedPayment, SessionModel: ArchivedSession}
+
+# Largest IN list sent in one lookup query
+LOOKUP_CHUNK_SIZE = 500
+
+def horizon_cutoff(today=None, months=ARCHIVE_HORIZON_MONTHS):
+    """First day of the month `months` months before today's month; older rows are archived"""
+    today = today or date.today()
+    month_index = today.year * 12 + today.month - 1 - months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def archived_before(db):
+    """The current center's watermark, or None if it has never archived (unscoped: the latest of any center)"""
+    return db.query(func.max(ArchiveWatermark.archived_before)).scalar()
+
+def reaches_archive(db, start_date=None):
+    """Whether a read starting at start_date (None: unbounded) has to include archived rows"""
+    watermark = archived_before(db)
+    return watermark is not None and (start_date is None or start_date < watermark)
+
+def _conditions(model, start_date=None, end_date=None, student_id=None, course_id=None, teacher_id=None,
+                student_ids=None, teacher_ids=None, start_minute_from=None, start_minute_to=None):
+    conditions = []
+    if start_date:
+        conditions.append(model.date >= start_date)
+    if end_date:
+        conditions.append(model.date <= end_date)
+    if student_id is not None:
+        conditions.append(model.student_id == student_id)
+    if course_id is not None:
+        conditions.append(model.course_id == course_id)
+    if teacher_id is not None:
+        conditions.append(model.teacher_id == teacher_id)
+    if student_ids is not None:
+        conditions.append(model.student_id.in_(student_ids))
+    if teacher_ids is not None:
+        conditions.append(model.teacher_id.in_(teacher_ids))
+    if start_minute_from is not None:
+        conditions.append(model.start_minute >= start_minute_from)
+    if start_minute_to is not None:
+        conditions.append(model.start_minute < start_minute_to)
+    return conditions
+
+def _chunks(values, size=LOOKUP_CHUNK_SIZE):
+    values = sorted(values)
+    for index in range(0, len(values), size):
+        yield values[index:index + size]
+
+def _lookup(db, model, ids):
+    """{id: row} of live reference rows (students, courses, teachers), in chunked IN queries"""
+    rows = {}
+    for chunk in _chunks(ids):
+        rows.update((row.id, row) for row in db.query(model).filter(model.id.in_(chunk)).all())
+    return rows
+
+def student_grades(db, student_ids):
+    """{student_id: grade} of live students (deleted students are missing)"""
+    grades = {}
+    for chunk in _chunks(student_ids):
+        grades.update(db.execute(select(Student.id, Student.grade).where(Student.id.in_(chunk))).all())
+    return grades
+
+def _exists(db, model, conditions):
+    # Selects a model column (not a bare EXISTS) so RoutingSession sees the mapper and picks the archive database
+    return db.execute(select(model.id).where(*conditions).limit(1)).first() is not None
+
+def _month_key(year, month):
+    return f"{int(year):04d}-{int(month):02d}"
+
+# Reads
+
+def payment_groups(db, start_date=None, end_date=None, **filters):
+    """Archived payments grouped like financials.payment_groups:
+    [(course_id, teacher_id, student_id, amount_paid, purchased_hours, count)]
+    """
+    rows = db.execute(
+        select(
+            ArchivedPayment.course_id,
+            ArchivedPayment.teacher_id,
+            ArchivedPayment.student_id,
+            func.sum(ArchivedPayment.amount_paid),
+            func.sum(ArchivedPayment.purchased_hours),
+            func.count(ArchivedPayment.id)
+        ).where(
+            *_conditions(ArchivedPayment, start_date, end_date, **filters)
+        ).group_by(
+            ArchivedPayment.course_id, ArchivedPayment.teacher_id, ArchivedPayment.student_id
+        )
+    ).all()
+    return [tuple(row) for row in rows]
+
+def payment_grade_groups(db, start_date=None, end_date=None, **filters):
+    """Archived payments grouped like financials.payment_grade_groups: [(teacher_id, grade, amount_paid, purchased_hours, count)].
+    
+    Grouped by student in SQL, then by the students' current grade.
+    """
+    rows = payment_groups(db, start_date, end_date, **filters)
+    grades = student_grades(db, {student_id for _, _, student_id, _, _, _ in rows})
+    groups = {}
+    for _, teacher_id, student_id, amount_paid, purchased_hours, count in rows:
+        totals = groups.setdefault((teacher_id, grades.get(student_id)), [0.0, 0.0, 0])
+        totals[0] += amount_paid
+        totals[1] += purchased_hours
+        totals[2] += count
+    return [key + tuple(totals) for key, totals in groups.items()]
+
+def monthly_revenue(db, start_date, end_date):
+    """{'YYYY-MM': amount paid} of archived payments in range"""
+    year = func.extract('year', ArchivedPayment.date)
+    month = func.extract('month', ArchivedPayment.date)
+    rows = db.execute(
+        select(year, month, func.sum(ArchivedPayment.amount_paid))
+        .where(*_conditions(ArchivedPayment, start_date, end_date))
+        .group_by(year, month)
+    ).all()
+    return {_month_key(year_value, month_value): amount for year_value, month_value, amount in rows}
+
+def session_groups(db, start_date=None, end_date=None, by_month=False, **filters):
+    """Archived sessions grouped like financials.session_groups: [(course_id, teacher_id, grade, hours, count)].
+    
+    Grouped by student in SQL, then by the students' current grade. With by_month
+    each group is prefixed with its 'YYYY-MM' month.
+    """
+    month_columns = []
+    if by_month:
+        month_columns = [func.extract('year', ArchivedSession.date), func.extract('month', ArchivedSession.date)]
+    key_columns = month_columns + [ArchivedSession.course_id, ArchivedSession.teacher_id, ArchivedSession.student_id]
+    rows = db.execute(
+        select(
+            *key_columns,
+            func.sum(func.coalesce(ArchivedSession.hours, 0.0)),
+            func.count(ArchivedSession.id)
+        ).where(
+            *_conditions(ArchivedSession, start_date, end_date, **filters)
+        ).group_by(*key_columns)
+    ).all()
+    
+    grades = student_grades(db, {row[len(key_columns) - 1] for row in rows})
+    groups = {}
+    for row in rows:
+        if by_month:
+            year, month, course_id, teacher_id, student_id, hours, count = row
+            key = (_month_key(year, month), course_id, teacher_id, grades.get(student_id))
+        else:
+            course_id, teacher_id, student_id, hours, count = row
+            key = (course_id, teacher_id, grades.get(student_id))
+        totals = groups.setdefault(key, [0.0, 0])
+        totals[0] += hours
+        totals[1] += count
+    return [key + tuple(totals) for key, totals in groups.items()]
+
+def session_totals(db, start_date=None, end_date=None, **filters):
+    """(count, hours, salary cost at each session teacher's current rate) of archived sessions"""
+    rate_table = reference_cache.get_rate_table(db)
+    count, hours, salary = 0, 0.0, 0.0
+    for _, teacher_id, grade, group_hours, group_count in session_groups(db, start_date, end_date, **filters):
+        rate = rate_table.rate_for_teacher(teacher_id, grade)
+        count += group_count
+        hours += group_hours
+        salary += group_hours * rate if rate is not None else 0.0
+    return count, hours, salary
+
+def payment_students(db, start_date=None, end_date=None, **filters):
+    """Ids of the students with archived payments"""
+    return set(db.execute(
+        select(ArchivedPayment.student_id).distinct().where(*_conditions(ArchivedPayment, start_date, end_date, **filters))
+    ).scalars())
+
+def student_course_sums(db, student_ids):
+    """{(student_id, course_id): [purchased hours, consumed hours, amount paid]} of archived rows"""
+    sums = {}
+    purchased = db.execute(
+        select(ArchivedPayment.student_id, ArchivedPayment.course_id,
+               func.sum(ArchivedPayment.purchased_hours), func.sum(ArchivedPayment.amount_paid))
+        .where(ArchivedPayment.student_id.in_(student_ids))
+        .group_by(ArchivedPayment.student_id, ArchivedPayment.course_id)
+    ).all()
+    for student_id, course_id, hours, amount in purchased:
+        sums[(student_id, course_id)] = [hours or 0.0, 0.0, amount or 0.0]
+    consumed = db.execute(
+        select(ArchivedSession.student_id, ArchivedSession.course_id, func.sum(func.coalesce(ArchivedSession.hours, 0.0)))
+        .where(ArchivedSession.student_id.in_(student_ids))
+        .group_by(ArchivedSession.student_id, ArchivedSession.course_id)
+    ).all()
+    for student_id, course_id, hours in consumed:
+        sums.setdefault((student_id, course_id), [0.0, 0.0, 0.0])[1] = hours or 0.0
+    return sums
+
+def has_rows(db, **filters):
+    """Whether any archived payment or session matches the filters (e.g. course_id=, teacher_id=)"""
+    return any(_exists(db, model, _conditions(model, **filters)) for model in ARCHIVE_MODELS.values())
+
+def attach_references(db, rows):
+    """Set student, course and teacher on archived rows from the live tables; returns rows"""
+    # Imported here because models.course uses this module
+    from models.course import Course
+    
+    if rows:
+        students = _lookup(db, Student, {row.student_id for row in rows})
+        courses = _lookup(db, Course, {row.course_id for row in rows})
+        teachers = _lookup(db, Teacher, {row.teacher_id for row in rows})
+        for row in rows:
+            row.student = students.get(row.student_id)
+            row.course = courses.get(row.course_id)
+            row.teacher = teachers.get(row.teacher_id)
+    return rows
+
+def list_rows(db, model, start_date=None, end_date=None, **filters):
+    """Archived rows of a live model for a list endpoint; [] when the range doesn't reach the archive"""
+    if not reaches_archive(db, start_date):
+        return []
+    archive_model = ARCHIVE_MODELS[model]
+    rows = db.query(archive_model).filter(*_conditions(archive_model, start_date, end_date, **filters)).all()
+    return attach_references(db, rows)
+
+def get_row(db, model, row_id):
+    """Archived row of a live model by id, or None"""
+    if archived_before(db) is None:
+        return None
+    row = db.query(ARCHIVE_MODELS[model]).filter(ARCHIVE_MODELS[model].id == row_id).first()
+    return attach_references(db, [row])[0] if row is not None else None
+
+def delete_student_rows(db, student_id):
+    """Delete a student's archived payments and sessions (with the student)"""
+    for archive_model in ARCHIVE_MODELS.values():
+        db.execute(
+            delete(archive_model).where(archive_model.student_id == student_id)
+            .execution_options(synchronize_session=False)
+        )
+
+# Moving rows
+
+def _move(db, source, target, ids):
+    """Copy rows by id from source to target (skipping ids already there), then delete them from source"""
+    columns = [column.key for column in source.__table__.columns if column.key in target.__table__.columns]
+    rows = db.execute(select(*[getattr(source, name) for name in columns]).where(source.id.in_(ids))).mappings().all()
+    present = set(db.execute(select(target.id).where(target.id.in_(ids))).scalars())
+    new_rows = [dict(row) for row in rows if row['id'] not in present]
+    if new_rows:
+        db.execute(insert(target), new_rows)
+    if archive_engine is not None:
+        # Separate databases: copy first, so an interrupted batch leaves rows in both places
+        # (removed from the source by the next run) rather than in neither
+        db.commit()
+    db.execute(delete(source).where(source.id.in_(ids)).execution_options(synchronize_session=False))
+    db.commit()
+    return len(ids)
+
+def _batches(db, model, conditions, batch_size):
+    """Yield id batches of the matching rows, in id order (re-queried after each batch is moved)"""
+    last_id = 0
+    while True:
+        ids = db.execute(
+            select(model.id).where(model.id > last_id, *conditions).order_by(model.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+def _set_watermark(db, archived_before_date):
+    watermark = db.query(ArchiveWatermark).first()
+    if watermark is None:
+        db.add(ArchiveWatermark(archived_before=archived_before_date))
+    elif watermark.archived_before < archived_before_date:
+        watermark.archived_before = archived_before_date
+    db.commit()
+
+def _require_center():
+    center_id = current_center_id()
+    if center_id is None:
+        raise ValueError("Archiving runs per center: call it inside config.tenancy.center_scope")
+    return center_id
+
+def archive(db, cutoff=None, batch_size=ARCHIVE_BATCH_SIZE, progress=None):
+    """Move the current center's payments and sessions dated before cutoff (default: the horizon) to the archive.
+    
+    Each batch is committed on its own. The newest row of each table (highest id)
+    stays live, so SQLite, which reuses the highest rowid after a delete, never
+    gives an archived id to a new row. Returns {'payments': n, 'sessions': n}.
+    """
+    _require_center()
+    cutoff = cutoff or horizon_cutoff()
+    # Reads union the archive from now on, so every row is visible while it moves
+    _set_watermark(db, cutoff)
+    
+    moved = {}
+    for model, archive_model in ARCHIVE_MODELS.items():
+        table = model.__table__
+        newest_id = db.execute(select(func.max(table.c.id))).scalar() or 0
+        moved[table.name] = 0
+        for ids in _batches(db, model, [model.date < cutoff, model.id < newest_id], batch_size):
+            moved[table.name] += _move(db, model, archive_model, ids)
+            if progress:
+                progress(table.name, moved[table.name])
+    return moved
+
+def restore(db, start_date=None, end_date=None, student_id=None, batch_size=ARCHIVE_BATCH_SIZE, progress=None):
+    """Move the current center's archived payments and sessions back to the live tables.
+    
+    Optionally limited to a date range and/or a student. The watermark is dropped
+    once the center's archive is empty. Returns {'payments': n, 'sessions': n}.
+    """
+    _require_center()
+    restored = {}
+    for model, archive_model in ARCHIVE_MODELS.items():
+        table_name = model.__table__.name
+        restored[table_name] = 0
+        conditions = _conditions(archive_model, start_date, end_date, student_id=student_id)
+        for ids in _batches(db, archive_model, conditions, batch_size):
+            restored[table_name] += _move(db, archive_model, model, ids)
+            if progress:
+                progress(table_name, restored[table_name])
+    
+    if not any(_exists(db, archive_model, []) for archive_model in ARCHIVE_MODELS.values()):
+        db.query(ArchiveWatermark).delete(synchronize_session=False)
+        db.commit()
+    return restored
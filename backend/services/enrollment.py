@@ -0,0 +1,140 @@
+"""
+Student x course enrollment matrix.
+
+For every (student, course) pair with payments, sessions or a balance, the
+matrix holds purchased hours, consumed hours, remaining hours and amount paid.
+It is computed with grouped queries for one page of students at a time and
+returned in a sparse form: the student and course axes are listed once and
+each non-empty cell references them by index.
+
+Archived payments and sessions (services.archive) are added to the cells of
+pairs that have a balance row, which every pair with a payment gets.
+"""
+
+from sqlalchemy import func, select, union
+from models.payment import Payment
+from models.session import Session as SessionModel
+from models.student import Student
+from models.course import Course
+from models.hours_balance import HoursBalance
+from services import archive
+
+CELL_COLUMNS = ['purchased_hours', 'consumed_hours', 'remaining_hours', 'amount_paid']
+
+def _enrollment_pairs():
+    """(student_id, course_id) of every pair with payments, sessions or a balance row"""
+    return union(
+        select(Payment.student_id, Payment.course_id),
+        select(SessionModel.student_id, SessionModel.course_id),
+        select(HoursBalance.student_id, HoursBalance.course_id)
+    ).subquery()
+
+def _filtered_pairs(grade=None, course_id=None, teacher_id=None):
+    pairs = _enrollment_pairs()
+    query = select(pairs.c.student_id, pairs.c.course_id).join(
+        Student, Student.id == pairs.c.student_id
+    ).join(
+        Course, Course.id == pairs.c.course_id
+    )
+    if grade:
+        query = query.where(Student.grade == grade)
+    if course_id:
+        query = query.where(Course.id == course_id)
+    if teacher_id:
+        query = query.where(Course.teacher_id == teacher_id)
+    return query.subquery()
+
+def build_enrollment_matrix(db, grade=None, course_id=None, teacher_id=None, page=1, per_page=100):
+    """One page of the matrix; students are paged (by id), cells are all of each student's courses"""
+    pairs = _filtered_pairs(grade, course_id, teacher_id)
+    
+    total_students = db.execute(select(func.count(func.distinct(pairs.c.student_id)))).scalar()
+    student_ids = db.execute(
+        select(pairs.c.student_id).distinct().order_by(pairs.c.student_id)
+        .limit(per_page).offset((page - 1) * per_page)
+    ).scalars().all()
+    
+    cells = {}
+    if student_ids:
+        page_pairs = select(pairs.c.student_id, pairs.c.course_id).where(pairs.c.student_id.in_(student_ids))
+        for student_id, pair_course_id in db.execute(page_pairs).all():
+            cells[(student_id, pair_course_id)] = [0, 0, None, 0]
+        
+        purchased = db.execute(
+            select(Payment.student_id, Payment.course_id, func.sum(Payment.purchased_hours), func.sum(Payment.amount_paid))
+            .where(Payment.student_id.in_(student_ids))
+            .group_by(Payment.student_id, Payment.course_id)
+        ).all()
+        for student_id, pair_course_id, hours, amount in purchased:
+            cell = cells.get((student_id, pair_course_id))
+            if cell is not None:
+                cell[0], cell[3] = hours, amount
+        
+        consumed = db.execute(
+            select(SessionModel.student_id, SessionModel.course_id, func.sum(func.coalesce(SessionModel.hours, 0.0)))
+            .where(SessionModel.student_id.in_(student_ids))
+            .group_by(SessionModel.student_id, SessionModel.course_id)
+        ).all()
+        for student_id, pair_course_id, hours in consumed:
+            cell = cells.get((student_id, pair_course_id))
+            if cell is not None:
+                cell[1] = hours
+        
+        if archive.reaches_archive(db):
+            for pair, (hours, consumed_hours, amount) in archive.student_course_sums(db, student_ids).items():
+                cell = cells.get(pair)
+                if cell is not None:
+                    cell[0] += hours
+                    cell[1] += consumed_hours
+                    cell[3] += amount
+        
+        balances = db.execute(
+            select(HoursBalance.student_id, HoursBalance.course_id, HoursBalance.hours)
+            .where(HoursBalance.student_id.in_(student_ids))
+        ).all()
+        for student_id, pair_course_id, hours in balances:
+            cell = cells.get((student_id, pair_course_id))
+            if cell is not None:
+                cell[2] = hours
+    
+    students = []
+    courses = []
+    if cells:
+        students = [
+            {'id': student_id, 'name': name, 'grade': student_grade}
+            for student_id, name, student_grade in db.execute(
+                select(Student.id, Student.name, Student.grade).where(Student.id.in_(student_ids)).order_by(Student.id)
+            ).all()
+        ]
+        course_ids = sorted({pair_course_id for _, pair_course_id in cells})
+        courses = [
+            {'id': cell_course_id, 'name': name, 'teacher_id': course_teacher_id}
+            for cell_course_id, name, course_teacher_id in db.execute(
+                select(Course.id, Course.name, Course.teacher_id).where(Course.id.in_(course_ids)).order_by(Course.id)
+            ).all()
+        ]
+    
+    student_index = {student['id']: index for index, student in enumerate(students)}
+    course_index = {course['id']: index for index, course in enumerate(courses)}
+    matrix = []
+    for (student_id, pair_course_id), (purchased_hours, consumed_hours, remaining_hours, amount_paid) in sorted(cells.items()):
+        if remaining_hours is None:
+            # No ledger balance row yet: derive it from purchases and sessions
+            remaining_hours = purchased_hours - consumed_hours
+        matrix.append([
+            student_index[student_id], course_index[pair_course_id],
+            purchased_hours, consumed_hours, remaining_hours, amount_paid
+        ])
+    
+    return {
+        'students': students,
+        'courses': courses,
+        'columns': ['student', 'course'] + CELL_COLUMNS,
+        'cells': matrix,
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total_students': total_students,
+            'pages': (total_students + per_page - 1) // per_page
+        }
+    }
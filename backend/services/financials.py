@@ -0,0 +1,714 @@
+"""
+Financial report building blocks.
+
+Each sub-query takes a database session and returns plain, already-aggregated
+data, so they can run independently (see services.report_executor). The merge
+functions combine their results into the report structures served by
+api/routes/reports.py. Payment and session sub-queries add archived rows when
+their range reaches the archive (see services.archive).
+"""
+
+from sqlalchemy import func
+from models.payment import Payment
+from models.session import Session as SessionModel
+from models.expense import Expense
+from models.student import Student
+from models.teacher import Teacher
+from models.course import Course
+from services.sharding import month_shards
+from services import period_close, archive
+
+LOW_BALANCE_THRESHOLD = 2.0
+
+# Grade key for sessions whose student has no grade
+UNKNOWN_GRADE = 'Unknown'
+
+# Sub-queries
+
+def payment_groups(db, start_date, end_date):
+    """Payments in range grouped by (course, teacher, student).
+    
+    Returns [(course_id, teacher_id, student_id, amount_paid, purchased_hours, count)]
+    """
+    rows = db.query(
+        Payment.course_id,
+        Payment.teacher_id,
+        Payment.student_id,
+        func.sum(Payment.amount_paid),
+        func.sum(Payment.purchased_hours),
+        func.count(Payment.id)
+    ).filter(
+        Payment.date >= start_date,
+        Payment.date <= end_date
+    ).group_by(
+        Payment.course_id, Payment.teacher_id, Payment.student_id
+    ).all()
+    rows = [tuple(row) for row in rows]
+    if archive.reaches_archive(db, start_date):
+        rows = merge_groups([rows, archive.payment_groups(db, start_date, end_date)], 3)
+    return rows
+
+def payment_grade_groups(db, start_date, end_date):
+    """Payments in range grouped by (teacher, student grade).
+    
+    Returns [(teacher_id, grade, amount_paid, purchased_hours, count)]
+    """
+    rows = db.query(
+        Payment.teacher_id,
+        Student.grade,
+        func.sum(Payment.amount_paid),
+        func.sum(Payment.purchased_hours),
+        func.count(Payment.id)
+    ).outerjoin(
+        Student, Student.id == Payment.student_id
+    ).filter(
+        Payment.date >= start_date,
+        Payment.date <= end_date
+    ).group_by(
+        Payment.teacher_id, Student.grade
+    ).all()
+    rows = [tuple(row) for row in rows]
+    if archive.reaches_archive(db, start_date):
+        rows = merge_groups([rows, archive.payment_grade_groups(db, start_date, end_date)], 2)
+    return rows
+
+def session_groups(db, start_date, end_date):
+    """Sessions in range grouped by (course, teacher, student grade).
+    
+    Returns [(course_id, teacher_id, grade, hours, count)]
+    """
+    rows = db.query(
+        SessionModel.course_id,
+        SessionModel.teacher_id,
+        Student.grade,
+        func.sum(func.coalesce(SessionModel.hours, 0.0)),
+        func.count(SessionModel.id)
+    ).outerjoin(
+        Student, Student.id == SessionModel.student_id
+    ).filter(
+        SessionModel.date >= start_date,
+        SessionModel.date <= end_date
+    ).group_by(
+        SessionModel.course_id, SessionModel.teacher_id, Student.grade
+    ).all()
+    rows = [tuple(row) for row in rows]
+    if archive.reaches_archive(db, start_date):
+        rows = merge_groups([rows, archive.session_groups(db, start_date, end_date)], 3)
+    return rows
+
+def payment_total(db, start_date, end_date):
+    """Total amount paid in range"""
+    total = db.query(func.coalesce(func.sum(Payment.amount_paid), 0)).filter(
+        Payment.date >= start_date,
+        Payment.date <= end_date
+    ).scalar()
+    if archive.reaches_archive(db, start_date):
+        total += sum(row[3] for row in archive.payment_groups(db, start_date, end_date))
+    return total
+
+def expense_total(db, start_date, end_date):
+    """Expenses in range. Returns (total amount, count)"""
+    total, count = db.query(
+        func.coalesce(func.sum(Expense.amount), 0),
+        func.count(Expense.id)
+    ).filter(
+        Expense.date >= start_date,
+        Expense.date <= end_date
+    ).one()
+    return total, count
+
+def _month_columns(column):
+    """(year, month) of a date column, for grouping by calendar month"""
+    return func.extract('year', column).label('year'), func.extract('month', column).label('month')
+
+def _month_key(year, month):
+    return f"{int(year):04d}-{int(month):02d}"
+
+def monthly_breakdown(db, start_date, end_date):
+    """Revenue, session groups and expenses of every month in range, in three grouped queries.
+    
+    Returns {'YYYY-MM': {'revenue', 'sessions', 'expenses'}} shaped like payment_total,
+    session_groups and expense_total for that month, including months without data.
+    """
+    months = {
+        month_start.strftime('%Y-%m'): {'revenue': 0, 'sessions': [], 'expenses': (0, 0)}
+        for month_start, _ in month_ranges(start_date, end_date)
+    }
+    
+    year, month = _month_columns(Payment.date)
+    revenue_rows = db.query(year, month, func.sum(Payment.amount_paid)).filter(
+        Payment.date >= start_date,
+        Payment.date <= end_date
+    ).group_by(year, month).all()
+    for year_value, month_value, revenue in revenue_rows:
+        months[_month_key(year_value, month_value)]['revenue'] = revenue
+    
+    year, month = _month_columns(SessionModel.date)
+    session_rows = db.query(
+        year, month,
+        SessionModel.course_id,
+        SessionModel.teacher_id,
+        Student.grade,
+        func.sum(func.coalesce(SessionModel.hours, 0.0)),
+        func.count(SessionModel.id)
+    ).outerjoin(
+        Student, Student.id == SessionModel.student_id
+    ).filter(
+        SessionModel.date >= start_date,
+        SessionModel.date <= end_date
+    ).group_by(
+        year, month, SessionModel.course_id, SessionModel.teacher_id, Student.grade
+    ).order_by(
+        year, month, SessionModel.course_id, SessionModel.teacher_id, Student.grade
+    ).all()
+    for year_value, month_value, *group in session_rows:
+        months[_month_key(year_value, month_value)]['sessions'].append(tuple(group))
+    
+    if archive.reaches_archive(db, start_date):
+        for key, revenue in archive.monthly_revenue(db, start_date, end_date).items():
+            months[key]['revenue'] += revenue
+        archived_sessions = {}
+        for key, *group in archive.session_groups(db, start_date, end_date, by_month=True):
+            archived_sessions.setdefault(key, []).append(tuple(group))
+        for key, groups in archived_sessions.items():
+            months[key]['sessions'] = sorted(
+                merge_groups([months[key]['sessions'], groups], 3),
+                key=lambda group: (group[0], group[1], group[2] is not None, group[2] or '')
+            )
+    
+    year, month = _month_columns(Expense.date)
+    expense_rows = db.query(year, month, func.sum(Expense.amount), func.count(Expense.id)).filter(
+        Expense.date >= start_date,
+        Expense.date <= end_date
+    ).group_by(year, month).all()
+    for year_value, month_value, total, count in expense_rows:
+        months[_month_key(year_value, month_value)]['expenses'] = (total, count)
+    
+    return months
+
+def course_list(db):
+    """Returns [(course_id, course_name, teacher_name)]"""
+    rows = db.query(Course.id, Course.name, Teacher.name).outerjoin(
+        Teacher, Teacher.id == Course.teacher_id
+    ).order_by(Course.id).all()
+    return [tuple(row) for row in rows]
+
+def teacher_list(db):
+    """Returns [(teacher_id, teacher_name, default_rate, grade_rates)]"""
+    rows = db.query(Teacher.id, Teacher.name, Teacher.default_rate, Teacher.grade_rates).order_by(Teacher.id).all()
+    return [(teacher_id, name, default_rate, grade_rates or {}) for teacher_id, name, default_rate, grade_rates in rows]
+
+def outstanding_by_course(db):
+    """Sum of student balances per course name, in one pass over the students table"""
+    outstanding = {}
+    for (balances,) in db.query(Student.balances).yield_per(1000):
+        for course_name, balance in (balances or {}).items():
+            outstanding[course_name] = outstanding.get(course_name, 0) + balance
+    return outstanding
+
+def low_balance_alerts(db, threshold=LOW_BALANCE_THRESHOLD):
+    """Returns [{'student_id', 'student_name', 'course_name', 'balance'}] for balances below threshold"""
+    alerts = []
+    for student_id, name, balances in db.query(Student.id, Student.name, Student.balances).order_by(Student.id).yield_per(1000):
+        for course_name, balance in (balances or {}).items():
+            if balance < threshold:
+                alerts.append({
+                    'student_id': student_id,
+                    'student_name': name,
+                    'course_name': course_name,
+                    'balance': balance
+                })
+    return alerts
+
+def entity_counts(db):
+    """Returns {'students', 'teachers', 'courses'} row counts"""
+    return {
+        'students': db.query(func.count(Student.id)).scalar(),
+        'teachers': db.query(func.count(Teacher.id)).scalar(),
+        'courses': db.query(func.count(Course.id)).scalar()
+    }
+
+# Merging
+
+def round_amount(value):
+    """Amount or hours as served in a report: rounded to cents.
+    
+    Sums of the same rows added in a different order (one SQL SUM, or month
+    shards merged in Python) differ in the last float bits. Rounding to six
+    places first removes that noise, so every path serves the same number.
+    Reports round here, once, after all adding up is done.
+    """
+    return round(round(value, 6), 2)
+
+def session_salary(teachers_by_id, teacher_id, grade, hours):
+    """Salary cost of `hours` taught by a teacher to students of a grade (Teacher.get_rate_for_grade rules)"""
+    teacher = teachers_by_id.get(teacher_id)
+    if not teacher or not hours:
+        return 0.0
+    _, _, default_rate, grade_rates = teacher
+    rate = grade_rates.get(grade, default_rate) if grade and grade_rates else default_rate
+    return hours * rate
+
+def total_salary(teachers, sessions):
+    """Total salary cost of session groups"""
+    teachers_by_id = {teacher[0]: teacher for teacher in teachers}
+    return sum(
+        session_salary(teachers_by_id, teacher_id, grade, hours)
+        for _, teacher_id, grade, hours, _ in sessions
+    )
+
+def _course_totals():
+    return {'revenue': 0, 'salary_cost': 0, 'hours_taught': 0, 'students': set()}
+
+def _teacher_totals():
+    return {'total_hours': 0, 'total_salary': 0, 'signed_hours': 0, 'sessions_count': 0}
+
+def _grade_totals():
+    return {'hours_taught': 0, 'salary_cost': 0, 'sessions_count': 0}
+
+def _empty_aggregate():
+    return {
+        'summary': {
+            'revenue': 0, 'expenses': 0, 'expense_count': 0, 'salary_cost': 0,
+            'hours_taught': 0, 'payment_count': 0, 'session_count': 0
+        },
+        'courses': {},
+        'teachers': {},
+        'grades': {}
+    }
+
+def aggregate_financial(payments, sessions, expenses, teachers):
+    """Summary, per-course, per-teacher and per-grade totals of payment and session groups.
+    
+    Salaries use the teachers' current rates. This is also what a period close
+    freezes into its snapshot tables (see services.period_close).
+    """
+    teachers_by_id = {teacher[0]: teacher for teacher in teachers}
+    aggregate = _empty_aggregate()
+    summary = aggregate['summary']
+    
+    for course_id, teacher_id, student_id, amount_paid, purchased_hours, count in payments:
+        summary['revenue'] += amount_paid
+        summary['payment_count'] += count
+        course = aggregate['courses'].setdefault(course_id, _course_totals())
+        course['revenue'] += amount_paid
+        course['students'].add(student_id)
+        aggregate['teachers'].setdefault(teacher_id, _teacher_totals())['signed_hours'] += purchased_hours
+    
+    for course_id, teacher_id, grade, hours, count in sessions:
+        salary = session_salary(teachers_by_id, teacher_id, grade, hours)
+        summary['salary_cost'] += salary
+        summary['hours_taught'] += hours
+        summary['session_count'] += count
+        course = aggregate['courses'].setdefault(course_id, _course_totals())
+        course['salary_cost'] += salary
+        course['hours_taught'] += hours
+        teacher = aggregate['teachers'].setdefault(teacher_id, _teacher_totals())
+        teacher['total_hours'] += hours
+        teacher['total_salary'] += salary
+        teacher['sessions_count'] += count
+        grade_totals = aggregate['grades'].setdefault(grade or UNKNOWN_GRADE, _grade_totals())
+        grade_totals['hours_taught'] += hours
+        grade_totals['salary_cost'] += salary
+        grade_totals['sessions_count'] += count
+    
+    summary['expenses'], summary['expense_count'] = expenses
+    return aggregate
+
+def combine_aggregates(aggregates):
+    """Add up aggregates of consecutive parts of a range (pass them in date order)"""
+    if len(aggregates) == 1:
+        return aggregates[0]
+    
+    combined = _empty_aggregate()
+    for aggregate in aggregates:
+        for field, value in aggregate['summary'].items():
+            combined['summary'][field] += value
+        for course_id, totals in aggregate['courses'].items():
+            course = combined['courses'].setdefault(course_id, _course_totals())
+            for field in ('revenue', 'salary_cost', 'hours_taught'):
+                course[field] += totals[field]
+            course['students'] |= totals['students']
+        for key, new_totals in (('teachers', _teacher_totals), ('grades', _grade_totals)):
+            for entry_id, totals in aggregate[key].items():
+                entry = combined[key].setdefault(entry_id, new_totals())
+                for field, value in totals.items():
+                    entry[field] += value
+    return combined
+
+def render_financial(start_date, end_date, aggregate, courses, teachers, outstanding):
+    """Build the financial report from an aggregate and the current reference data"""
+    summary = aggregate['summary']
+    total_revenue = round_amount(summary['revenue'])
+    total_expenses = round_amount(summary['expenses'])
+    total_salary_cost = round_amount(summary['salary_cost'])
+    total_costs = round_amount(total_expenses + total_salary_cost)
+    net_profit = round_amount(total_revenue - total_costs)
+    
+    course_analysis = {}
+    for course_id, course_name, teacher_name in courses:
+        totals = aggregate['courses'].get(course_id) or _course_totals()
+        revenue = round_amount(totals['revenue'])
+        salary_cost = round_amount(totals['salary_cost'])
+        course_analysis[course_name] = {
+            'revenue': revenue,
+            'salary_cost': salary_cost,
+            'net_profit': round_amount(revenue - salary_cost),
+            'hours_taught': round_amount(totals['hours_taught']),
+            'enrollment_count': len(totals['students']),
+            'outstanding_balance': round_amount(outstanding.get(course_name, 0)),
+            'teacher_name': teacher_name
+        }
+    
+    teacher_analysis = {}
+    for teacher_id, teacher_name, default_rate, grade_rates in teachers:
+        totals = aggregate['teachers'].get(teacher_id) or _teacher_totals()
+        total_hours = round_amount(totals['total_hours'])
+        signed_hours = round_amount(totals['signed_hours'])
+        teacher_analysis[teacher_name] = {
+            'total_hours': total_hours,
+            'total_salary': round_amount(totals['total_salary']),
+            'signed_hours': signed_hours,
+            'remaining_hours': round_amount(signed_hours - total_hours),
+            'sessions_count': totals['sessions_count'],
+            'default_rate': default_rate,
+            'grade_rates': grade_rates
+        }
+    
+    grade_analysis = {
+        grade: {
+            'hours_taught': round_amount(totals['hours_taught']),
+            'salary_cost': round_amount(totals['salary_cost']),
+            'sessions_count': totals['sessions_count']
+        }
+        for grade, totals in sorted(aggregate['grades'].items())
+    }
+    
+    return {
+        'period': {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        },
+        'summary': {
+            'total_revenue': total_revenue,
+            'total_expenses': total_expenses,
+            'total_salary_cost': total_salary_cost,
+            'total_costs': total_costs,
+            'net_profit': net_profit,
+            'profit_margin': round_amount(net_profit / total_revenue * 100) if total_revenue > 0 else 0
+        },
+        'course_analysis': course_analysis,
+        'teacher_analysis': teacher_analysis,
+        'grade_analysis': grade_analysis,
+        'payment_count': summary['payment_count'],
+        'session_count': summary['session_count'],
+        'expense_count': summary['expense_count']
+    }
+
+def period_aggregate(db, start_date, end_date):
+    """Aggregate of a date range computed from the source rows (used when closing a month)"""
+    return aggregate_financial(
+        payment_groups(db, start_date, end_date),
+        session_groups(db, start_date, end_date),
+        expense_total(db, start_date, end_date),
+        teacher_list(db)
+    )
+
+def build_financial_report(executor, start_date, end_date, sharder=None):
+    """Run the financial report sub-queries on an executor and merge them.
+    
+    Closed months are read from their snapshots (services.period_close); only the
+    open parts of the range are queried. With a sharder
+    (services.sharding.ShardedReportRunner), long open ranges compute payments,
+    sessions and expenses per month shard and merge the partials.
+    """
+    snapshots = {}
+    if period_close.full_months(start_date, end_date):
+        snapshots = executor.run({'snapshots': (period_close.load_snapshots, (start_date, end_date))})['snapshots']
+    ranges = period_close.open_ranges(start_date, end_date, snapshots)
+    sharded = [sharder is not None and sharder.should_shard(range_start, range_end) for range_start, range_end in ranges]
+    
+    tasks = {
+        'courses': (course_list, ()),
+        'teachers': (teacher_list, ()),
+        'outstanding': (outstanding_by_course, ())
+    }
+    for index, (range_start, range_end) in enumerate(ranges):
+        if not sharded[index]:
+            tasks[('payments', index)] = (payment_groups, (range_start, range_end))
+            tasks[('sessions', index)] = (session_groups, (range_start, range_end))
+            tasks[('expenses', index)] = (expense_total, (range_start, range_end))
+    results = executor.run(tasks)
+    
+    parts = [(period_close.period_bounds(period)[0], aggregate) for period, aggregate in snapshots.items()]
+    for index, (range_start, range_end) in enumerate(ranges):
+        if sharded[index]:
+            groups = merge_financial_shards(sharder.run(financial_shard, range_start, range_end))
+        else:
+            groups = {name: results[(name, index)] for name in ('payments', 'sessions', 'expenses')}
+        parts.append((range_start, aggregate_financial(
+            groups['payments'], groups['sessions'], groups['expenses'], results['teachers']
+        )))
+    
+    aggregate = combine_aggregates([aggregate for _, aggregate in sorted(parts, key=lambda part: part[0])])
+    report = render_financial(start_date, end_date, aggregate, results['courses'], results['teachers'], results['outstanding'])
+    report['closed_periods'] = sorted(snapshots)
+    return report
+
+# Month shards (see services.sharding). Shard functions must stay module-level so
+# they can be sent to pool processes.
+
+def financial_shard(db, start_date, end_date):
+    """Partial financial aggregates for one shard"""
+    return {
+        'payments': payment_groups(db, start_date, end_date),
+        'sessions': session_groups(db, start_date, end_date),
+        'expenses': expense_total(db, start_date, end_date)
+    }
+
+def merge_groups(group_lists, key_size):
+    """Merge grouped rows (key columns followed by summable columns) from several shards.
+    
+    Summing is associative, so any shard split gives the same groups; rows are
+    merged in shard order so the float results are reproducible.
+    """
+    merged = {}
+    for groups in group_lists:
+        for row in groups:
+            key, values = tuple(row[:key_size]), row[key_size:]
+            if key in merged:
+                merged[key] = [total + value for total, value in zip(merged[key], values)]
+            else:
+                merged[key] = list(values)
+    return [key + tuple(values) for key, values in merged.items()]
+
+def merge_financial_shards(partials):
+    """Combine financial_shard results into payments, sessions and expenses results"""
+    expense_amount = 0
+    expense_count = 0
+    for partial in partials:
+        amount, count = partial['expenses']
+        expense_amount += amount
+        expense_count += count
+    
+    return {
+        'payments': merge_groups([partial['payments'] for partial in partials], 3),
+        'sessions': merge_groups([partial['sessions'] for partial in partials], 3),
+        'expenses': (expense_amount, expense_count)
+    }
+
+def build_attendance_report(executor, start_date, end_date, sharder=None):
+    """Teacher hours and salary for a date range"""
+    tasks = {
+        'teachers': (teacher_list, ()),
+        'courses': (course_list, ())
+    }
+    sharded = sharder is not None and sharder.should_shard(start_date, end_date)
+    if not sharded:
+        tasks['sessions'] = (session_groups, (start_date, end_date))
+    
+    results = executor.run(tasks)
+    if sharded:
+        sessions = merge_groups(sharder.run(session_groups, start_date, end_date), 3)
+    else:
+        sessions = results['sessions']
+    return merge_attendance(start_date, end_date, sessions, results['teachers'], results['courses'])
+
+def merge_attendance(start_date, end_date, sessions, teachers, courses):
+    """Build the attendance report from session groups"""
+    teachers_by_id = {teacher[0]: teacher for teacher in teachers}
+    course_names = {course_id: course_name for course_id, course_name, _ in courses}
+    
+    teacher_data = {}
+    for course_id, teacher_id, grade, hours, count in sessions:
+        if teacher_id not in teacher_data:
+            teacher = teachers_by_id.get(teacher_id)
+            teacher_data[teacher_id] = {
+                'teacher_name': teacher[1] if teacher else 'Unknown',
+                'default_rate': teacher[2] if teacher else 0,
+                'grade_rates': teacher[3] if teacher else {},
+                'total_hours': 0,
+                'total_salary': 0,
+                'sessions_count': 0,
+                'courses': set()
+            }
+        
+        data = teacher_data[teacher_id]
+        data['total_hours'] += hours
+        data['total_salary'] += session_salary(teachers_by_id, teacher_id, grade, hours)
+        data['sessions_count'] += count
+        if course_id in course_names:
+            data['courses'].add(course_names[course_id])
+    
+    # Sort for JSON serialization and reproducible output
+    teachers_out = []
+    for teacher_id in sorted(teacher_data):
+        data = teacher_data[teacher_id]
+        data['total_hours'] = round_amount(data['total_hours'])
+        data['total_salary'] = round_amount(data['total_salary'])
+        data['courses'] = sorted(data['courses'])
+        teachers_out.append(data)
+    
+    return {
+        'period': {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        },
+        'teachers': teachers_out,
+        'total_hours': round_amount(sum(data['total_hours'] for data in teachers_out)),
+        'total_salary': round_amount(sum(data['total_salary'] for data in teachers_out))
+    }
+
+def grade_profitability_shard(db, start_date, end_date):
+    """Payment and session groups by grade for one shard"""
+    return {
+        'payments': payment_grade_groups(db, start_date, end_date),
+        'sessions': session_groups(db, start_date, end_date)
+    }
+
+def build_grade_profitability_report(executor, start_date, end_date, sharder=None):
+    """Revenue, hours, salary cost and margin per student grade and per (teacher, grade).
+    
+    Computed from the rows at the teachers' current rates, closed months included.
+    """
+    tasks = {'teachers': (teacher_list, ())}
+    sharded = sharder is not None and sharder.should_shard(start_date, end_date)
+    if not sharded:
+        tasks['payments'] = (payment_grade_groups, (start_date, end_date))
+        tasks['sessions'] = (session_groups, (start_date, end_date))
+    
+    results = executor.run(tasks)
+    if sharded:
+        partials = sharder.run(grade_profitability_shard, start_date, end_date)
+        payments = merge_groups([partial['payments'] for partial in partials], 2)
+        sessions = merge_groups([partial['sessions'] for partial in partials], 3)
+    else:
+        payments, sessions = results['payments'], results['sessions']
+    return merge_grade_profitability(start_date, end_date, payments, sessions, results['teachers'])
+
+def _profitability_totals():
+    return {'revenue': 0, 'hours_sold': 0, 'payment_count': 0, 'hours_taught': 0, 'salary_cost': 0, 'session_count': 0}
+
+def _profitability_figures(totals):
+    """Totals plus margin, margin percentage and average price and cost per hour"""
+    figures = dict(totals)
+    for field in ('revenue', 'hours_sold', 'hours_taught', 'salary_cost'):
+        figures[field] = round_amount(totals[field])
+    figures['margin'] = round_amount(figures['revenue'] - figures['salary_cost'])
+    figures['margin_percent'] = round_amount(figures['margin'] / figures['revenue'] * 100) if figures['revenue'] > 0 else 0
+    figures['revenue_per_hour_sold'] = round_amount(figures['revenue'] / figures['hours_sold']) if figures['hours_sold'] else 0
+    figures['salary_per_hour_taught'] = round_amount(figures['salary_cost'] / figures['hours_taught']) if figures['hours_taught'] else 0
+    return figures
+
+def merge_grade_profitability(start_date, end_date, payments, sessions, teachers):
+    """Build the grade profitability report from payment grade groups and session groups"""
+    teachers_by_id = {teacher[0]: teacher for teacher in teachers}
+    summary = _profitability_totals()
+    grades = {}
+    teacher_grades = {}
+    
+    def add(teacher_id, grade, **values):
+        for totals in (summary, grades.setdefault(grade, _profitability_totals()),
+                       teacher_grades.setdefault((teacher_id, grade), _profitability_totals())):
+            for field, value in values.items():
+                totals[field] += value
+    
+    for teacher_id, grade, amount_paid, purchased_hours, count in payments:
+        add(teacher_id, grade or UNKNOWN_GRADE, revenue=amount_paid, hours_sold=purchased_hours, payment_count=count)
+    for _, teacher_id, grade, hours, count in sessions:
+        salary = session_salary(teachers_by_id, teacher_id, grade, hours)
+        add(teacher_id, grade or UNKNOWN_GRADE, hours_taught=hours, salary_cost=salary, session_count=count)
+    
+    teacher_grades_out = []
+    for teacher_id, grade in sorted(teacher_grades):
+        teacher = teachers_by_id.get(teacher_id)
+        _, name, default_rate, grade_rates = teacher if teacher else (teacher_id, 'Unknown', 0, {})
+        teacher_grades_out.append({
+            'teacher_id': teacher_id,
+            'teacher_name': name,
+            'grade': grade,
+            'rate': grade_rates.get(grade, default_rate),
+            **_profitability_figures(teacher_grades[(teacher_id, grade)])
+        })
+    
+    return {
+        'period': {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        },
+        'summary': _profitability_figures(summary),
+        'grades': [dict(grade=grade, **_profitability_figures(grades[grade])) for grade in sorted(grades)],
+        'teacher_grades': teacher_grades_out
+    }
+
+def timeseries_shard(db, start_date, end_date):
+    """Per-month revenue, session groups and expenses for the months of one shard"""
+    breakdown = monthly_breakdown(db, start_date, end_date)
+    return [dict(month=key, **breakdown[key]) for key in breakdown]
+
+def month_ranges(start_date, end_date):
+    """[(month_start, month_end)] for each calendar month in a range, clipped to the range"""
+    return month_shards(start_date, end_date, 1)
+
+def build_timeseries_report(executor, start_date, end_date, sharder=None):
+    """Monthly revenue, salary and expense series for a date range (closed months from their snapshots)"""
+    tasks = {'teachers': (teacher_list, ())}
+    if period_close.full_months(start_date, end_date):
+        tasks['snapshots'] = (period_close.load_snapshots, (start_date, end_date))
+    results = executor.run(tasks)
+    snapshots = results.get('snapshots', {})
+    
+    months = [{'month': period, 'summary': snapshot['summary']} for period, snapshot in snapshots.items()]
+    for range_start, range_end in period_close.open_ranges(start_date, end_date, snapshots):
+        if sharder is not None and sharder.should_shard(range_start, range_end):
+            partials = sharder.run(timeseries_shard, range_start, range_end)
+        else:
+            partials = [executor.run({'months': (timeseries_shard, (range_start, range_end))})['months']]
+        months.extend(month for partial in partials for month in partial)
+    
+    months.sort(key=lambda month: month['month'])
+    return merge_timeseries(start_date, end_date, months, results['teachers'])
+
+def merge_timeseries(start_date, end_date, months, teachers):
+    """Build the timeseries report from per-month partials or closed-month summaries (in month order)"""
+    series = []
+    for month in months:
+        if 'summary' in month:
+            # Closed month: figures frozen at close time
+            summary = month['summary']
+            revenue, salary, expenses = summary['revenue'], summary['salary_cost'], summary['expenses']
+            hours_taught, sessions_count = summary['hours_taught'], summary['session_count']
+        else:
+            revenue = month['revenue']
+            salary = total_salary(teachers, month['sessions'])
+            expenses = month['expenses'][0]
+            hours_taught = sum(hours for _, _, _, hours, _ in month['sessions'])
+            sessions_count = sum(count for _, _, _, _, count in month['sessions'])
+        costs = salary + expenses
+        series.append({
+            'month': month['month'],
+            'revenue': revenue,
+            'salary': salary,
+            'expenses': expenses,
+            'costs': costs,
+            'profit': revenue - costs,
+            'hours_taught': hours_taught,
+            'sessions_count': sessions_count
+        })
+    
+    total_revenue = sum(point['revenue'] for point in series)
+    total_costs = sum(point['costs'] for point in series)
+    return {
+        'period': {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        },
+        'series': series,
+        'totals': {
+            'revenue': total_revenue,
+            'salary': sum(point['salary'] for point in series),
+            'expenses': sum(point['expenses'] for point in series),
+            'costs': total_costs,
+            'profit': total_revenue - total_costs
+        }
+    }
@@ -0,0 +1,192 @@
+"""
+Hours ledger: append-only record of every balance change plus one balance row
+per (student, course).
+
+Balances are only changed with a single conditional UPDATE, e.g.
+
+    UPDATE hours_balances SET hours = hours - :needed
+    WHERE student_id = :student_id AND course_id = :course_id AND hours >= :needed
+
+so concurrent session and payment writes never over-draw a balance and never
+lose each other's updates, without locking or serialising writers.
+"""
+
+from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from models.hours_balance import HoursBalance
+from models.hours_ledger import HoursLedgerEntry
+from models.student import Student
+from models.course import Course
+
+# Note of the entry that opens a balance row with a student's pre-ledger `balances` JSON value
+LEGACY_OPENING_NOTE = 'Legacy opening balance'
+
+class InsufficientBalanceError(Exception):
+    """Raised when a debit would take a balance below zero"""
+    
+    def __init__(self, available, required):
+        self.available = available
+        self.required = required
+        super().__init__(f'Insufficient balance. Current: {available:.1f}h, Required: {required:.1f}h')
+
+def get_balance(db, student_id, course_id):
+    """Get current balance hours for a student in a course"""
+    hours = db.execute(
+        select(HoursBalance.hours).where(
+            HoursBalance.student_id == student_id,
+            HoursBalance.course_id == course_id
+        )
+    ).scalar()
+    return hours if hours is not None else 0.0
+
+def credit(db, student_id, course_id, hours, entry_type='purchase', payment_id=None, session_id=None, note=None, series_id=None):
+    """Add hours to a balance and append a ledger entry. Returns the new balance."""
+    new_balance = _apply_delta(db, student_id, course_id, hours)
+    if new_balance is None:
+        _ensure_balance_row(db, student_id, course_id)
+        new_balance = _apply_delta(db, student_id, course_id, hours)
+    
+    _append_entry(db, student_id, course_id, entry_type, hours, new_balance, payment_id, session_id, note, series_id)
+    return new_balance
+
+def debit(db, student_id, course_id, hours, entry_type='consume', payment_id=None, session_id=None, note=None, series_id=None):
+    """Remove hours from a balance if enough are available and append a ledger entry.
+    
+    Returns the new balance, or raises InsufficientBalanceError without changing anything.
+    """
+    new_balance = _apply_delta(db, student_id, course_id, -hours, required=hours)
+    if new_balance is None:
+        # Either the balance is too low or the row does not exist yet
+        _ensure_balance_row(db, student_id, course_id)
+        new_balance = _apply_delta(db, student_id, course_id, -hours, required=hours)
+        if new_balance is None:
+            raise InsufficientBalanceError(get_balance(db, student_id, course_id), hours)
+    
+    _append_entry(db, student_id, course_id, entry_type, -hours, new_balance, payment_id, session_id, note, series_id)
+    return new_balance
+
+def apply_change(db, student_id, course_id, hours_change, entry_type, payment_id=None, session_id=None, note=None, series_id=None):
+    """Credit or debit depending on the sign of hours_change. Returns the new balance."""
+    if hours_change > 0:
+        return credit(db, student_id, course_id, hours_change, entry_type, payment_id, session_id, note, series_id)
+    if hours_change < 0:
+        return debit(db, student_id, course_id, -hours_change, entry_type, payment_id, session_id, note, series_id)
+    return get_balance(db, student_id, course_id)
+
+def refresh_balance_mirror(db, student):
+    """Rewrite the student's legacy `balances` JSON (keyed by course name) from the balance rows.
+    
+    The JSON column is kept for the existing API and frontend; the balance rows are
+    authoritative. The mirror is rebuilt from all rows rather than patched with a
+    delta, so any stale entry is repaired by the next write for that student.
+    """
+    rows = db.execute(
+        select(Course.name, HoursBalance.hours)
+        .join(Course, Course.id == HoursBalance.course_id)
+        .where(HoursBalance.student_id == student.id)
+    ).all()
+    
+    balances = dict(student.balances or {})
+    balances.update({course_name: hours for course_name, hours in rows})
+    student.balances = balances
+    student.updated_at = datetime.now().isoformat()
+
+def resync_balance_row(db, student_id, course_id):
+    """Set a balance row to the sum of its ledger entries (the row is only a running total).
+    
+    Returns the new balance, or None if the row does not exist.
+    """
+    ledger_sum = select(func.coalesce(func.sum(HoursLedgerEntry.hours), 0.0)).where(
+        HoursLedgerEntry.student_id == student_id,
+        HoursLedgerEntry.course_id == course_id
+    ).scalar_subquery()
+    new_balance = db.execute(
+        update(HoursBalance).where(
+            HoursBalance.student_id == student_id,
+            HoursBalance.course_id == course_id
+        ).values(hours=ledger_sum, updated_at=datetime.now().isoformat()).returning(HoursBalance.hours),
+        execution_options={'synchronize_session': False}
+    ).scalar()
+    return float(new_balance) if new_balance is not None else None
+
+def delete_student_ledger(db, student_id):
+    """Remove balance rows and ledger entries of a student that is being deleted"""
+    db.execute(delete(HoursLedgerEntry).where(HoursLedgerEntry.student_id == student_id))
+    db.execute(delete(HoursBalance).where(HoursBalance.student_id == student_id))
+
+def seed_balance_rows(db, student_id, balances, center_id=None):
+    """Create balance rows from the legacy `balances` JSON for every course the student has hours in.
+    
+    Courses are matched by name within center_id; without one (a database from
+    before multi-center support) course names are globally unique.
+    """
+    created = 0
+    course_names = list((balances or {}).keys())
+    if not course_names:
+        return created
+    
+    courses = select(Course.id).where(Course.name.in_(course_names))
+    if center_id is not None:
+        courses = courses.where(Course.center_id == center_id)
+    for (course_id,) in db.execute(courses).all():
+        if _ensure_balance_row(db, student_id, course_id):
+            created += 1
+    return created
+
+def _apply_delta(db, student_id, course_id, delta, required=None):
+    """Run the conditional UPDATE. Returns the new balance, or None if no row matched."""
+    stmt = update(HoursBalance).where(
+        HoursBalance.student_id == student_id,
+        HoursBalance.course_id == course_id
+    )
+    if required is not None:
+        stmt = stmt.where(HoursBalance.hours >= required)
+    
+    stmt = stmt.values(
+        hours=HoursBalance.hours + delta,
+        updated_at=datetime.now().isoformat()
+    ).returning(HoursBalance.hours)
+    
+    new_balance = db.execute(stmt, execution_options={'synchronize_session': False}).scalar()
+    return float(new_balance) if new_balance is not None else None
+
+def _ensure_balance_row(db, student_id, course_id):
+    """Create the balance row if missing, opening it with the legacy JSON balance.
+    
+    Returns True if a row was created by this call.
+    """
+    legacy_balances = db.execute(select(Student.balances).where(Student.id == student_id)).scalar() or {}
+    course_name = db.execute(select(Course.name).where(Course.id == course_id)).scalar()
+    opening = float(legacy_balances.get(course_name, 0.0)) if course_name else 0.0
+    now = datetime.now().isoformat()
+    
+    try:
+        with db.begin_nested():
+            db.execute(insert(HoursBalance).values(
+                student_id=student_id,
+                course_id=course_id,
+                hours=opening,
+                updated_at=now
+            ))
+            if opening:
+                _append_entry(db, student_id, course_id, 'adjust', opening, opening, note=LEGACY_OPENING_NOTE)
+        return True
+    except IntegrityError:
+        # Created concurrently by another worker
+        return False
+
+def _append_entry(db, student_id, course_id, entry_type, hours, balance_after, payment_id=None, session_id=None, note=None, series_id=None):
+    """Append a ledger entry"""
+    db.execute(insert(HoursLedgerEntry).values(
+        student_id=student_id,
+        course_id=course_id,
+        entry_type=entry_type,
+        hours=hours,
+        balance_after=balance_after,
+        payment_id=payment_id,
+        session_id=session_id,
+        note=note,
+        series_id=series_id,
+        created_at=datetime.now().isoformat()
+    ))
@@ -0,0 +1,355 @@
+"""
+Transactional outbox of domain events.
+
+Every flush that adds, changes or deletes students, payments, sessions or
+expenses appends one event per row (e.g. "payment.created") to outbox_events,
+in the same transaction as the change: an event exists if and only if its
+change was committed. Bulk statements that bypass the flush (session series)
+record their events with record_rows.
+
+A Dispatcher delivers the events in id order, in batches, to each configured
+sink (a webhook, a JSON-lines file or an in-process queue). Every sink has its
+own cursor row in outbox_cursors, advanced only after a successful delivery,
+so a failing sink is retried with exponential backoff without holding back
+the others. Delivery is at least once: consumers should dedupe by event id.
+
+Like the /sync cursors, dispatch trails the clock by SYNC_CURSOR_LAG_SECONDS,
+so most events are committed by the time their id is reached. An id the
+cursor passes without its event (a transaction committing later, or ids
+committed out of order) is kept in outbox_gaps and delivered once it shows up,
+until GAP_EXPIRY_SECONDS, after which its transaction is taken as rolled back.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, inspect, select, insert, update, delete, func, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as OrmSession
+from config.database import live_engines
+from config.settings import Config
+from models.student import Student
+from models.payment import Payment
+from models.session import Session as SessionModel
+from models.expense import Expense
+from models.outbox import OutboxEvent, OutboxCursor, OutboxGap
+
+outbox_log = logging.getLogger('outbox')
+
+# Models whose changes become events, and their event names
+EVENT_ENTITIES = {Student: 'student', Payment: 'payment', SessionModel: 'session', Expense: 'expense'}
+
+SINK_TYPES = ('webhook', 'file', 'queue')
+
+# How often a dispatcher deletes delivered events older than the retention period
+PRUNE_INTERVAL_SECONDS = 3600
+
+# How long a skipped event id is waited for before its transaction is taken as rolled back
+GAP_EXPIRY_SECONDS = 3600
+
+# Stand-in for a message queue: the 'queue' sink puts events here for in-process consumers
+local_queue = queue.Queue(maxsize=Config.OUTBOX_QUEUE_MAXSIZE)
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+def _payload(obj, loaded_only=False):
+    """Column values of an ORM object, JSON-ready (loaded_only: without loading expired ones, for deleted rows)"""
+    state = inspect(obj)
+    return {
+        attr.key: _json_value(state.dict[attr.key] if loaded_only else getattr(obj, attr.key))
+        for attr in state.mapper.column_attrs
+        if not loaded_only or attr.key in state.dict
+    }
+
+def _event_row(name, action, center_id, entity_id, payload, table_name):
+    return {
+        'center_id': center_id,
+        'event_type': f'{name}.{action}',
+        'entity': table_name,
+        'entity_id': entity_id,
+        'payload': payload,
+        'created_at': datetime.now().isoformat()
+    }
+
+def _append(session, rows):
+    if rows:
+        connection = session.connection(bind_arguments={'mapper': inspect(OutboxEvent)})
+        connection.execute(insert(OutboxEvent.__table__), rows)
+
+def _record_flush(session, flush_context):
+    """One event per added, changed or deleted row of the flush, written in one INSERT"""
+    rows = []
+    for action, objects in (('created', session.new), ('updated', session.dirty), ('deleted', session.deleted)):
+        for obj in objects:
+            name = EVENT_ENTITIES.get(type(obj))
+            if name is None:
+                continue
+            if action == 'updated' and not session.is_modified(obj, include_collections=False):
+                continue
+            payload = _payload(obj, loaded_only=action == 'deleted')
+            rows.append(_event_row(name, action, obj.center_id, obj.id, payload, obj.__tablename__))
+    _append(session, rows)
+
+def record_rows(session, model, action, rows):
+    """Events for rows changed by a bulk statement, given as mappings of their column values"""
+    if not is_enabled():
+        return
+    _append(session, [
+        _event_row(
+            EVENT_ENTITIES[model], action, row['center_id'], row['id'],
+            {key: _json_value(value) for key, value in row.items()}, model.__tablename__
+        )
+        for row in rows
+    ])
+
+def is_enabled():
+    """Whether flushes record events"""
+    return event.contains(OrmSession, 'after_flush', _record_flush)
+
+def enable():
+    """Start recording events (OUTBOX_ENABLED)"""
+    if not is_enabled():
+        event.listen(OrmSession, 'after_flush', _record_flush)
+
+def event_to_dict(row):
+    """Delivered form of an outbox row"""
+    return {
+        'id': row.id,
+        'type': row.event_type,
+        'center_id': row.center_id,
+        'entity': row.entity,
+        'entity_id': row.entity_id,
+        'occurred_at': row.created_at,
+        'data': row.payload
+    }
+
+class WebhookSink:
+    """POSTs each batch as {"events": [...]}; any non-2xx response or network error fails the batch"""
+    
+    def __init__(self, url, timeout=10):
+        self.name = 'webhook'
+        self.url = url
+        self.timeout = timeout
+    
+    def deliver(self, events):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({'events': events}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+class FileSink:
+    """Appends one JSON line per event and syncs the file before the batch counts as delivered"""
+    
+    def __init__(self, path):
+        self.name = 'file'
+        self.path = path
+    
+    def deliver(self, events):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as output:
+            output.write(''.join(json.dumps(event_data) + '\n' for event_data in events))
+            output.flush()
+            os.fsync(output.fileno())
+
+class QueueSink:
+    """Puts events on a queue.Queue; a batch that doesn't fit is retried later"""
+    
+    def __init__(self, target=None):
+        self.name = 'queue'
+        self.queue = target if target is not None else local_queue
+    
+    def deliver(self, events):
+        if self.queue.maxsize and self.queue.qsize() + len(events) > self.queue.maxsize:
+            raise queue.Full(f"Queue has room for {self.queue.maxsize - self.queue.qsize()} events, batch has {len(events)}")
+        for event_data in events:
+            self.queue.put_nowait(event_data)
+
+def sinks_from_config(config):
+    """Sinks named in OUTBOX_SINKS (comma-separated); raises ValueError for unknown or incomplete ones"""
+    names = [name.strip() for name in (config.get('OUTBOX_SINKS') or '').split(',') if name.strip()]
+    unknown = [name for name in names if name not in SINK_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown outbox sinks {', '.join(unknown)}, expected some of {SINK_TYPES}")
+    sinks = []
+    for name in dict.fromkeys(names):
+        if name == 'webhook':
+            if not config.get('OUTBOX_WEBHOOK_URL'):
+                raise ValueError("The webhook outbox sink needs OUTBOX_WEBHOOK_URL")
+            sinks.append(WebhookSink(config['OUTBOX_WEBHOOK_URL'], config.get('OUTBOX_WEBHOOK_TIMEOUT_SECONDS', 10)))
+        elif name == 'file':
+            sinks.append(FileSink(config.get('OUTBOX_FILE_PATH', 'outbox/events.jsonl')))
+        else:
+            sinks.append(QueueSink())
+    return sinks
+
+class Dispatcher:
+    """Deliver outbox events of every live database to the sinks, in batches"""
+    
+    def __init__(self, sinks, batch_size=100, poll_seconds=2, max_backoff_seconds=300, retention_days=7,
+                 settle_seconds=5, engines=None):
+        if not sinks:
+            raise ValueError("The outbox dispatcher needs at least one sink (OUTBOX_SINKS)")
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.retention_days = retention_days
+        self.settle_seconds = settle_seconds
+        self.engines = engines or live_engines()
+        self.failures = {}  # (engine index, sink name) -> (attempts, monotonic time of the next try)
+        self.pruned_at = None
+    
+    @classmethod
+    def from_config(cls, config):
+        """Build a dispatcher from Flask app config (or a dict of the same keys)"""
+        return cls(
+            sinks_from_config(config),
+            batch_size=config.get('OUTBOX_BATCH_SIZE', 100),
+            poll_seconds=config.get('OUTBOX_POLL_SECONDS', 2),
+            max_backoff_seconds=config.get('OUTBOX_MAX_BACKOFF_SECONDS', 300),
+            retention_days=config.get('OUTBOX_RETENTION_DAYS', 7),
+            settle_seconds=config.get('SYNC_CURSOR_LAG_SECONDS', 5)
+        )
+    
+    def _cursor(self, db_engine, sink_name):
+        with db_engine.connect() as connection:
+            last_event_id = connection.execute(
+                select(OutboxCursor.last_event_id).where(OutboxCursor.sink == sink_name)
+            ).scalar()
+        if last_event_id is not None:
+            return last_event_id
+        try:
+            with db_engine.begin() as connection:
+                # Start below the oldest event, so ids pruned before the sink was added aren't gaps
+                last_event_id = (connection.execute(select(func.min(OutboxEvent.id))).scalar() or 1) - 1
+                connection.execute(insert(OutboxCursor).values(
+                    sink=sink_name, last_event_id=last_event_id, updated_at=datetime.now().isoformat()
+                ))
+        except IntegrityError:
+            # Created concurrently by another dispatcher
+            return self._cursor(db_engine, sink_name)
+        return last_event_id
+    
+    def _deliver(self, index, db_engine, sink, settled):
+        """Deliver the next batch of one database to one sink. Returns the number of events delivered."""
+        key = (index, sink.name)
+        attempts, retry_at = self.failures.get(key, (0, 0))
+        if time.monotonic() < retry_at:
+            return 0
+        
+        last_event_id = self._cursor(db_engine, sink.name)
+        with db_engine.connect() as connection:
+            gap_ids = connection.execute(select(OutboxGap.event_id).where(OutboxGap.sink == sink.name)).scalars().all()
+            rows = connection.execute(
+                select(OutboxEvent.__table__)
+                .where(or_(
+                    and_(OutboxEvent.id > last_event_id, OutboxEvent.created_at <= settled),
+                    OutboxEvent.id.in_(gap_ids)
+                ))
+                .order_by(OutboxEvent.id).limit(self.batch_size)
+            ).all()
+        if not rows:
+            return 0
+        
+        try:
+            sink.deliver([event_to_dict(row) for row in rows])
+        except Exception as e:
+            attempts += 1
+            delay = min(self.max_backoff_seconds, self.poll_seconds * 2 ** (attempts - 1))
+            self.failures[key] = (attempts, time.monotonic() + delay)
+            outbox_log.warning(f"Outbox sink {sink.name}: delivery of {len(rows)} events failed "
+                               f"(attempt {attempts}, retry in {delay}s): {e}")
+            return 0
+        self.failures.pop(key, None)
+        
+        delivered_ids = {row.id for row in rows}
+        new_last_event_id = max(last_event_id, rows[-1].id)
+        new_gap_ids = set(range(last_event_id + 1, new_last_event_id)) - delivered_ids
+        now = datetime.now().isoformat()
+        # Conditional, so two dispatchers never move a cursor backwards
+        with db_engine.begin() as connection:
+            moved = connection.execute(
+                update(OutboxCursor)
+                .where(OutboxCursor.sink == sink.name, OutboxCursor.last_event_id == last_event_id)
+                .values(last_event_id=new_last_event_id, updated_at=now)
+            ).rowcount
+            if moved:
+                connection.execute(delete(OutboxGap).where(
+                    OutboxGap.sink == sink.name, OutboxGap.event_id.in_(delivered_ids)
+                ))
+                if new_gap_ids:
+                    connection.execute(insert(OutboxGap), [
+                        {'sink': sink.name, 'event_id': event_id, 'seen_at': now} for event_id in sorted(new_gap_ids)
+                    ])
+        if not moved:
+            outbox_log.warning(f"Outbox sink {sink.name}: cursor moved by another dispatcher, events may be delivered twice")
+        return len(rows)
+    
+    def dispatch_once(self):
+        """Deliver at most one batch per database and sink. Returns the number of events delivered."""
+        settled = (datetime.now() - timedelta(seconds=self.settle_seconds)).isoformat()
+        delivered = 0
+        for index, db_engine in enumerate(self.engines):
+            for sink in self.sinks:
+                delivered += self._deliver(index, db_engine, sink, settled)
+        return delivered
+    
+    def prune(self):
+        """Delete events every sink has received that are older than the retention period, and expired gaps"""
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).isoformat()
+        gap_cutoff = (datetime.now() - timedelta(seconds=GAP_EXPIRY_SECONDS)).isoformat()
+        sink_names = [sink.name for sink in self.sinks]
+        deleted = 0
+        for db_engine in self.engines:
+            with db_engine.begin() as connection:
+                connection.execute(delete(OutboxGap).where(OutboxGap.seen_at < gap_cutoff))
+                cursors = connection.execute(
+                    select(func.count(), func.min(OutboxCursor.last_event_id)).where(OutboxCursor.sink.in_(sink_names))
+                ).one()
+                if cursors[0] < len(sink_names):
+                    continue
+                deleted += connection.execute(
+                    delete(OutboxEvent).where(OutboxEvent.id <= cursors[1], OutboxEvent.created_at < cutoff)
+                ).rowcount
+        self.pruned_at = time.monotonic()
+        return deleted
+    
+    def run(self, stop_event=None):
+        """Dispatch until stop_event is set: full speed while there is a backlog, every poll_seconds otherwise"""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                if self.dispatch_once():
+                    continue
+                if self.pruned_at is None or time.monotonic() - self.pruned_at >= PRUNE_INTERVAL_SECONDS:
+                    self.prune()
+            except Exception as e:
+                # e.g. the database is unreachable: keep the dispatcher alive
+                outbox_log.error(f"Outbox dispatch failed: {e}")
+            stop_event.wait(self.poll_seconds)
+
+_thread = None
+_thread_lock = threading.Lock()
+
+def start_dispatcher_thread(config):
+    """Run a Dispatcher on a daemon thread of this process (OUTBOX_DISPATCHER=thread); started once"""
+    global _thread
+    with _thread_lock:
+        if _thread is not None and _thread.is_alive():
+            return _thread
+        dispatcher = Dispatcher.from_config(config)
+        _thread = threading.Thread(target=dispatcher.run, name='outbox-dispatcher', daemon=True)
+        _thread.start()
+        return _thread
@@ -0,0 +1,128 @@
+"""
+Set-based teacher payroll.
+
+Hours, sessions and salary for every teacher in a period, broken down by
+student grade, come from one grouped query: teachers outer-joined to their
+sessions in the period, the sessions' students, and the teacher_grade_rates
+matrix. The rate of each group follows Teacher.get_rate_for_grade: the
+teacher's rate for the student's grade, else the teacher's default rate.
+Periods reaching the archive add the archived sessions' groups (see
+services.archive).
+"""
+
+from sqlalchemy import func, and_
+from models.teacher import Teacher
+from models.session import Session as SessionModel
+from models.student import Student
+from models.teacher_grade_rate import TeacherGradeRate
+from services import archive, reference_cache
+
+def payroll_groups(db, start_date=None, end_date=None, teacher_ids=None):
+    """Sessions per (teacher, student grade) in a period, with the applicable rate.
+    
+    Teachers without sessions in the period are included with grade None and no hours.
+    Returns [(teacher_id, teacher_name, default_rate, grade, rate, hours, sessions_count)]
+    ordered by teacher id and grade.
+    """
+    session_filter = [SessionModel.teacher_id == Teacher.id]
+    if start_date:
+        session_filter.append(SessionModel.date >= start_date)
+    if end_date:
+        session_filter.append(SessionModel.date <= end_date)
+    
+    rate = func.coalesce(TeacherGradeRate.rate, Teacher.default_rate)
+    query = db.query(
+        Teacher.id,
+        Teacher.name,
+        Teacher.default_rate,
+        Student.grade,
+        rate,
+        func.sum(func.coalesce(SessionModel.hours, 0.0)),
+        func.count(SessionModel.id)
+    ).outerjoin(
+        SessionModel, and_(*session_filter)
+    ).outerjoin(
+        Student, Student.id == SessionModel.student_id
+    ).outerjoin(
+        TeacherGradeRate, and_(
+            TeacherGradeRate.teacher_id == Teacher.id,
+            TeacherGradeRate.grade == Student.grade
+        )
+    )
+    if teacher_ids is not None:
+        query = query.filter(Teacher.id.in_(teacher_ids))
+    
+    rows = query.group_by(
+        Teacher.id, Teacher.name, Teacher.default_rate, Student.grade, rate
+    ).order_by(
+        Teacher.id, Student.grade
+    ).all()
+    rows = [tuple(row) for row in rows]
+    if archive.reaches_archive(db, start_date):
+        rows = _add_archived_groups(db, rows, start_date, end_date, teacher_ids)
+    return rows
+
+def _add_archived_groups(db, rows, start_date, end_date, teacher_ids):
+    """Merge archived sessions into payroll_groups rows of the same teachers"""
+    groups = {(row[0], row[3]): list(row) for row in rows}
+    teachers = {row[0]: row for row in rows}
+    rate_table = reference_cache.get_rate_table(db)
+    for _, teacher_id, grade, hours, count in archive.session_groups(db, start_date, end_date, teacher_ids=teacher_ids):
+        if teacher_id not in teachers:
+            continue  # Deleted teacher: not part of the payroll
+        group = groups.get((teacher_id, grade))
+        if group is None:
+            _, name, default_rate = teachers[teacher_id][:3]
+            rate = rate_table.rate_for_teacher(teacher_id, grade)
+            group = groups[(teacher_id, grade)] = [teacher_id, name, default_rate, grade, rate, None, 0]
+        group[5] = (group[5] or 0.0) + hours
+        group[6] += count
+    return [
+        tuple(group) for _, group in sorted(
+            groups.items(), key=lambda item: (item[0][0], item[0][1] is not None, item[0][1] or '')
+        )
+    ]
+
+def build_payroll(groups):
+    """Per-teacher payroll with a per-grade breakdown, from payroll_groups rows"""
+    teachers = {}
+    for teacher_id, name, default_rate, grade, rate, hours, sessions_count in groups:
+        teacher = teachers.setdefault(teacher_id, {
+            'teacher_id': teacher_id,
+            'teacher_name': name,
+            'default_rate': default_rate,
+            'total_hours': 0,
+            'sessions_count': 0,
+            'total_salary': 0,
+            'grades': []
+        })
+        if not sessions_count:
+            continue
+        
+        salary = (hours or 0) * rate
+        teacher['grades'].append({
+            'grade': grade,
+            'rate': rate,
+            'hours': hours,
+            'sessions_count': sessions_count,
+            'salary': salary
+        })
+        teacher['total_hours'] += hours or 0
+        teacher['sessions_count'] += sessions_count
+        teacher['total_salary'] += salary
+    
+    payroll = list(teachers.values())
+    return {
+        'teachers': payroll,
+        'totals': {
+            'teachers': len(payroll),
+            'hours': sum(teacher['total_hours'] for teacher in payroll),
+            'sessions_count': sum(teacher['sessions_count'] for teacher in payroll),
+            'salary': sum(teacher['total_salary'] for teacher in payroll)
+        }
+    }
+
+def teacher_payroll(db, teacher_id, start_date=None, end_date=None):
+    """Payroll entry of a single teacher, or None if the teacher doesn't exist"""
+    payroll = build_payroll(payroll_groups(db, start_date, end_date, teacher_ids=[teacher_id]))
+    return payroll['teachers'][0] if payroll['teachers'] else None
@@ -0,0 +1,145 @@
+"""
+Period close: freezes a calendar month's financial figures.
+
+Closing a month writes its aggregates (summary, per course, per teacher and per
+student grade, with salaries at the rates in force at close time) into snapshot
+tables. Reports read closed months from those snapshots and only compute the
+open parts of a range from payments, sessions and expenses. Once a month is
+closed its payments, sessions and expenses can't be added, changed or removed
+(models.period_close rejects the flush) until the month is reopened.
+
+An aggregate is the plain-data structure built by financials.aggregate_financial:
+
+    {'summary': {...}, 'courses': {course_id: {...}}, 'teachers': {teacher_id: {...}},
+     'grades': {grade: {...}}}
+"""
+
+from datetime import date, datetime, timedelta
+from models.period_close import (
+    PeriodClose, PeriodSummarySnapshot, PeriodCourseSnapshot, PeriodTeacherSnapshot, PeriodGradeSnapshot
+)
+from services.sharding import month_shards
+
+PERIOD_FORMAT = '%Y-%m'
+
+SUMMARY_FIELDS = ('revenue', 'expenses', 'expense_count', 'salary_cost', 'hours_taught', 'payment_count', 'session_count')
+TEACHER_FIELDS = ('total_hours', 'total_salary', 'signed_hours', 'sessions_count')
+GRADE_FIELDS = ('hours_taught', 'salary_cost', 'sessions_count')
+
+class PeriodCloseError(Exception):
+    """Raised when a month can't be closed or reopened"""
+
+def period_bounds(period):
+    """(first day, last day) of a 'YYYY-MM' period; raises ValueError for other formats"""
+    start = datetime.strptime(period, PERIOD_FORMAT).date()
+    next_start = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, next_start - timedelta(days=1)
+
+def _is_full_month(month_start, month_end):
+    return month_start.day == 1 and (month_end + timedelta(days=1)).day == 1
+
+def full_months(start_date, end_date):
+    """Periods whose whole month lies inside [start_date, end_date]"""
+    return [
+        month_start.strftime(PERIOD_FORMAT)
+        for month_start, month_end in month_shards(start_date, end_date)
+        if _is_full_month(month_start, month_end)
+    ]
+
+def open_ranges(start_date, end_date, closed):
+    """Maximal date ranges of [start_date, end_date] not covered by the closed periods"""
+    ranges = []
+    for shard_start, shard_end in month_shards(start_date, end_date):
+        if shard_start.strftime(PERIOD_FORMAT) in closed and _is_full_month(shard_start, shard_end):
+            continue
+        if ranges and ranges[-1][1] + timedelta(days=1) == shard_start:
+            ranges[-1] = (ranges[-1][0], shard_end)
+        else:
+            ranges.append((shard_start, shard_end))
+    return ranges
+
+def _find_close(db, period):
+    """The current center's close record of a period (queries are center-scoped)"""
+    return db.query(PeriodClose).filter(PeriodClose.period == period).first()
+
+def list_closed_periods(db):
+    """Returns [{'period', 'closed_at', 'note'}], oldest first"""
+    return [
+        {'period': close.period, 'closed_at': close.closed_at, 'note': close.note}
+        for close in db.query(PeriodClose).order_by(PeriodClose.period).all()
+    ]
+
+def close_period(db, period, aggregate, note=None):
+    """Record a month as closed with its aggregate (in the caller's transaction)"""
+    _, period_end = period_bounds(period)
+    if period_end >= date.today():
+        raise PeriodCloseError(f"Period {period} has not ended yet")
+    if _find_close(db, period) is not None:
+        raise PeriodCloseError(f"Period {period} is already closed")
+    
+    db.add(PeriodClose(period=period, note=note))
+    db.flush()
+    
+    summary = aggregate['summary']
+    db.add(PeriodSummarySnapshot(period=period, **{field: summary[field] for field in SUMMARY_FIELDS}))
+    db.add_all([
+        PeriodCourseSnapshot(
+            period=period,
+            course_id=course_id,
+            revenue=totals['revenue'],
+            salary_cost=totals['salary_cost'],
+            hours_taught=totals['hours_taught'],
+            student_ids=sorted(totals['students'])
+        )
+        for course_id, totals in aggregate['courses'].items()
+    ])
+    db.add_all([
+        PeriodTeacherSnapshot(period=period, teacher_id=teacher_id, **{field: totals[field] for field in TEACHER_FIELDS})
+        for teacher_id, totals in aggregate['teachers'].items()
+    ])
+    db.add_all([
+        PeriodGradeSnapshot(period=period, grade=grade, **{field: totals[field] for field in GRADE_FIELDS})
+        for grade, totals in aggregate['grades'].items()
+    ])
+
+def reopen_period(db, period):
+    """Drop a month's snapshots so it is computed live and can be edited again"""
+    period_bounds(period)
+    close = _find_close(db, period)
+    if close is None:
+        raise PeriodCloseError(f"Period {period} is not closed")
+    
+    for model in (PeriodSummarySnapshot, PeriodCourseSnapshot, PeriodTeacherSnapshot, PeriodGradeSnapshot):
+        db.query(model).filter(model.period == period).delete(synchronize_session=False)
+    db.delete(close)
+
+def load_snapshots(db, start_date, end_date):
+    """{period: aggregate} for the closed months lying wholly inside [start_date, end_date]"""
+    periods = full_months(start_date, end_date)
+    if not periods:
+        return {}
+    
+    snapshots = {}
+    for row in db.query(PeriodSummarySnapshot).filter(PeriodSummarySnapshot.period.in_(periods)).all():
+        snapshots[row.period] = {
+            'summary': {field: getattr(row, field) for field in SUMMARY_FIELDS},
+            'courses': {},
+            'teachers': {},
+            'grades': {}
+        }
+    if not snapshots:
+        return snapshots
+    
+    closed = list(snapshots)
+    for row in db.query(PeriodCourseSnapshot).filter(PeriodCourseSnapshot.period.in_(closed)).all():
+        snapshots[row.period]['courses'][row.course_id] = {
+            'revenue': row.revenue,
+            'salary_cost': row.salary_cost,
+            'hours_taught': row.hours_taught,
+            'students': set(row.student_ids or [])
+        }
+    for row in db.query(PeriodTeacherSnapshot).filter(PeriodTeacherSnapshot.period.in_(closed)).all():
+        snapshots[row.period]['teachers'][row.teacher_id] = {field: getattr(row, field) for field in TEACHER_FIELDS}
+    for row in db.query(PeriodGradeSnapshot).filter(PeriodGradeSnapshot.period.in_(closed)).all():
+        snapshots[row.period]['grades'][row.grade] = {field: getattr(row, field) for field in GRADE_FIELDS}
+    return snapshots
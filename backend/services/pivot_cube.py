@@ -0,0 +1,417 @@
+"""
+In-memory analytics cube for pivot queries (/reports/pivot).
+
+Each worker process keeps, per center, the payments and sessions (live and
+archived) as NumPy column arrays: ids, student, course and teacher ids, day,
+month, payment method code and the additive figures. Student grades are kept in
+an array indexed by student id and salary rates come from the cached rate table
+(services.reference_cache), so grades and rates are looked up when a pivot runs
+and are always current, like the financial report's.
+
+The cube is loaded once, then refreshed before every pivot from `updated_at`:
+rows changed since the last refresh replace their old version, tombstoned rows
+are dropped and students whose grade changed are updated. The refresh window
+reaches back SYNC_CURSOR_LAG_SECONDS before the last refresh to cover in-flight
+transactions; re-reading a row is harmless since rows are keyed by id. Archiving
+moves rows without touching them, so archived rows simply stay in the cube.
+
+A pivot filters with vectorized masks and groups by any of course, teacher,
+grade, payment_method and month: each dimension is factorized, the codes are
+combined into one key and the measures are summed with np.bincount.
+
+NumPy is in requirements.txt but only imported when a cube is built; without
+it pivots answer 501.
+"""
+
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from config.settings import Config
+from config.tenancy import current_center_id
+from models.payment import Payment
+from models.session import Session as SessionModel
+from models.student import Student
+from models.tombstone import Tombstone
+from models.archive import ArchivedPayment, ArchivedSession
+from services import reference_cache
+from services.financials import UNKNOWN_GRADE
+
+DIMENSIONS = ['course', 'teacher', 'grade', 'payment_method', 'month']
+
+# Query parameters a pivot accepts ('profile' is read by instrumentation.profiling)
+PARAMETERS = {
+    'group_by', 'measures', 'start_date', 'end_date',
+    'course_id', 'teacher_id', 'grade', 'payment_method', 'month', 'profile'
+}
+
+# Measure -> (fact table, column summed; None counts rows)
+MEASURES = {
+    'revenue': ('payments', 'amount_paid'),
+    'hours_sold': ('payments', 'purchased_hours'),
+    'payment_count': ('payments', None),
+    'hours_taught': ('sessions', 'hours'),
+    'salary_cost': ('sessions', 'salary_cost'),
+    'session_count': ('sessions', None)
+}
+
+# Fact table -> (live model, archive model, columns)
+FACT_TABLES = {
+    'payments': (Payment, ArchivedPayment,
+                 ['id', 'student_id', 'course_id', 'teacher_id', 'date', 'payment_method', 'amount_paid', 'purchased_hours']),
+    'sessions': (SessionModel, ArchivedSession,
+                 ['id', 'student_id', 'course_id', 'teacher_id', 'date', 'hours'])
+}
+
+# Column each dimension's rows are sorted by
+_SORT_COLUMNS = {'course': 'course_id', 'teacher': 'teacher_id', 'grade': 'grade', 'payment_method': 'payment_method', 'month': 'month'}
+
+# Rows fetched per partition while loading
+LOAD_BATCH_SIZE = 10000
+
+_cubes = {}
+_cubes_lock = threading.Lock()
+
+class PivotError(ValueError):
+    """Invalid pivot request"""
+
+class PivotUnavailableError(PivotError):
+    """NumPy is not installed"""
+
+def _numpy():
+    """Import NumPy, which is only needed for pivots"""
+    try:
+        import numpy
+    except ImportError as e:
+        raise PivotUnavailableError("Pivot reports need NumPy: pip install numpy") from e
+    return numpy
+
+def _month_label(month_index):
+    """'YYYY-MM' of a datetime64[M] month index (months since 1970-01)"""
+    return f"{1970 + month_index // 12:04d}-{month_index % 12 + 1:02d}"
+
+def _month_index(value):
+    """Month index of 'YYYY-MM'"""
+    parsed = datetime.strptime(value, '%Y-%m')
+    return (parsed.year - 1970) * 12 + parsed.month - 1
+
+class _Vocabulary:
+    """Integer codes of a low-cardinality string column; code 0 is None"""
+    
+    def __init__(self):
+        self.values = [None]
+        self.codes = {None: 0}
+    
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class PivotCube:
+    """Column arrays of one center's payments and sessions"""
+    
+    def __init__(self):
+        self.np = _numpy()
+        self.lock = threading.Lock()
+        self.grades = _Vocabulary()
+        self.methods = _Vocabulary()
+        self.student_grades = self.np.zeros(0, dtype=self.np.int32)
+        self.facts = {}
+        self.cursor = None
+    
+    # Loading
+    
+    def _columns(self, table_name, rows):
+        """Column arrays of fetched fact rows"""
+        np = self.np
+        names = FACT_TABLES[table_name][2]
+        values = dict(zip(names, zip(*rows))) if rows else {name: () for name in names}
+        columns = {
+            'id': np.array(values['id'], dtype=np.int64),
+            'student_id': np.array(values['student_id'], dtype=np.int64),
+            'course_id': np.array(values['course_id'], dtype=np.int64),
+            'teacher_id': np.array(values['teacher_id'], dtype=np.int64),
+            'day': np.array(values['date'], dtype='datetime64[D]')
+        }
+        columns['month'] = columns['day'].astype('datetime64[M]').astype(np.int64)
+        if table_name == 'payments':
+            columns['payment_method'] = np.array([self.methods.code(method) for method in values['payment_method']], dtype=np.int32)
+            columns['amount_paid'] = np.array(values['amount_paid'], dtype=np.float64)
+            columns['purchased_hours'] = np.array(values['purchased_hours'], dtype=np.float64)
+        else:
+            columns['hours'] = np.array([hours or 0.0 for hours in values['hours']], dtype=np.float64)
+        return columns
+    
+    def _fetch(self, db, model, table_name, conditions=()):
+        """Column arrays of a model's matching rows, read in partitions"""
+        names = FACT_TABLES[table_name][2]
+        result = db.execute(
+            select(*[getattr(model, name) for name in names]).where(*conditions)
+            .execution_options(yield_per=LOAD_BATCH_SIZE)
+        )
+        chunks = [self._columns(table_name, partition) for partition in result.partitions()]
+        return self._concatenate(table_name, chunks)
+    
+    def _concatenate(self, table_name, chunks):
+        if not chunks:
+            return self._columns(table_name, [])
+        if len(chunks) == 1:
+            return chunks[0]
+        return {name: self.np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+    
+    def _set_grades(self, rows):
+        """Store (student_id, grade) pairs in the grade-by-student array"""
+        np = self.np
+        if not rows:
+            return
+        student_ids = np.array([student_id for student_id, _ in rows], dtype=np.int64)
+        codes = np.array([self.grades.code(grade) for _, grade in rows], dtype=np.int32)
+        size = int(student_ids.max()) + 1
+        if size > len(self.student_grades):
+            grown = np.zeros(size, dtype=np.int32)
+            grown[:len(self.student_grades)] = self.student_grades
+            self.student_grades = grown
+        self.student_grades[student_ids] = codes
+    
+    def load(self, db):
+        """Load every live and archived row"""
+        self.cursor = datetime.now().isoformat()
+        self._set_grades(db.execute(select(Student.id, Student.grade)).all())
+        for table_name, (model, archive_model, _) in FACT_TABLES.items():
+            # Live rows first: a row archived meanwhile is read twice and deduplicated by id
+            live = self._fetch(db, model, table_name)
+            archived = self._fetch(db, archive_model, table_name)
+            keep = ~self.np.isin(archived['id'], live['id'])
+            self.facts[table_name] = self._concatenate(
+                table_name, [live, {name: column[keep] for name, column in archived.items()}]
+            )
+    
+    def refresh(self, db):
+        """Apply the rows changed and deleted since the last refresh"""
+        np = self.np
+        started = datetime.now().isoformat()
+        since = (datetime.fromisoformat(self.cursor) - timedelta(seconds=Config.SYNC_CURSOR_LAG_SECONDS)).isoformat()
+        
+        self._set_grades(db.execute(select(Student.id, Student.grade).where(Student.updated_at >= since)).all())
+        deleted = {}
+        for entity, entity_id in db.execute(
+            select(Tombstone.entity, Tombstone.entity_id).where(
+                Tombstone.entity.in_(['students'] + list(FACT_TABLES)),
+                Tombstone.deleted_at >= since
+            )
+        ).all():
+            deleted.setdefault(entity, []).append(entity_id)
+        deleted_students = np.array(deleted.get('students', []), dtype=np.int64)
+        deleted_students = deleted_students[deleted_students < len(self.student_grades)]
+        self.student_grades[deleted_students] = 0
+        
+        for table_name, (model, _, _) in FACT_TABLES.items():
+            changed = self._fetch(db, model, table_name, [model.updated_at >= since])
+            removed_ids = np.array(deleted.get(table_name, []), dtype=np.int64)
+            if not len(changed['id']) and not len(removed_ids) and not len(deleted_students):
+                continue
+            columns = self.facts[table_name]
+            # The student's archived rows go with the student (live ones have their own tombstones)
+            keep = ~(np.isin(columns['id'], np.concatenate([changed['id'], removed_ids]))
+                     | np.isin(columns['student_id'], deleted_students))
+            self.facts[table_name] = self._concatenate(
+                table_name, [{name: column[keep] for name, column in columns.items()}, changed]
+            )
+        self.cursor = started
+    
+    # Querying
+    
+    def _grade_codes(self, columns):
+        """Current grade code of each row's student"""
+        student_ids = columns['student_id']
+        codes = self.np.zeros(len(student_ids), dtype=self.np.int32)
+        known = student_ids < len(self.student_grades)
+        codes[known] = self.student_grades[student_ids[known]]
+        return codes
+    
+    def _salary_costs(self, hours, teacher_ids, grade_codes, rate_table):
+        """hours x the teacher's rate for the student's grade (RateTable.rate_for_teacher rules)"""
+        np = self.np
+        size = max([int(teacher_ids.max()) + 1 if len(teacher_ids) else 0] + [teacher_id + 1 for teacher_id in rate_table.default_rates])
+        rates = np.zeros((size, len(self.grades.values)), dtype=np.float64)
+        for teacher_id, default_rate in rate_table.default_rates.items():
+            rates[teacher_id, :] = default_rate or 0.0
+        for (teacher_id, grade), rate in rate_table.grade_rates.items():
+            code = self.grades.codes.get(grade)
+            if code and teacher_id in rate_table.default_rates:
+                rates[teacher_id, code] = rate
+        return hours * rates[teacher_ids, grade_codes]
+    
+    def _mask(self, columns, grade_codes, filters):
+        np = self.np
+        mask = np.ones(len(columns['id']), dtype=bool)
+        if filters.get('start_date'):
+            mask &= columns['day'] >= np.datetime64(filters['start_date'], 'D')
+        if filters.get('end_date'):
+            mask &= columns['day'] <= np.datetime64(filters['end_date'], 'D')
+        if filters.get('course'):
+            mask &= np.isin(columns['course_id'], filters['course'])
+        if filters.get('teacher'):
+            mask &= np.isin(columns['teacher_id'], filters['teacher'])
+        if filters.get('grade'):
+            codes = [self.grades.codes.get(None if grade == UNKNOWN_GRADE else grade, -1) for grade in filters['grade']]
+            mask &= np.isin(grade_codes, codes)
+        if filters.get('payment_method'):
+            mask &= np.isin(columns['payment_method'], [self.methods.codes.get(method, -1) for method in filters['payment_method']])
+        if filters.get('month'):
+            mask &= np.isin(columns['month'], [_month_index(month) for month in filters['month']])
+        return mask
+    
+    def _group(self, table_name, group_by, measures, filters, rate_table):
+        """{dimension value tuple: {measure: total}} of one fact table"""
+        np = self.np
+        columns = self.facts[table_name]
+        grade_codes = self._grade_codes(columns)
+        mask = self._mask(columns, grade_codes, filters)
+        
+        dimension_columns = {
+            'course': columns['course_id'],
+            'teacher': columns['teacher_id'],
+            'grade': grade_codes,
+            'payment_method': columns.get('payment_method'),
+            'month': columns['month']
+        }
+        values = [dimension_columns[dimension][mask] for dimension in group_by]
+        
+        # One int64 key per row from the factorized dimensions
+        key = np.zeros(int(mask.sum()), dtype=np.int64)
+        for dimension_values in values:
+            uniques, inverse = np.unique(dimension_values, return_inverse=True)
+            key = key * len(uniques) + inverse
+        groups, first, group_index = np.unique(key, return_index=True, return_inverse=True)
+        
+        totals = {}
+        for measure in measures:
+            column = MEASURES[measure][1]
+            if column is None:
+                totals[measure] = np.bincount(group_index, minlength=len(groups))
+            elif column == 'salary_cost':
+                weights = self._salary_costs(columns['hours'][mask], columns['teacher_id'][mask], grade_codes[mask], rate_table)
+                totals[measure] = np.bincount(group_index, weights=weights, minlength=len(groups))
+            else:
+                totals[measure] = np.bincount(group_index, weights=columns[column][mask], minlength=len(groups))
+        
+        labels = zip(*[dimension_values[first].tolist() for dimension_values in values]) if values else [()] * len(groups)
+        return {
+            label: {measure: totals[measure][index].item() for measure in measures}
+            for index, label in enumerate(labels)
+        }
+    
+    def pivot(self, db, group_by, measures, filters):
+        """Measures grouped by the dimensions in group_by, over the rows matching filters"""
+        reference = reference_cache.get_reference_data(db)
+        groups = {}
+        for table_name in FACT_TABLES:
+            table_measures = [measure for measure in measures if MEASURES[measure][0] == table_name]
+            if not table_measures:
+                continue
+            for label, totals in self._group(table_name, group_by, table_measures, filters, reference.rates).items():
+                groups.setdefault(label, dict.fromkeys(measures, 0)).update(totals)
+        
+        rows = []
+        for label in groups:
+            row = {}
+            for dimension, value in zip(group_by, label):
+                if dimension == 'course':
+                    course = reference.courses.get(value)
+                    row.update(course_id=value, course_name=course.name if course else None)
+                elif dimension == 'teacher':
+                    teacher = reference.teachers.get(value)
+                    row.update(teacher_id=value, teacher_name=teacher.name if teacher else None)
+                elif dimension == 'grade':
+                    row['grade'] = self.grades.values[value] or UNKNOWN_GRADE
+                elif dimension == 'payment_method':
+                    row['payment_method'] = self.methods.values[value]
+                else:
+                    row['month'] = _month_label(value)
+            row.update(groups[label])
+            rows.append(row)
+        # Ids, grade and method names, then months
+        rows.sort(key=lambda row: [row[_SORT_COLUMNS[dimension]] or '' for dimension in group_by])
+        
+        totals = dict.fromkeys(measures, 0)
+        for figures in groups.values():
+            for measure in measures:
+                totals[measure] += figures[measure]
+        return {
+            'group_by': group_by,
+            'measures': measures,
+            'rows': rows,
+            'totals': totals,
+            'cube': {
+                'payments': len(self.facts['payments']['id']),
+                'sessions': len(self.facts['sessions']['id']),
+                'refreshed_at': self.cursor
+            }
+        }
+
+def get_cube(db):
+    """The current center's cube, loaded on first use and refreshed on every call"""
+    center_id = current_center_id()
+    with _cubes_lock:
+        cube = _cubes.get(center_id)
+        if cube is None:
+            cube = _cubes[center_id] = PivotCube()
+    with cube.lock:
+        if cube.cursor is None:
+            cube.load(db)
+        else:
+            cube.refresh(db)
+    return cube
+
+def _parse_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+def parse_request(args):
+    """(group_by, measures, filters) of the query parameters; raises PivotError"""
+    unknown_parameters = sorted(set(args) - PARAMETERS)
+    if unknown_parameters:
+        raise PivotError(
+            f"Unknown parameters: {', '.join(unknown_parameters)}. "
+            f"Use group_by, measures, start_date, end_date, course_id, teacher_id, grade, payment_method and month"
+        )
+    group_by = _parse_list(args.get('group_by'))
+    payment_method = 'payment_method' in group_by or args.get('payment_method')
+    measures = _parse_list(args.get('measures')) or [
+        measure for measure, (table_name, _) in MEASURES.items() if table_name == 'payments' or not payment_method
+    ]
+    unknown = [name for name in group_by if name not in DIMENSIONS] + [name for name in measures if name not in MEASURES]
+    if unknown:
+        raise PivotError(
+            f"Unknown dimensions or measures: {', '.join(unknown)}. "
+            f"Dimensions: {', '.join(DIMENSIONS)}; measures: {', '.join(MEASURES)}"
+        )
+    if len(set(group_by)) != len(group_by):
+        raise PivotError("A dimension can only be grouped by once")
+    
+    filters = {}
+    try:
+        for name in ('start_date', 'end_date'):
+            if args.get(name):
+                filters[name] = datetime.strptime(args[name], '%Y-%m-%d').date().isoformat()
+        for dimension, parameter in (('course', 'course_id'), ('teacher', 'teacher_id')):
+            filters[dimension] = [int(value) for value in _parse_list(args.get(parameter))]
+        filters['month'] = _parse_list(args.get('month'))
+        for month in filters['month']:
+            _month_index(month)
+    except ValueError:
+        raise PivotError("Invalid filter: dates are YYYY-MM-DD, months YYYY-MM and ids integers")
+    filters['grade'] = _parse_list(args.get('grade'))
+    filters['payment_method'] = _parse_list(args.get('payment_method'))
+    
+    if ('payment_method' in group_by or filters['payment_method']) and any(MEASURES[measure][0] == 'sessions' for measure in measures):
+        raise PivotError("payment_method only applies to payments: ask for payment measures (revenue, hours_sold, payment_count)")
+    return group_by, measures, filters
+
+def build_pivot(db, args):
+    """Pivot report for the request's query parameters"""
+    group_by, measures, filters = parse_request(args)
+    cube = get_cube(db)
+    with cube.lock:
+        return cube.pivot(db, group_by, measures, filters)
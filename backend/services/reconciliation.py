@@ -0,0 +1,234 @@
+"""
+Balance reconciliation.
+
+Recomputes every student's expected hours per course from the source rows,
+
+    expected = purchased hours (payments) - consumed hours (sessions)
+               + manual adjustments (ledger entries not tied to a payment or session)
+
+and compares it with what is stored: the balance row (or, for pairs without
+one yet, the legacy `balances` JSON value), the sum of the pair's ledger
+entries, and the `balances` JSON mirror. Legacy opening entries hold balances
+staff set before the ledger existed, so they count as manual adjustments that
+replace the payments and sessions before them (as does the JSON value of a
+pair without a balance row, which becomes its opening entry); with
+include_legacy_openings they are reported as drift instead. Reconciliation
+entries are never manual adjustments: they are exactly the drift being
+measured. Archived payments and sessions (services.archive) count like live
+ones.
+
+Students are processed in keyset batches with grouped queries, so memory use
+is bounded by the batch size whatever the number of students. Differences are
+yielded as they are found.
+"""
+
+from sqlalchemy import select, func, or_
+from models.payment import Payment
+from models.session import Session as SessionModel
+from models.student import Student
+from models.course import Course
+from models.hours_balance import HoursBalance
+from models.hours_ledger import HoursLedgerEntry
+from models.archive import ArchivedPayment, ArchivedSession
+from services import ledger
+
+RECONCILIATION_NOTE = 'Reconciliation'
+
+# Ledger entries that don't count as manual adjustments when computing expected balances
+EXCLUDED_ADJUSTMENT_NOTES = (RECONCILIATION_NOTE,)
+
+DEFAULT_TOLERANCE = 1e-6
+
+def _grouped_sums(db, model, value, first_id, last_id, *conditions):
+    rows = db.execute(
+        select(model.student_id, model.course_id, func.sum(value))
+        .where(model.student_id.between(first_id, last_id), *conditions)
+        .group_by(model.student_id, model.course_id)
+    ).all()
+    return {(student_id, course_id): total or 0.0 for student_id, course_id, total in rows}
+
+def _legacy_openings(db, first_id, last_id):
+    """{(student_id, course_id): created_at} of the legacy opening entries"""
+    rows = db.execute(
+        select(HoursLedgerEntry.student_id, HoursLedgerEntry.course_id, func.min(HoursLedgerEntry.created_at))
+        .where(
+            HoursLedgerEntry.student_id.between(first_id, last_id),
+            HoursLedgerEntry.note == ledger.LEGACY_OPENING_NOTE,
+            HoursLedgerEntry.payment_id.is_(None),
+            HoursLedgerEntry.session_id.is_(None),
+            HoursLedgerEntry.series_id.is_(None)
+        )
+        .group_by(HoursLedgerEntry.student_id, HoursLedgerEntry.course_id)
+    ).all()
+    return {(student_id, course_id): created_at for student_id, course_id, created_at in rows}
+
+def _covered_by_openings(db, model, value, entry_id, entry_type, openings, first_id, last_id):
+    """{pair: hours} of rows created before their pair's legacy opening entry, which already includes them"""
+    rows = db.execute(
+        select(model.id, model.student_id, model.course_id, model.created_at, value)
+        .where(
+            model.student_id.between(first_id, last_id),
+            or_(model.created_at.is_(None), model.created_at < max(openings.values()))
+        )
+    ).all()
+    # Rows the ledger recorded were created just before a balance row opened on first use
+    recorded = set(db.execute(
+        select(entry_id).where(
+            HoursLedgerEntry.student_id.between(first_id, last_id),
+            HoursLedgerEntry.entry_type == entry_type,
+            entry_id.isnot(None)
+        )
+    ).scalars())
+    
+    covered = {}
+    for row_id, student_id, course_id, created_at, hours in rows:
+        opened_at = openings.get((student_id, course_id))
+        if opened_at is None or row_id in recorded or (created_at is not None and created_at >= opened_at):
+            continue
+        covered[(student_id, course_id)] = covered.get((student_id, course_id), 0.0) + (hours or 0.0)
+    return covered
+
+def expected_balances(db, first_id, last_id, include_legacy_openings=False):
+    """{(student_id, course_id): expected hours} for students with ids in [first_id, last_id]
+    
+    A legacy opening entry stands for the payments and sessions before it, so
+    those are left out. With include_legacy_openings the opening entries are
+    left out instead, and every payment and session counts.
+    """
+    sources = [
+        (Payment, Payment.purchased_hours, HoursLedgerEntry.payment_id, 'purchase', 1),
+        (ArchivedPayment, ArchivedPayment.purchased_hours, HoursLedgerEntry.payment_id, 'purchase', 1),
+        (SessionModel, func.coalesce(SessionModel.hours, 0.0), HoursLedgerEntry.session_id, 'consume', -1),
+        (ArchivedSession, func.coalesce(ArchivedSession.hours, 0.0), HoursLedgerEntry.session_id, 'consume', -1),
+    ]
+    excluded_notes = EXCLUDED_ADJUSTMENT_NOTES
+    openings = {}
+    if include_legacy_openings:
+        excluded_notes += (ledger.LEGACY_OPENING_NOTE,)
+    else:
+        openings = _legacy_openings(db, first_id, last_id)
+    
+    expected = _grouped_sums(
+        db, HoursLedgerEntry, HoursLedgerEntry.hours, first_id, last_id,
+        HoursLedgerEntry.payment_id.is_(None),
+        HoursLedgerEntry.session_id.is_(None),
+        HoursLedgerEntry.series_id.is_(None),
+        or_(HoursLedgerEntry.note.is_(None), HoursLedgerEntry.note.notin_(excluded_notes))
+    )
+    for model, value, entry_id, entry_type, sign in sources:
+        for pair, hours in _grouped_sums(db, model, value, first_id, last_id).items():
+            expected[pair] = expected.get(pair, 0.0) + sign * hours
+        if openings:
+            for pair, hours in _covered_by_openings(db, model, value, entry_id, entry_type, openings, first_id, last_id).items():
+                expected[pair] -= sign * hours
+    return expected
+
+def reconcile_batch(db, students, course_ids_by_name, course_names, tolerance=DEFAULT_TOLERANCE, include_legacy_openings=False):
+    """Differences for one batch of students, given as [(student_id, center_id, balances JSON)] ordered by id.
+    
+    course_ids_by_name maps (center_id, course name) to the course id.
+    """
+    first_id, last_id = students[0][0], students[-1][0]
+    expected = expected_balances(db, first_id, last_id, include_legacy_openings)
+    ledger_sums = _grouped_sums(db, HoursLedgerEntry, HoursLedgerEntry.hours, first_id, last_id)
+    rows = {
+        (student_id, course_id): hours
+        for student_id, course_id, hours in db.execute(
+            select(HoursBalance.student_id, HoursBalance.course_id, HoursBalance.hours)
+            .where(HoursBalance.student_id.between(first_id, last_id))
+        ).all()
+    }
+    
+    mirrors = {}
+    for student_id, center_id, balances in students:
+        for course_name, hours in (balances or {}).items():
+            course_id = course_ids_by_name.get((center_id, course_name))
+            if course_id is not None:
+                mirrors[(student_id, course_id)] = hours
+    
+    diffs = []
+    for pair in sorted(set(expected) | set(rows) | set(mirrors) | set(ledger_sums)):
+        student_id, course_id = pair
+        base = {'student_id': student_id, 'course_id': course_id, 'course_name': course_names.get(course_id)}
+        has_row = pair in rows
+        stored = rows[pair] if has_row else float(mirrors.get(pair, 0.0))
+        expected_hours = expected.get(pair, 0.0)
+        if not has_row and pair in mirrors and not include_legacy_openings:
+            # The legacy value becomes the row's opening entry and includes everything before it
+            expected_hours = float(mirrors[pair])
+        
+        if abs(stored - expected_hours) > tolerance:
+            diffs.append(dict(base, kind='balance', stored=stored, expected=expected_hours,
+                              difference=expected_hours - stored))
+        if has_row and abs(ledger_sums.get(pair, 0.0) - rows[pair]) > tolerance:
+            diffs.append(dict(base, kind='ledger', stored=rows[pair], expected=ledger_sums.get(pair, 0.0),
+                              difference=ledger_sums.get(pair, 0.0) - rows[pair]))
+        if has_row and (pair not in mirrors or abs(float(mirrors[pair]) - rows[pair]) > tolerance):
+            diffs.append(dict(base, kind='mirror', stored=mirrors.get(pair), expected=rows[pair],
+                              difference=rows[pair] - float(mirrors.get(pair, 0.0))))
+    return diffs
+
+def repair_batch(db, diffs):
+    """Apply repairs for one batch's differences (in the caller's transaction).
+    
+    A balance row that no longer matches its own ledger entries is first reset to
+    their sum; remaining balance drift is then corrected with a reconciliation
+    ledger adjustment, and the JSON mirror is rebuilt. Negative expected balances
+    need a person to look at them and are left alone.
+    """
+    resynced = {}
+    balance_diffs = []
+    touched_students = set()
+    for diff in diffs:
+        touched_students.add(diff['student_id'])
+        if diff['kind'] == 'ledger':
+            resynced[(diff['student_id'], diff['course_id'])] = diff['expected']
+            ledger.resync_balance_row(db, diff['student_id'], diff['course_id'])
+            diff['repaired'] = True
+        elif diff['kind'] == 'balance':
+            balance_diffs.append(diff)
+        else:
+            diff['repaired'] = True
+    
+    for diff in balance_diffs:
+        if diff['expected'] < 0:
+            diff['repaired'] = False
+            diff['reason'] = 'expected balance is negative'
+            continue
+        current = resynced.get((diff['student_id'], diff['course_id']), diff['stored'])
+        ledger.apply_change(
+            db, diff['student_id'], diff['course_id'], diff['expected'] - current, 'adjust', note=RECONCILIATION_NOTE
+        )
+        diff['repaired'] = True
+    
+    for student in db.execute(select(Student).where(Student.id.in_(touched_students))).scalars():
+        ledger.refresh_balance_mirror(db, student)
+
+def reconcile(db, batch_size=1000, repair=False, tolerance=DEFAULT_TOLERANCE, include_legacy_openings=False):
+    """Yield every difference, batch by batch; with repair, fix and commit each batch"""
+    # Course names are unique per center, and students' balances JSON is keyed by name
+    courses = db.execute(select(Course.id, Course.center_id, Course.name)).all()
+    course_ids_by_name = {(center_id, name): course_id for course_id, center_id, name in courses}
+    course_names = {course_id: name for course_id, _, name in courses}
+    
+    last_id = 0
+    while True:
+        students = db.execute(
+            select(Student.id, Student.center_id, Student.balances)
+            .where(Student.id > last_id)
+            .order_by(Student.id)
+            .limit(batch_size)
+        ).all()
+        if not students:
+            break
+        
+        diffs = reconcile_batch(db, students, course_ids_by_name, course_names, tolerance, include_legacy_openings)
+        if repair and diffs:
+            repair_batch(db, diffs)
+            db.commit()
+        else:
+            db.rollback()
+        db.expunge_all()
+        
+        last_id = students[-1][0]
+        yield from diffs
@@ -0,0 +1,173 @@
+"""
+In-process cache of reference data: teachers, courses and the rate matrix.
+
+Each worker process keeps one snapshot of every teacher and course (as detached
+ORM objects) plus the compiled rate matrix, tagged with the 'reference_data'
+version stamp (see services.versioning). Endpoints that change teachers or
+courses call `invalidate(db)` before committing, which bumps the stamp in the
+same transaction, so every worker reloads on its next check.
+
+Each center has its own snapshot and stamp ('reference_data:<center_id>'), since
+queries only see the current center's teachers and courses (see config.tenancy).
+
+The stamp is checked once per database session. Write endpoints use `resolve()`,
+which folds that check into the student lookup, so resolving student, course and
+teacher takes a single round trip. Cached teachers and courses are attached to
+the request's session with `merge(load=False)`, which issues no SQL.
+"""
+
+import threading
+from sqlalchemy import select
+from config.database import SessionLocal
+from config.tenancy import current_center_id
+from models.cache_version import CacheVersion
+from services import versioning
+
+CACHE_NAME = 'reference_data'
+_DIRTY_KEY = 'reference_data_dirty'
+
+_snapshots = {}
+_snapshot_lock = threading.Lock()
+
+class RateTable:
+    """Compiled rate matrix: every rate lookup is a dictionary hit"""
+    
+    def __init__(self, teachers, courses):
+        self.default_rates = {}
+        self.grade_rates = {}
+        for teacher in teachers:
+            self.default_rates[teacher.id] = teacher.default_rate
+            for grade, rate in (teacher.grade_rates or {}).items():
+                self.grade_rates[(teacher.id, grade)] = rate
+        self.courses = {course.id: (course.teacher_id, course.base_rate) for course in courses}
+    
+    def rate_for_teacher(self, teacher_id, grade=None):
+        """Teacher.get_rate_for_grade rules: grade rate, else the teacher's default rate"""
+        if teacher_id not in self.default_rates:
+            return None
+        if grade:
+            rate = self.grade_rates.get((teacher_id, grade))
+            if rate is not None:
+                return rate
+        return self.default_rates[teacher_id]
+    
+    def rate_for_course(self, course_id, grade=None):
+        """Course.get_rate_for_student rules: the course teacher's rate, else the course base rate"""
+        teacher_id, base_rate = self.courses.get(course_id, (None, None))
+        rate = self.rate_for_teacher(teacher_id, grade)
+        return base_rate if rate is None else rate
+
+class ReferenceData:
+    """Snapshot of every teacher and course at one version"""
+    
+    def __init__(self, version, teachers, courses):
+        self.version = version
+        self.teachers = {teacher.id: teacher for teacher in teachers}
+        self.courses = {course.id: course for course in courses}
+        self.rates = RateTable(teachers, courses)
+    
+    def teacher(self, db, teacher_id):
+        """The teacher attached to `db`, or None if it doesn't exist"""
+        return _attach(db, self.teachers, teacher_id)
+    
+    def course(self, db, course_id):
+        """The course attached to `db`, or None if it doesn't exist"""
+        return _attach(db, self.courses, course_id)
+
+def _attach(db, records, record_id):
+    record = records.get(_to_id(record_id))
+    if record is None:
+        return None
+    return db.merge(record, load=False)
+
+def _to_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _load(db, version):
+    # Imported here because the models themselves use this module
+    from models.teacher import Teacher
+    from models.course import Course
+    
+    teachers = db.execute(select(Teacher)).scalars().all()
+    courses = db.execute(select(Course)).scalars().all()
+    return ReferenceData(version, teachers, courses)
+
+def _load_detached(version):
+    """Load a snapshot in its own session so the cached objects belong to no request"""
+    loader = SessionLocal()
+    try:
+        return _load(loader, version)
+    finally:
+        loader.close()
+
+def _cache_name():
+    """Version stamp and cache key of the current center's reference data"""
+    center_id = current_center_id()
+    return CACHE_NAME if center_id is None else f"{CACHE_NAME}:{center_id}"
+
+def _snapshot_for(db, cache_name, version):
+    if db.info.get(_DIRTY_KEY):
+        # This transaction changed reference data: read it through the request's own session
+        # and keep the result out of the shared cache until it is committed
+        reference = _load(db, version)
+    else:
+        reference = _snapshots.get(cache_name)
+        if reference is None or reference.version != version:
+            reference = _load_detached(version)
+            with _snapshot_lock:
+                current = _snapshots.get(cache_name)
+                if current is None or current.version <= version:
+                    _snapshots[cache_name] = reference
+    
+    db.info[cache_name] = reference
+    return reference
+
+def get_reference_data(db):
+    """Reference data for this database session, reloaded only when the version stamp moved"""
+    cache_name = _cache_name()
+    reference = db.info.get(cache_name)
+    if reference is not None:
+        return reference
+    return _snapshot_for(db, cache_name, versioning.get_version(db, cache_name))
+
+def get_rate_table(db):
+    """Compiled rate matrix for this database session"""
+    return get_reference_data(db).rates
+
+def resolve(db, student_id):
+    """Load a student and the reference data for a write endpoint in one round trip.
+    
+    Returns (student, reference); student is None if it doesn't exist.
+    """
+    # Imported here because the models themselves use this module
+    from models.student import Student
+    
+    student_id = _to_id(student_id)
+    if student_id is None:
+        return None, None
+    
+    cache_name = _cache_name()
+    reference = db.info.get(cache_name)
+    if reference is not None:
+        # Version already checked in this session: identity map first, primary key lookup otherwise
+        return db.get(Student, student_id), reference
+    
+    version = select(CacheVersion.version).where(CacheVersion.name == cache_name).scalar_subquery()
+    row = db.execute(select(Student, version).where(Student.id == student_id)).first()
+    if row is None:
+        return None, None
+    
+    student, version = row
+    return student, _snapshot_for(db, cache_name, version or 0)
+
+def invalidate(db):
+    """Mark reference data stale; call before committing a change to teachers or courses"""
+    cache_name = _cache_name()
+    versioning.bump_version(db, cache_name)
+    db.info.pop(cache_name, None)
+    db.info[_DIRTY_KEY] = True
+    with _snapshot_lock:
+        _snapshots.pop(cache_name, None)
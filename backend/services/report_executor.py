@@ -0,0 +1,73 @@
+"""
+Report executor: runs the independent sub-queries of a composite report.
+
+In 'concurrent' mode every sub-query runs on its own thread with its own
+database session (and so its own pooled connection), so a report takes about
+as long as its slowest sub-query instead of the sum of all of them.
+In 'serial' mode the same sub-queries run one after another on one session.
+
+A sub-query is a function taking a database session and returning plain
+Python data (never ORM objects, which are bound to the session that loaded them).
+"""
+
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config.database import SessionLocal
+
+EXECUTOR_MODES = ('concurrent', 'serial')
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def _get_thread_pool(max_workers):
+    """Shared thread pool, created lazily per process (pools don't survive fork)"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='report')
+            _pool_pid = os.getpid()
+        return _pool
+
+def _run_in_own_session(func, args):
+    session = SessionLocal()
+    try:
+        return func(session, *args)
+    finally:
+        session.close()
+
+class ReportExecutor:
+    """Run named sub-queries serially or concurrently and return their results by name"""
+    
+    def __init__(self, mode='concurrent', max_workers=4):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown report executor mode '{mode}', expected one of {EXECUTOR_MODES}")
+        self.mode = mode
+        self.max_workers = max_workers
+    
+    @classmethod
+    def from_config(cls, config):
+        """Build an executor from Flask app config"""
+        return cls(
+            mode=config.get('REPORT_EXECUTOR_MODE', 'concurrent'),
+            max_workers=config.get('REPORT_EXECUTOR_WORKERS', 4)
+        )
+    
+    def run(self, tasks):
+        """Run tasks given as {name: (func, args)} and return {name: result}"""
+        if self.mode == 'serial' or len(tasks) < 2:
+            session = SessionLocal()
+            try:
+                return {name: func(session, *args) for name, (func, args) in tasks.items()}
+            finally:
+                session.close()
+        
+        pool = _get_thread_pool(self.max_workers)
+        # Run each task in a copy of the caller's context so request-scoped state (metrics) follows it
+        futures = {
+            name: pool.submit(contextvars.copy_context().run, _run_in_own_session, func, args)
+            for name, (func, args) in tasks.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
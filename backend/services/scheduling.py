@@ -0,0 +1,192 @@
+"""
+Scheduling conflicts and free/busy lookups.
+
+Sessions store their time as a minutes-of-day interval [start_minute,
+end_minute) (the API's "HH:MM" strings are derived from it). end_minute goes
+past 1440 when a session crosses midnight, so a session can reach into the
+next day but never further. Teacher and student lookups use the
+(center, teacher|student, date, start_minute, end_minute) indexes: a conflict
+check reads the three days around the session from the index alone, and an
+availability query is one range scan per table, and so are the conflict
+checks of all occurrences of a recurring series.
+
+Archived sessions (services.archive) are included when the dates reach the
+archive.
+"""
+
+from datetime import timedelta
+from sqlalchemy import select, and_, or_
+from models.session import Session as SessionModel, MINUTES_PER_DAY, format_minutes
+from models.archive import ArchivedSession
+from services import archive
+
+# Longest range of one availability query
+MAX_AVAILABILITY_DAYS = 92
+
+ROLES = ('teacher', 'student')
+
+def _models(db, first_date):
+    """Session models to search for rows dated from first_date on"""
+    return [SessionModel, ArchivedSession] if archive.reaches_archive(db, first_date) else [SessionModel]
+
+def _overlaps(model, session_date, start_minute, end_minute):
+    """Rows whose interval overlaps [start_minute, end_minute) on session_date, including midnight spill-over"""
+    clauses = [
+        and_(model.date == session_date, model.start_minute < end_minute, model.end_minute > start_minute),
+        # Previous day's sessions running past midnight
+        and_(model.date == session_date - timedelta(days=1), model.end_minute > MINUTES_PER_DAY + start_minute)
+    ]
+    if end_minute > MINUTES_PER_DAY:
+        # This session runs past midnight into the next day's sessions
+        clauses.append(and_(model.date == session_date + timedelta(days=1), model.start_minute < end_minute - MINUTES_PER_DAY))
+    return and_(
+        model.date.between(session_date - timedelta(days=1), session_date + timedelta(days=1)),
+        or_(*clauses)
+    )
+
+def find_conflicts(db, session_date, start_minute, end_minute, teacher_id=None, student_id=None, exclude_id=None):
+    """Sessions of the teacher or the student overlapping a session's interval.
+    
+    Returns [{'session_id', 'role', 'date', 'start_time', 'end_time'}], role being
+    'teacher' or 'student' (a session booked for both is listed for each).
+    """
+    conflicts = []
+    models = _models(db, session_date - timedelta(days=1))
+    for role, person_id in zip(ROLES, (teacher_id, student_id)):
+        if person_id is None:
+            continue
+        for model in models:
+            conditions = [getattr(model, f'{role}_id') == person_id, _overlaps(model, session_date, start_minute, end_minute)]
+            if exclude_id is not None:
+                conditions.append(model.id != exclude_id)
+            rows = db.execute(
+                select(model.id, model.date, model.start_minute, model.end_minute)
+                .where(*conditions).order_by(model.date, model.start_minute)
+            ).all()
+            conflicts.extend(
+                {
+                    'session_id': row_id, 'role': role, 'date': row_date.isoformat(),
+                    'start_time': format_minutes(row_start), 'end_time': format_minutes(row_end % MINUTES_PER_DAY)
+                }
+                for row_id, row_date, row_start, row_end in rows
+            )
+    return conflicts
+
+def _busy_rows(db, role, person_id, first_date, last_date):
+    """(id, date, start_minute, end_minute) of a teacher's or student's sessions dated first_date to last_date"""
+    rows = []
+    for model in _models(db, first_date):
+        rows.extend(db.execute(
+            select(model.id, model.date, model.start_minute, model.end_minute).where(
+                getattr(model, f'{role}_id') == person_id,
+                model.date.between(first_date, last_date)
+            )
+        ).all())
+    return rows
+
+def find_series_conflicts(db, occurrences, teacher_id=None, student_id=None, exclude_ids=()):
+    """Sessions of the teacher or the student overlapping any of many intervals.
+    
+    occurrences is [(date, start_minute, end_minute)]. One range query per role
+    and table instead of one find_conflicts per occurrence. Returns find_conflicts
+    entries plus the 'occurrence_date' they collide with.
+    """
+    if not occurrences:
+        return []
+    # Intervals as minutes since day one, so midnight crossings need no special case
+    by_date = {}
+    for session_date, start_minute, end_minute in occurrences:
+        day_minute = session_date.toordinal() * MINUTES_PER_DAY
+        by_date.setdefault(session_date, []).append((day_minute + start_minute, day_minute + end_minute))
+    first_date = min(by_date) - timedelta(days=1)
+    last_date = max(by_date) + timedelta(days=1)
+    
+    conflicts = []
+    for role, person_id in zip(ROLES, (teacher_id, student_id)):
+        if person_id is None:
+            continue
+        rows = sorted(_busy_rows(db, role, person_id, first_date, last_date), key=lambda row: (row[1], row[2]))
+        for row_id, row_date, row_start, row_end in rows:
+            if row_id in exclude_ids:
+                continue
+            day_minute = row_date.toordinal() * MINUTES_PER_DAY
+            # Sessions last at most a day, so only occurrences of the neighbouring days can overlap
+            for occurrence_date in (row_date - timedelta(days=1), row_date, row_date + timedelta(days=1)):
+                for occurrence_start, occurrence_end in by_date.get(occurrence_date, ()):
+                    if occurrence_start < day_minute + row_end and occurrence_end > day_minute + row_start:
+                        conflicts.append({
+                            'session_id': row_id, 'role': role, 'date': row_date.isoformat(),
+                            'start_time': format_minutes(row_start), 'end_time': format_minutes(row_end % MINUTES_PER_DAY),
+                            'occurrence_date': occurrence_date.isoformat()
+                        })
+    return conflicts
+
+def _busy_intervals(db, role, person_id, start_date, end_date):
+    """{date: [(start_minute, end_minute, session_id)]} of a teacher's or student's sessions, split at midnight"""
+    intervals = {}
+    for row_id, row_date, start_minute, end_minute in _busy_rows(db, role, person_id, start_date - timedelta(days=1), end_date):
+        if row_date >= start_date:
+            intervals.setdefault(row_date, []).append((start_minute, min(end_minute, MINUTES_PER_DAY), row_id))
+        next_date = row_date + timedelta(days=1)
+        if end_minute > MINUTES_PER_DAY and start_date <= next_date <= end_date:
+            intervals.setdefault(next_date, []).append((0, end_minute - MINUTES_PER_DAY, row_id))
+    return intervals
+
+def _merge(intervals):
+    """Sorted, non-overlapping busy blocks: [[start_minute, end_minute, [session ids]]]"""
+    blocks = []
+    for start_minute, end_minute, session_id in sorted(intervals):
+        if blocks and start_minute < blocks[-1][1]:
+            blocks[-1][1] = max(blocks[-1][1], end_minute)
+            blocks[-1][2].append(session_id)
+        else:
+            blocks.append([start_minute, end_minute, [session_id]])
+    return blocks
+
+def availability(db, start_date, end_date, teacher_id=None, student_id=None, day_start=0, day_end=MINUTES_PER_DAY):
+    """Busy blocks and free gaps (within [day_start, day_end)) per day for a teacher or a student.
+    
+    Raises ValueError for an invalid request.
+    """
+    if (teacher_id is None) == (student_id is None):
+        raise ValueError("Give either teacher_id or student_id")
+    if end_date < start_date or (end_date - start_date).days >= MAX_AVAILABILITY_DAYS:
+        raise ValueError(f"end_date must be on or after start_date, at most {MAX_AVAILABILITY_DAYS} days in total")
+    if day_start >= day_end:
+        raise ValueError("day_start must be before day_end")
+    
+    role, person_id = ('teacher', teacher_id) if teacher_id is not None else ('student', student_id)
+    intervals = _busy_intervals(db, role, person_id, start_date, end_date)
+    
+    days = []
+    day = start_date
+    while day <= end_date:
+        blocks = _merge(intervals.get(day, []))
+        gaps = []
+        cursor = day_start
+        for start_minute, end_minute, _ in blocks:
+            if start_minute > cursor and cursor < day_end:
+                gaps.append((cursor, min(start_minute, day_end)))
+            cursor = max(cursor, end_minute)
+        if cursor < day_end:
+            gaps.append((cursor, day_end))
+        
+        days.append({
+            'date': day.isoformat(),
+            'busy': [
+                {'start': format_minutes(start_minute), 'end': format_minutes(end_minute), 'session_ids': session_ids}
+                for start_minute, end_minute, session_ids in blocks
+            ],
+            'free': [{'start': format_minutes(gap_start), 'end': format_minutes(gap_end)} for gap_start, gap_end in gaps],
+            'free_minutes': sum(gap_end - gap_start for gap_start, gap_end in gaps)
+        })
+        day += timedelta(days=1)
+    
+    return {
+        f'{role}_id': person_id,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'day_start': format_minutes(day_start),
+        'day_end': format_minutes(day_end),
+        'days': days
+    }
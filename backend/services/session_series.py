@@ -0,0 +1,207 @@
+"""
+Recurring session series.
+
+A series is a weekly slot (weekdays, start and end time, date range) of one
+student and course. Its occurrences are ordinary sessions with series_id set,
+so reports, balances, conflicts and sync treat them like any other session.
+
+Occurrences are generated, edited and cancelled together: one INSERT ...
+RETURNING, UPDATE or DELETE for the sessions and one ledger entry (a single
+conditional balance UPDATE, see services.ledger) for the hours of the whole
+batch. The ledger entry carries series_id instead of a session_id.
+
+Bulk statements skip the ORM flush hooks, so the closed-period check, the
+session tombstones, the outbox events and the hours and timestamps of new
+sessions are done here.
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, delete
+from models.session import Session as SessionModel
+from models.session_series import WEEKDAY_NAMES
+from models.period_close import PeriodClose, ClosedPeriodError
+from models.tombstone import Tombstone
+from services import ledger, outbox
+
+# Most occurrences one series may generate (a year of daily sessions)
+MAX_OCCURRENCES = 366
+
+def parse_weekdays(values):
+    """Sorted weekday numbers (Monday = 0) of names like "tue" or numbers 0-6; raises ValueError"""
+    if not isinstance(values, list) or not values:
+        raise ValueError("weekdays must be a non-empty list like [\"tue\", \"thu\"]")
+    weekdays = set()
+    for value in values:
+        if isinstance(value, str) and value[:3].lower() in WEEKDAY_NAMES:
+            weekdays.add(WEEKDAY_NAMES.index(value[:3].lower()))
+        elif isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 6:
+            weekdays.add(value)
+        else:
+            raise ValueError(f"Invalid weekday {value!r}. Use mon, tue, wed, thu, fri, sat or sun")
+    return sorted(weekdays)
+
+def parse_slot(start_time, end_time):
+    """(start_minute, end_minute) of "HH:MM" times, validated like a single session; raises ValueError"""
+    template = SessionModel(start_time=start_time, end_time=end_time)
+    errors = template.validate_session()
+    if errors:
+        raise ValueError('; '.join(errors))
+    return template.start_minute, template.end_minute
+
+def occurrences(series, from_date=None):
+    """[(date, start_minute, end_minute)] of the series' occurrences from from_date on; raises ValueError if too many"""
+    dates = series.occurrence_dates(from_date)
+    if len(dates) > MAX_OCCURRENCES:
+        raise ValueError(f"A series can have at most {MAX_OCCURRENCES} occurrences, this one would have {len(dates)}")
+    return [(session_date, series.start_minute, series.end_minute) for session_date in dates]
+
+def generate(db, series):
+    """Add the series and all its sessions, debiting their hours in one ledger entry.
+    
+    The sessions are written by one INSERT ... RETURNING and come back as
+    loaded Session objects. Raises ValueError when the series has no
+    occurrences, ClosedPeriodError when one falls in a closed period and
+    ledger.InsufficientBalanceError when the balance can't cover them all.
+    """
+    slots = occurrences(series)
+    if not slots:
+        raise ValueError("The series has no occurrences between start_date and end_date")
+    
+    db.add(series)
+    db.flush()
+    _reject_closed_periods(db, series, [session_date for session_date, _, _ in slots])
+    
+    now = datetime.now().isoformat()
+    rows = [
+        {
+            'center_id': series.center_id,
+            'date': session_date,
+            'student_id': series.student_id,
+            'course_id': series.course_id,
+            'teacher_id': series.teacher_id,
+            'series_id': series.id,
+            'start_minute': start_minute,
+            'end_minute': end_minute,
+            'hours': round((end_minute - start_minute) / 60.0, 2),
+            'notes': series.notes,
+            'created_at': now,
+            'updated_at': now
+        }
+        for session_date, start_minute, end_minute in slots
+    ]
+    total_hours = sum(row['hours'] for row in rows)
+    
+    # Balance first, so a balance that's too low fails before the sessions are inserted
+    ledger.debit(
+        db, series.student_id, series.course_id, total_hours, 'consume',
+        note=f'Series {series.id}: {len(rows)} sessions', series_id=series.id
+    )
+    # Without sort_by_parameter_order, which SQLite can only honour one row at a time; dates are unique
+    sessions = sorted(db.scalars(insert(SessionModel).returning(SessionModel), rows).all(), key=lambda session_obj: session_obj.date)
+    if outbox.is_enabled():
+        outbox.record_rows(db, SessionModel, 'created', [
+            {column.name: getattr(session_obj, column.key) for column in SessionModel.__table__.columns}
+            for session_obj in sessions
+        ])
+    ledger.refresh_balance_mirror(db, series.student)
+    return sessions
+
+def _reject_closed_periods(db, series, dates):
+    """Raise ClosedPeriodError if any of the dates is in a closed period (the before_flush guard doesn't see bulk statements)"""
+    periods = {session_date.strftime('%Y-%m') for session_date in dates}
+    if not periods:
+        return
+    closed = db.execute(
+        select(PeriodClose.period).where(
+            PeriodClose.center_id == series.center_id,
+            PeriodClose.period.in_(periods)
+        )
+    ).scalars().all()
+    if closed:
+        raise ClosedPeriodError(sorted(closed))
+
+def _future_rows(db, series, from_date):
+    """(id, date, hours) of the series' sessions dated from from_date on"""
+    rows = db.execute(
+        select(SessionModel.id, SessionModel.date, SessionModel.hours)
+        .where(SessionModel.series_id == series.id, SessionModel.date >= from_date)
+        .order_by(SessionModel.date)
+    ).all()
+    _reject_closed_periods(db, series, [row_date for _, row_date, _ in rows])
+    return rows
+
+def update_occurrences(db, series, from_date, start_minute=None, end_minute=None, teacher_id=None, notes=None):
+    """Apply new times, teacher or notes to the series and its sessions from from_date on.
+    
+    One UPDATE for the sessions; the hours difference is debited or credited in
+    one ledger entry (ledger.InsufficientBalanceError if a longer slot can't be
+    covered). Returns the number of sessions changed.
+    """
+    rows = _future_rows(db, series, from_date)
+    values = {}
+    if start_minute is not None:
+        series.start_minute = values['start_minute'] = start_minute
+        series.end_minute = values['end_minute'] = end_minute
+        values['hours'] = round((end_minute - start_minute) / 60.0, 2)
+    if teacher_id is not None:
+        series.teacher_id = values['teacher_id'] = teacher_id
+    if notes is not None:
+        series.notes = values['notes'] = notes
+    series.updated_at = datetime.now().isoformat()
+    if not rows or not values:
+        return 0
+    
+    if 'hours' in values:
+        hours_change = sum(hours or 0 for _, _, hours in rows) - values['hours'] * len(rows)
+        if hours_change:
+            ledger.apply_change(
+                db, series.student_id, series.course_id, hours_change, 'reverse' if hours_change > 0 else 'consume',
+                note=f'Series {series.id}: {len(rows)} sessions changed', series_id=series.id
+            )
+            ledger.refresh_balance_mirror(db, series.student)
+    
+    session_ids = [row_id for row_id, _, _ in rows]
+    db.execute(
+        update(SessionModel).where(SessionModel.id.in_(session_ids))
+        .values(updated_at=datetime.now().isoformat(), **values),
+        execution_options={'synchronize_session': 'fetch'}
+    )
+    if outbox.is_enabled():
+        changed = db.execute(select(SessionModel.__table__).where(SessionModel.id.in_(session_ids))).mappings().all()
+        outbox.record_rows(db, SessionModel, 'updated', changed)
+    return len(rows)
+
+def cancel_occurrences(db, series, from_date):
+    """Delete the series' sessions from from_date on and end the series the day before.
+    
+    One DELETE for the sessions and one credit for their hours.
+    Returns (sessions deleted, hours restored).
+    """
+    rows = _future_rows(db, series, from_date)
+    series.end_date = min(series.end_date, from_date - timedelta(days=1))
+    series.updated_at = datetime.now().isoformat()
+    if not rows:
+        return 0, 0.0
+    
+    session_ids = [row_id for row_id, _, _ in rows]
+    hours_to_restore = sum(hours or 0 for _, _, hours in rows)
+    if hours_to_restore > 0:
+        ledger.credit(
+            db, series.student_id, series.course_id, hours_to_restore, 'reverse',
+            note=f'Series {series.id}: {len(rows)} sessions cancelled', series_id=series.id
+        )
+        ledger.refresh_balance_mirror(db, series.student)
+    
+    if outbox.is_enabled():
+        cancelled = db.execute(select(SessionModel.__table__).where(SessionModel.id.in_(session_ids))).mappings().all()
+        outbox.record_rows(db, SessionModel, 'deleted', cancelled)
+    db.execute(
+        delete(SessionModel).where(SessionModel.id.in_(session_ids)),
+        execution_options={'synchronize_session': 'fetch'}
+    )
+    now = datetime.now().isoformat()
+    db.execute(insert(Tombstone), [
+        {'center_id': series.center_id, 'entity': SessionModel.__tablename__, 'entity_id': session_id, 'deleted_at': now}
+        for session_id in session_ids
+    ])
+    return len(rows), hours_to_restore
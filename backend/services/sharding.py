@@ -0,0 +1,104 @@
+"""
+Month-sharded report computation.
+
+A long date range is split into calendar-month shards. Each shard is computed
+by a shard function `func(db, shard_start, shard_end)` returning a partial
+aggregate, either in-process (workers = 0) or in a process pool whose workers
+each have their own database engine. Results always come back in shard order
+and are merged in that order, so the merged output is byte-identical whatever
+the worker count.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from config.database import SessionLocal, dispose_engine_after_fork, verify_engine_pool
+from config.tenancy import current_center_id, center_scope
+from instrumentation import nplusone
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def month_shards(start_date, end_date, months_per_shard=1):
+    """Split [start_date, end_date] into shards aligned on calendar months"""
+    shards = []
+    shard_start = start_date
+    while shard_start <= end_date:
+        month = shard_start.month - 1 + months_per_shard
+        next_start = date(shard_start.year + month // 12, month % 12 + 1, 1)
+        shards.append((shard_start, min(end_date, next_start - timedelta(days=1))))
+        shard_start = next_start
+    return shards
+
+def months_spanned(start_date, end_date):
+    """Number of calendar months touched by a date range"""
+    return (end_date.year - start_date.year) * 12 + end_date.month - start_date.month + 1
+
+def _init_shard_worker():
+    """Runs once in each pool process: make sure it uses its own connection pool"""
+    dispose_engine_after_fork()
+    verify_engine_pool()
+
+def _run_shard(func, shard_start, shard_end, center_id=None):
+    # Pool processes don't inherit the caller's context, so the center is passed along
+    with center_scope(center_id):
+        session = SessionLocal()
+        try:
+            return func(session, shard_start, shard_end)
+        finally:
+            session.close()
+
+def _get_process_pool(workers):
+    """Shared process pool, created lazily per server process.
+    
+    Uses 'spawn' so pool processes start clean instead of forking a threaded server.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_shard_worker
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+class ShardedReportRunner:
+    """Compute a shard function over the month shards of a date range"""
+    
+    def __init__(self, months_per_shard=1, workers=0, min_months=12):
+        if months_per_shard < 1:
+            raise ValueError('months_per_shard must be at least 1')
+        self.months_per_shard = months_per_shard
+        self.workers = workers
+        self.min_months = min_months
+    
+    @classmethod
+    def from_config(cls, config):
+        """Build a runner from Flask app config"""
+        return cls(
+            months_per_shard=config.get('REPORT_SHARD_MONTHS', 1),
+            workers=config.get('REPORT_SHARD_WORKERS', 0),
+            min_months=config.get('REPORT_SHARD_MIN_MONTHS', 12)
+        )
+    
+    def should_shard(self, start_date, end_date):
+        """Only ranges spanning at least min_months months are sharded"""
+        return months_spanned(start_date, end_date) >= self.min_months
+    
+    def run(self, func, start_date, end_date):
+        """Return [func(db, shard_start, shard_end) for each shard], in shard order"""
+        shards = month_shards(start_date, end_date, self.months_per_shard)
+        center_id = current_center_id()
+        if self.workers <= 0 or len(shards) < 2:
+            # The same queries run once per shard by design, not as an N+1 pattern
+            with nplusone.suppressed():
+                return [_run_shard(func, shard_start, shard_end, center_id) for shard_start, shard_end in shards]
+        
+        pool = _get_process_pool(self.workers)
+        futures = [pool.submit(_run_shard, func, shard_start, shard_end, center_id) for shard_start, shard_end in shards]
+        return [future.result() for future in futures]
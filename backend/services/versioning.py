@@ -0,0 +1,33 @@
+"""
+Version stamps for per-worker in-memory caches.
+
+Every worker process keeps its own copy of a cached dataset tagged with the
+version it was built from. Writes that change the dataset bump the version in
+the database in the same transaction, so every worker notices on its next
+check and rebuilds.
+"""
+
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
+from models.cache_version import CacheVersion
+
+def get_version(db, name):
+    """Current version of a cached dataset (0 if never bumped)"""
+    version = db.execute(select(CacheVersion.version).where(CacheVersion.name == name)).scalar()
+    return version or 0
+
+def bump_version(db, name):
+    """Increment a dataset's version as part of the caller's transaction"""
+    result = db.execute(
+        update(CacheVersion).where(CacheVersion.name == name).values(version=CacheVersion.version + 1),
+        execution_options={'synchronize_session': False}
+    )
+    if result.rowcount:
+        return
+    
+    try:
+        with db.begin_nested():
+            db.execute(insert(CacheVersion).values(name=name, version=1))
+    except IntegrityError:
+        # Created concurrently by another worker
+        bump_version(db, name)